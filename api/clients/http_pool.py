@@ -0,0 +1,74 @@
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+# V9.0: Shared Keep-Alive Connection Pools
+# One AsyncClient per provider host so TCP+TLS handshakes are paid once per worker,
+# not once per call. Each provider gets its own timeout and concurrency limit.
+
+PROVIDERS: Dict[str, Dict] = {
+    "ors": {"timeout": 15.0, "max_connections": 10},
+    "tomtom": {"timeout": 15.0, "max_connections": 20},
+    "wiki": {
+        "timeout": 5.0,
+        "max_connections": 10,
+        # Wikipedia REQUIRES a User-Agent. Generic client UAs are often blocked.
+        "headers": {"User-Agent": "YathiraiPlanner/1.0 (https://yathirai.ai; travel@yathirai.ai) httpx"}
+    },
+    "weather": {"timeout": 5.0, "max_connections": 5},
+    "gemini": {"timeout": 15.0, "max_connections": 5},
+    "overpass": {"timeout": 185.0, "max_connections": 2},
+}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+def provider_timeout(provider: str) -> float:
+    """Per-provider timeout, also used by the blocking (requests) variants."""
+    return PROVIDERS[provider]["timeout"]
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """Returns the pooled client for a provider, creating it lazily outside the app lifespan."""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        cfg = PROVIDERS[provider]
+        client = httpx.AsyncClient(
+            timeout=cfg["timeout"],
+            headers=cfg.get("headers"),
+            limits=httpx.Limits(
+                max_connections=cfg["max_connections"],
+                max_keepalive_connections=cfg["max_connections"]
+            )
+        )
+        _clients[provider] = client
+        _limits[provider] = asyncio.Semaphore(cfg["max_connections"])
+    return client
+
+async def http_request(provider: str, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+    """Sends a request through the provider's pool, bounded by its concurrency limit."""
+    client = get_http_client(provider)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    async with _limits[provider]:
+        return await client.request(method, url, **kwargs)
+
+@asynccontextmanager
+async def http_stream(provider: str, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+    """Streaming variant of http_request; the body is read by the caller (aiter_bytes) inside the block."""
+    client = get_http_client(provider)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    async with _limits[provider]:
+        async with client.stream(method, url, **kwargs) as response:
+            yield response
+
+async def start_http_clients():
+    for provider in PROVIDERS:
+        get_http_client(provider)
+
+async def close_http_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+    _limits.clear()
@@ -1,54 +1,150 @@
+import asyncio
+import math
 import requests
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Union
 from ..config import settings
-from ..engine.cache_manager import geo_cache, get_cached_item, set_cached_item
+from ..engine.cache_manager import (
+    geo_cache, route_cache, get_cached_item, set_cached_item,
+    get_cached_item_async, get_cached_items_async, set_cached_item_async, set_cached_items_async, single_flight
+)
+from ..engine.polyline import route_part, stitch_routes
+from .http_pool import http_request, provider_timeout
 
-def get_coordinates(place_name: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> Tuple[float, float]:
-    # V8.5: Cache Check
+ORS_BASE_URL = "https://api.openrouteservice.org"
+
+def geocode_cache_key(place_name: str, focus: Optional[Tuple[float, float]] = None) -> str:
     cache_key = f"geocode:{place_name}"
     if focus:
         cache_key += f":focus:{focus[0]:.4f},{focus[1]:.4f}"
-    
-    cached = get_cached_item(geo_cache, cache_key)
-    if cached:
-        return cached
+    return cache_key
 
-    url = "https://api.openrouteservice.org/geocode/search"
+def build_geocode_params(place_name: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> Dict:
     params = {
         "api_key": settings.ORS_API_KEY,
         "text": place_name,
         "size": 1
     }
-    
+
     if focus:
         params["focus.point.lon"] = focus[1]
         params["focus.point.lat"] = focus[0]
-    
+
     if boundary_radius_km and focus:
         params["boundary.circle.lat"] = focus[0]
         params["boundary.circle.lon"] = focus[1]
         params["boundary.circle.radius"] = boundary_radius_km
-    
-    res = requests.get(url, params=params)
-    if not res.ok:
-        raise Exception(f"Failed to geocode {place_name}. Status: {res.status_code}")
-    
-    data = res.json()
+    return params
+
+def parse_geocode(place_name: str, data: Dict) -> Tuple[float, float]:
     if not data.get("features"):
         raise Exception(f"Place not found: {place_name}")
-    
+
     lon, lat = data["features"][0]["geometry"]["coordinates"]
-    result = (lat, lon)
-    
+    return (lat, lon)
+
+def get_coordinates(place_name: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> Tuple[float, float]:
+    # V8.5: Cache Check
+    cache_key = geocode_cache_key(place_name, focus)
+    cached = get_cached_item(geo_cache, cache_key)
+    if cached:
+        return cached
+
+    res = requests.get(
+        f"{ORS_BASE_URL}/geocode/search",
+        params=build_geocode_params(place_name, focus, boundary_radius_km),
+        timeout=provider_timeout("ors")
+    )
+    if not res.ok:
+        raise Exception(f"Failed to geocode {place_name}. Status: {res.status_code}")
+
+    result = parse_geocode(place_name, res.json())
+
     # Cache store
     set_cached_item(geo_cache, cache_key, result)
     return result
 
-def get_autocomplete_suggestions(text: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> List[Dict]:
-    if not text or len(text) < 3:
-        return []
+async def get_coordinates_async(place_name: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> Tuple[float, float]:
+    cache_key = geocode_cache_key(place_name, focus)
+    cached = await get_cached_item_async(geo_cache, cache_key)
+    if cached:
+        return cached
+
+    async def fetch():
+        res = await http_request(
+            "ors", "GET", f"{ORS_BASE_URL}/geocode/search",
+            params=build_geocode_params(place_name, focus, boundary_radius_km)
+        )
+        if not res.is_success:
+            raise Exception(f"Failed to geocode {place_name}. Status: {res.status_code}")
 
-    url = "https://api.openrouteservice.org/geocode/autocomplete"
+        result = parse_geocode(place_name, res.json())
+        await set_cached_item_async(geo_cache, cache_key, result)
+        return result
+
+    # Concurrent misses for the same place share one upstream call
+    return await single_flight(cache_key, fetch)
+
+# Batch geocodes further than this from the batch median are re-queried with chained focus
+GEOCODE_OUTLIER_KM = 50.0
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+async def get_coordinates_batch_async(
+    place_names: List[str],
+    focus: Optional[Tuple[float, float]] = None,
+    known_coords: Optional[List[Optional[Tuple[float, float]]]] = None,
+    outlier_km: float = GEOCODE_OUTLIER_KM
+) -> List[Union[Tuple[float, float], Exception]]:
+    """
+    Batch geocoding for the plan pipeline.
+    - Pass 1: every unresolved place is geocoded concurrently against the shared focus.
+    - Pass 2: results far from the batch median (likely a same-name place elsewhere) are
+      re-queried one by one with the "Chain of Proximity" focus (the previous pin).
+    Results keep input order. A place that fails yields its Exception instead of failing the batch.
+    :param known_coords: Already-resolved coords per place (e.g. map picks); these are not queried
+    """
+    known_coords = known_coords or [None] * len(place_names)
+    pending = [i for i, c in enumerate(known_coords) if not c]
+
+    # Pass 1: concurrent lookups around the shared focus
+    first_pass = await asyncio.gather(
+        *[get_coordinates_async(place_names[i], focus) for i in pending],
+        return_exceptions=True
+    )
+    results: List[Union[Tuple[float, float], Exception]] = [
+        tuple(c) if c else None for c in known_coords
+    ]
+    for i, res in zip(pending, first_pass):
+        results[i] = res if isinstance(res, Exception) else tuple(res)
+
+    resolved = [r for r in results if not isinstance(r, Exception)]
+    if len(resolved) < 3:
+        return results
+
+    lats = sorted(r[0] for r in resolved)
+    lons = sorted(r[1] for r in resolved)
+    center = (lats[len(lats) // 2], lons[len(lons) // 2])
+
+    # Pass 2: chained refinement for outliers only
+    chain_focus = focus
+    for i, res in enumerate(results):
+        if isinstance(res, Exception):
+            continue
+        if i in pending and haversine_km(res, center) > outlier_km:
+            try:
+                refined = tuple(await get_coordinates_async(place_names[i], chain_focus))
+                print(f"DEBUG: Re-geocoded outlier {place_names[i]} with chained focus")
+                results[i] = res = refined
+            except Exception as e:
+                print(f"DEBUG: Chained re-geocode failed for {place_names[i]}: {e}")
+        chain_focus = res
+
+    return results
+
+def build_autocomplete_params(text: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> Dict:
     params = {
         "api_key": settings.ORS_API_KEY,
         "text": text,
@@ -57,55 +153,124 @@ def get_autocomplete_suggestions(text: str, focus: Optional[Tuple[float, float]]
     if focus:
         params["focus.point.lat"] = focus[0]
         params["focus.point.lon"] = focus[1]
-        
+
         if boundary_radius_km:
             params["boundary.circle.lat"] = focus[0]
             params["boundary.circle.lon"] = focus[1]
             params["boundary.circle.radius"] = boundary_radius_km
+    return params
+
+def parse_autocomplete(data: Dict) -> List[Dict]:
+    return [
+        {
+            "name": f["properties"]["name"],
+            "label": f["properties"]["label"],
+            "coords": [f["geometry"]["coordinates"][1], f["geometry"]["coordinates"][0]] # [lat, lon]
+        }
+        for f in data.get("features", [])
+    ]
+
+def get_autocomplete_suggestions(text: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> List[Dict]:
+    if not text or len(text) < 3:
+        return []
 
     try:
-        res = requests.get(url, params=params)
+        res = requests.get(
+            f"{ORS_BASE_URL}/geocode/autocomplete",
+            params=build_autocomplete_params(text, focus, boundary_radius_km),
+            timeout=provider_timeout("ors")
+        )
         if not res.ok:
             return []
-        data = res.json()
-        return [
-            {
-                "name": f["properties"]["name"],
-                "label": f["properties"]["label"],
-                "coords": [f["geometry"]["coordinates"][1], f["geometry"]["coordinates"][0]] # [lat, lon]
-            }
-            for f in data.get("features", [])
-        ]
+        return parse_autocomplete(res.json())
     except Exception as e:
         print(f"DEBUG: Autocomplete fetch failed: {e}")
         return []
 
+async def get_autocomplete_suggestions_async(text: str, focus: Optional[Tuple[float, float]] = None, boundary_radius_km: Optional[int] = None) -> List[Dict]:
+    if not text or len(text) < 3:
+        return []
+
+    try:
+        res = await http_request(
+            "ors", "GET", f"{ORS_BASE_URL}/geocode/autocomplete",
+            params=build_autocomplete_params(text, focus, boundary_radius_km)
+        )
+        if not res.is_success:
+            return []
+        return parse_autocomplete(res.json())
+    except Exception as e:
+        print(f"DEBUG: Autocomplete fetch failed: {e}")
+        return []
+
+def ors_headers() -> Dict:
+    return {
+        "Authorization": settings.ORS_API_KEY,
+        "Content-Type": "application/json"
+    }
+
+def parse_durations(data: Dict) -> List[List[float]]:
+    durations = data.get("durations", [])
+
+    # Convert seconds to minutes, handle nulls
+    return [[(secs / 60 if secs is not None else 99999) for secs in row] for row in durations]
+
 def get_durations_matrix(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> List[List[float]]:
     if len(coords) <= 1:
         return [[0.0]]
 
     locations = [[lon, lat] for lat, lon in coords]
-    
+
     res = requests.post(
-        f"https://api.openrouteservice.org/v2/matrix/{profile}",
-        headers={
-            "Authorization": settings.ORS_API_KEY,
-            "Content-Type": "application/json"
+        f"{ORS_BASE_URL}/v2/matrix/{profile}",
+        headers=ors_headers(),
+        json={
+            "locations": locations,
+            "metrics": ["duration"]
         },
+        timeout=provider_timeout("ors")
+    )
+
+    if not res.ok:
+        raise Exception(f"Failed to get route durations. Status: {res.status_code}")
+
+    return parse_durations(res.json())
+
+async def get_durations_matrix_async(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> List[List[float]]:
+    if len(coords) <= 1:
+        return [[0.0]]
+
+    locations = [[lon, lat] for lat, lon in coords]
+
+    res = await http_request(
+        "ors", "POST", f"{ORS_BASE_URL}/v2/matrix/{profile}",
+        headers=ors_headers(),
         json={
             "locations": locations,
             "metrics": ["duration"]
         }
     )
 
-    if not res.ok:
+    if not res.is_success:
         raise Exception(f"Failed to get route durations. Status: {res.status_code}")
-    
-    data = res.json()
-    durations = data.get("durations", [])
-    
-    # Convert seconds to minutes, handle nulls
-    return [[(secs / 60 if secs is not None else 99999) for secs in row] for row in durations]
+
+    return parse_durations(res.json())
+
+def straight_line_route(locations: List[List[float]], properties: Dict) -> Dict:
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": locations},
+            "properties": properties
+        }]
+    }
+
+def is_long_distance(coords: List[Tuple[float, float]]) -> bool:
+    # Long distance check to prevent API errors (match TS logic)
+    start = coords[0]
+    end = coords[-1]
+    return abs(start[0] - end[0]) > 40 or abs(start[1] - end[1]) > 40
 
 def get_route_polyline(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> Optional[Dict]:
     if len(coords) < 2:
@@ -113,37 +278,102 @@ def get_route_polyline(coords: List[Tuple[float, float]], profile: str = 'drivin
 
     locations = [[lon, lat] for lat, lon in coords]
 
-    # Long distance check to prevent API errors (match TS logic)
-    start = coords[0]
-    end = coords[-1]
-    if abs(start[0] - end[0]) > 40 or abs(start[1] - end[1]) > 40:
-        return {
-            "type": "FeatureCollection",
-            "features": [{
-                "type": "Feature",
-                "geometry": {"type": "LineString", "coordinates": locations},
-                "properties": {"summary": {"distance": 0, "duration": 0}}
-            }]
-        }
-    
+    if is_long_distance(coords):
+        return straight_line_route(locations, {"summary": {"distance": 0, "duration": 0}})
+
     res = requests.post(
-        f"https://api.openrouteservice.org/v2/directions/{profile}/geojson",
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": settings.ORS_API_KEY
-        },
-        json={"coordinates": locations}
+        f"{ORS_BASE_URL}/v2/directions/{profile}/geojson",
+        headers=ors_headers(),
+        json={"coordinates": locations},
+        timeout=provider_timeout("ors")
     )
 
     if not res.ok:
-        return {
-            "type": "FeatureCollection",
-            "features": [{
-                "type": "Feature",
-                "geometry": {"type": "LineString", "coordinates": locations},
-                "properties": {}
-            }]
-        }
-    
+        return straight_line_route(locations, {})
+
     return res.json()
 
+def route_leg_cache_key(a: Tuple[float, float], b: Tuple[float, float], profile: str) -> str:
+    return f"leg:{a[0]:.5f},{a[1]:.5f}>{b[0]:.5f},{b[1]:.5f}:mode:{profile}"
+
+def split_route_legs(route: Dict, n_stops: int) -> Optional[List[Dict]]:
+    """Splits an ORS directions response into one part per consecutive stop pair (via way_points)."""
+    features = route.get("features") or []
+    if not features:
+        return None
+    props = features[0].get("properties", {})
+    line = features[0].get("geometry", {}).get("coordinates", [])
+    way_points = props.get("way_points") or []
+    segments = props.get("segments") or []
+    if len(way_points) != n_stops or len(segments) != n_stops - 1:
+        return None
+
+    legs = []
+    for i, segment in enumerate(segments):
+        start, end = way_points[i], way_points[i + 1]
+        legs.append({
+            "coordinates": line[start:end + 1],
+            "way_points": [0, end - start],
+            "segments": [{"distance": segment.get("distance", 0), "duration": segment.get("duration", 0)}],
+            "distance": segment.get("distance", 0),
+            "duration": segment.get("duration", 0)
+        })
+    return legs
+
+async def fetch_directions_async(coords: List[Tuple[float, float]], profile: str) -> Optional[Dict]:
+    try:
+        res = await http_request(
+            "ors", "POST", f"{ORS_BASE_URL}/v2/directions/{profile}/geojson",
+            headers=ors_headers(),
+            json={"coordinates": [[lon, lat] for lat, lon in coords]}
+        )
+    except Exception as e:
+        print(f"DEBUG: ORS Directions Exception: {e}")
+        return None
+
+    if not res.is_success:
+        return None
+    return res.json()
+
+async def get_route_polyline_async(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> Optional[Dict]:
+    """
+    Async directions with a per-leg cache. Each consecutive stop pair is cached by its
+    endpoints; only runs of uncached legs are requested (concurrently) and the result
+    is stitched back into one route whose way_points index every stop.
+    """
+    if len(coords) < 2:
+        return None
+
+    locations = [[lon, lat] for lat, lon in coords]
+
+    if is_long_distance(coords):
+        return straight_line_route(locations, {"summary": {"distance": 0, "duration": 0}})
+
+    keys = [route_leg_cache_key(a, b, profile) for a, b in zip(coords, coords[1:])]
+    cached = await get_cached_items_async(route_cache, keys)
+    legs = [cached.get(key) for key in keys]
+
+    # Contiguous runs of missing legs: (first stop, last stop)
+    runs = []
+    for i, leg in enumerate(legs):
+        if leg is None:
+            if runs and runs[-1][1] == i:
+                runs[-1] = (runs[-1][0], i + 1)
+            else:
+                runs.append((i, i + 1))
+
+    fetched = await asyncio.gather(*[fetch_directions_async(coords[start:end + 1], profile) for start, end in runs])
+    fresh = {}
+    for (start, end), route in zip(runs, fetched):
+        run_legs = split_route_legs(route, end - start + 1) if route else None
+        if run_legs is None:
+            # Only this run falls back to straight lines (uncached, so it is retried next time)
+            print(f"DEBUG: ORS directions unavailable for stops {start}-{end}, using straight legs")
+            legs[start:end] = [route_part(None, [coords[k], coords[k + 1]]) for k in range(start, end)]
+            continue
+        legs[start:end] = run_legs
+        fresh.update({keys[start + k]: leg for k, leg in enumerate(run_legs)})
+
+    if fresh:
+        await set_cached_items_async(route_cache, fresh)
+    return stitch_routes(legs)
@@ -1,6 +1,9 @@
+import asyncio
+import time
 import requests
 from typing import List, Tuple, Optional, Dict
 from ..config import settings
+from .http_pool import http_request, provider_timeout
 
 def map_to_tomtom_mode(profile: str) -> str:
     """Maps ORS profiles to TomTom travel modes"""
@@ -11,61 +14,93 @@ def map_to_tomtom_mode(profile: str) -> str:
     }
     return mapping.get(profile, "car")
 
-from ..engine.cache_manager import traffic_cache, get_cached_item, set_cached_item
+from ..engine.cache_manager import (
+    traffic_cache, matrix_cache, get_cached_item, set_cached_item,
+    get_cached_item_async, get_cached_items_async, set_cached_item_async, set_cached_items_async, single_flight
+)
 import json
 
+# TomTom's synchronous matrix endpoint accepts at most 100 cells per request
+TOMTOM_MATRIX_MAX_CELLS = 100
+TOMTOM_MATRIX_TILE_SIZE = 10 # 10 origins x 10 destinations per tile
+
+def coords_cache_key(coords: List[Tuple[float, float]]) -> str:
+    return "|".join([f"{lat:.4f},{lon:.4f}" for lat, lon in coords])
+
+def matrix_cache_key(coords: List[Tuple[float, float]], profile: str, traffic: bool) -> str:
+    return f"matrix:{coords_cache_key(coords)}:mode:{profile}:traffic:{traffic}"
+
+# Live traffic is only reused within the same departure bucket (matches matrix_cache TTL)
+TRAFFIC_BUCKET_MINUTES = 15
+
+def traffic_bucket(now: Optional[float] = None) -> int:
+    return int((now if now is not None else time.time()) // (TRAFFIC_BUCKET_MINUTES * 60))
+
+def cell_cache_key(origin: Tuple[float, float], destination: Tuple[float, float], profile: str, bucket: int) -> str:
+    return f"cell:{origin[0]:.4f},{origin[1]:.4f}>{destination[0]:.4f},{destination[1]:.4f}:mode:{profile}:bucket:{bucket}"
+
+def block_cache_key(origins: List[Tuple[float, float]], destinations: List[Tuple[float, float]], profile: str, bucket: int) -> str:
+    return f"matrix:{coords_cache_key(origins)}>{coords_cache_key(destinations)}:mode:{profile}:bucket:{bucket}"
+
+def build_matrix_request(
+    origins: List[Tuple[float, float]],
+    destinations: List[Tuple[float, float]],
+    profile: str,
+    traffic: bool,
+    all_times: bool = False
+) -> Tuple[str, Dict]:
+    # TomTom expects [lat, lon]
+    to_points = lambda coords: [{"point": {"latitude": lat, "longitude": lon}} for lat, lon in coords]
+
+    traffic_param = "true" if traffic else "false"
+    mode = map_to_tomtom_mode(profile)
+    url = f"https://api.tomtom.com/routing/1/matrix/sync/json?key={settings.TOMTOM_API_KEY}&routeType=fastest&traffic={traffic_param}&travelMode={mode}"
+    if all_times:
+        # Live and historic travel times in one response
+        url += "&computeTravelTimeFor=all"
+    return url, {"origins": to_points(origins), "destinations": to_points(destinations)}
+
+def parse_matrix(data: Dict, n_rows: int, n_cols: int) -> Optional[List[List[float]]]:
+    matrix = []
+
+    # Verify matrix structure
+    if "matrix" not in data or len(data["matrix"]) < n_rows:
+        return None
+
+    for i in range(n_rows):
+        row = []
+        for j in range(n_cols):
+            cell = data["matrix"][i][j]
+            # TomTom returns travelTimeInSeconds
+            seconds = cell.get("response", {}).get("routeSummary", {}).get("travelTimeInSeconds")
+            # Fallback to high value if path not found
+            row.append(seconds / 60 if seconds is not None else 99999.0)
+        matrix.append(row)
+    return matrix
+
 def get_tomtom_durations_matrix(coords: List[Tuple[float, float]], profile: str = "car", traffic: bool = True) -> Optional[List[List[float]]]:
     if not settings.TOMTOM_API_KEY:
         return None
 
     # V8.5: Cache Check
-    coords_key = "|".join([f"{lat:.4f},{lon:.4f}" for lat, lon in coords])
-    cache_key = f"matrix:{coords_key}:mode:{profile}:traffic:{traffic}"
-    
+    cache_key = matrix_cache_key(coords, profile, traffic)
     cached = get_cached_item(traffic_cache, cache_key)
     if cached:
         return cached
 
-    # TomTom expects [lat, lon]
-    origins = [{"point": {"latitude": lat, "longitude": lon}} for lat, lon in coords]
-    destinations = origins
-    
-    traffic_param = "true" if traffic else "false"
-    mode = map_to_tomtom_mode(profile)
-    url = f"https://api.tomtom.com/routing/1/matrix/sync/json?key={settings.TOMTOM_API_KEY}&routeType=fastest&traffic={traffic_param}&travelMode={mode}"
-    
+    url, body = build_matrix_request(coords, coords, profile, traffic)
+
     try:
-        res = requests.post(
-            url,
-            json={
-                "origins": origins,
-                "destinations": destinations
-            },
-            timeout=10
-        )
+        res = requests.post(url, json=body, timeout=provider_timeout("tomtom"))
 
         if not res.ok:
             print(f"DEBUG: TomTom Matrix API Error: {res.status_code} {res.text}")
             return None
-        
-        data = res.json()
-        matrix = []
-        n = len(coords)
- 
-        # Verify matrix structure
-        if "matrix" not in data or len(data["matrix"]) < n:
+
+        matrix = parse_matrix(res.json(), len(coords), len(coords))
+        if matrix is None:
             return None
- 
-        for i in range(n):
-            row = []
-            for j in range(n):
-                cell = data["matrix"][i][j]
-                # TomTom returns travelTimeInSeconds
-                seconds = cell.get("response", {}).get("routeSummary", {}).get("travelTimeInSeconds")
-                # Fallback to high value if path not found
-                row.append(seconds / 60 if seconds is not None else 99999.0)
-            matrix.append(row)
-        
+
         # Cache store
         set_cached_item(traffic_cache, cache_key, matrix)
         return matrix
@@ -73,6 +108,156 @@ def get_tomtom_durations_matrix(coords: List[Tuple[float, float]], profile: str
         print(f"DEBUG: TomTom Matrix Exception: {e}")
         return None
 
+def parse_matrix_cells(data: Dict, n_rows: int, n_cols: int) -> Optional[List[List[List[float]]]]:
+    """Parses a computeTravelTimeFor=all response into [liveMinutes, historicalMinutes] cells."""
+    if "matrix" not in data or len(data["matrix"]) < n_rows:
+        return None
+
+    cells = []
+    for i in range(n_rows):
+        row = []
+        for j in range(n_cols):
+            summary = data["matrix"][i][j].get("response", {}).get("routeSummary", {})
+            live = summary.get("travelTimeInSeconds")
+            hist = summary.get("historicTrafficTravelTimeInSeconds", live)
+            row.append([
+                live / 60 if live is not None else 99999.0,
+                hist / 60 if hist is not None else 99999.0
+            ])
+        cells.append(row)
+    return cells
+
+def plan_matrix_blocks(missing: Dict[int, List[int]]) -> List[Tuple[List[int], List[int]]]:
+    """
+    Groups missing (origin, destination) cells into requests of at most
+    TOMTOM_MATRIX_MAX_CELLS: origins in runs of TOMTOM_MATRIX_TILE_SIZE, and the
+    union of their missing destinations chunked to fit the cell budget.
+    """
+    rows = sorted(missing)
+    blocks = []
+    for start in range(0, len(rows), TOMTOM_MATRIX_TILE_SIZE):
+        block_rows = rows[start:start + TOMTOM_MATRIX_TILE_SIZE]
+        cols = sorted({j for i in block_rows for j in missing[i]})
+        width = TOMTOM_MATRIX_MAX_CELLS // len(block_rows)
+        for c in range(0, len(cols), width):
+            blocks.append((block_rows, cols[c:c + width]))
+    return blocks
+
+async def fetch_matrix_block_async(
+    origins: List[Tuple[float, float]],
+    destinations: List[Tuple[float, float]],
+    profile: str,
+    bucket: int
+) -> Optional[List[List[List[float]]]]:
+    """Fetches one origins x destinations block (<= 100 cells) and caches every cell."""
+    url, body = build_matrix_request(origins, destinations, profile, traffic=True, all_times=True)
+
+    async def fetch():
+        try:
+            res = await http_request("tomtom", "POST", url, json=body)
+
+            if not res.is_success:
+                print(f"DEBUG: TomTom Matrix API Error: {res.status_code} {res.text}")
+                return None
+
+            cells = parse_matrix_cells(res.json(), len(origins), len(destinations))
+            if cells is None:
+                return None
+
+            await set_cached_items_async(matrix_cache, {
+                cell_cache_key(o, d, profile, bucket): cells[i][j]
+                for i, o in enumerate(origins)
+                for j, d in enumerate(destinations)
+            })
+            return cells
+        except Exception as e:
+            print(f"DEBUG: TomTom Matrix Exception: {e}")
+            return None
+
+    return await single_flight(block_cache_key(origins, destinations, profile, bucket), fetch)
+
+async def get_tomtom_traffic_matrices_async(
+    coords: List[Tuple[float, float]],
+    profile: str = "car"
+) -> Optional[Tuple[List[List[float]], List[List[float]]]]:
+    """
+    Live and historical N x N matrices from a single set of upstream calls.
+    Cells are cached individually (rounded coords, mode, traffic bucket), so only
+    origins with pairs no earlier matrix has covered are requested, in blocks of
+    at most 100 cells fetched concurrently (a block spans the union of its origins'
+    missing destinations, so it may repeat a few cached cells). Returns None if
+    any block fails, so callers can fall back to ORS.
+    """
+    if not settings.TOMTOM_API_KEY:
+        return None
+
+    n = len(coords)
+    bucket = traffic_bucket()
+    keys = {
+        (i, j): cell_cache_key(coords[i], coords[j], profile, bucket)
+        for i in range(n) for j in range(n) if i != j
+    }
+    cached = await get_cached_items_async(matrix_cache, list(keys.values()))
+
+    missing: Dict[int, List[int]] = {}
+    for (i, j), key in keys.items():
+        if key not in cached:
+            missing.setdefault(i, []).append(j)
+
+    blocks = plan_matrix_blocks(missing)
+    print(f"DEBUG: TomTom matrix {n}x{n}: {len(cached)}/{len(keys)} cells cached, {len(blocks)} upstream block(s)")
+
+    fetched = await asyncio.gather(*[
+        fetch_matrix_block_async([coords[i] for i in rows], [coords[j] for j in cols], profile, bucket)
+        for rows, cols in blocks
+    ])
+    if any(cells is None for cells in fetched):
+        return None
+
+    cells = {ij: cached[key] for ij, key in keys.items() if key in cached}
+    for (rows, cols), block in zip(blocks, fetched):
+        for bi, i in enumerate(rows):
+            for bj, j in enumerate(cols):
+                if i != j: # Blocks can span the diagonal; it stays 0
+                    cells[(i, j)] = block[bi][bj]
+
+    live = [[0.0] * n for _ in range(n)]
+    hist = [[0.0] * n for _ in range(n)]
+    for (i, j), (live_min, hist_min) in cells.items():
+        live[i][j] = live_min
+        hist[i][j] = hist_min
+    return live, hist
+
+async def get_tomtom_durations_matrix_async(coords: List[Tuple[float, float]], profile: str = "car", traffic: bool = True) -> Optional[List[List[float]]]:
+    """Single-variant view over get_tomtom_traffic_matrices_async."""
+    matrices = await get_tomtom_traffic_matrices_async(coords, profile)
+    if matrices is None:
+        return None
+    return matrices[0] if traffic else matrices[1]
+
+def summary_cache_key(coords: List[Tuple[float, float]], profile: str) -> str:
+    return f"summary:{coords_cache_key(coords)}:mode:{profile}"
+
+def build_route_summary_url(coords: List[Tuple[float, float]], profile: str) -> str:
+    # TomTom expects {lat},{lon}:{lat},{lon}...
+    points_str = ":".join([f"{lat},{lon}" for lat, lon in coords])
+    mode = map_to_tomtom_mode(profile)
+    return f"https://api.tomtom.com/routing/1/calculateRoute/{points_str}/json?key={settings.TOMTOM_API_KEY}&traffic=true&travelMode={mode}&departAt=now&computeTravelTimeFor=all"
+
+def parse_route_summary(data: Dict) -> List[Dict]:
+    route = data.get("routes", [{}])[0]
+    legs = route.get("legs", [])
+
+    results = []
+    for leg in legs:
+        summary = leg.get("summary", {})
+        results.append({
+            "liveMinutes": summary.get("travelTimeInSeconds", 0) / 60,
+            "historicalMinutes": summary.get("historicTrafficTravelTimeInSeconds", summary.get("travelTimeInSeconds", 0)) / 60,
+            "noTrafficMinutes": summary.get("noTrafficTravelTimeInSeconds", summary.get("travelTimeInSeconds", 0)) / 60
+        })
+    return results
+
 def get_tomtom_route_summary(coords: List[Tuple[float, float]], profile: str = "car") -> List[Dict]:
     """
     Fetches detailed travel stats for an entire fixed sequence of coordinates.
@@ -83,37 +268,19 @@ def get_tomtom_route_summary(coords: List[Tuple[float, float]], profile: str = "
         return []
 
     # V8.5: Cache Check
-    coords_key = "|".join([f"{lat:.4f},{lon:.4f}" for lat, lon in coords])
-    cache_key = f"summary:{coords_key}:mode:{profile}"
-    
+    cache_key = summary_cache_key(coords, profile)
     cached = get_cached_item(traffic_cache, cache_key)
     if cached:
         return cached
 
-    # TomTom expects {lat},{lon}:{lat},{lon}...
-    points_str = ":".join([f"{lat},{lon}" for lat, lon in coords])
-    mode = map_to_tomtom_mode(profile)
-    url = f"https://api.tomtom.com/routing/1/calculateRoute/{points_str}/json?key={settings.TOMTOM_API_KEY}&traffic=true&travelMode={mode}&departAt=now&computeTravelTimeFor=all"
-    
     try:
-        res = requests.get(url, timeout=15)
+        res = requests.get(build_route_summary_url(coords, profile), timeout=provider_timeout("tomtom"))
         if not res.ok:
             print(f"DEBUG: TomTom Route Summary Error: {res.status_code} {res.text}")
             return []
-        
-        data = res.json()
-        route = data.get("routes", [{}])[0]
-        legs = route.get("legs", [])
-        
-        results = []
-        for leg in legs:
-            summary = leg.get("summary", {})
-            results.append({
-                "liveMinutes": summary.get("travelTimeInSeconds", 0) / 60,
-                "historicalMinutes": summary.get("historicTrafficTravelTimeInSeconds", summary.get("travelTimeInSeconds", 0)) / 60,
-                "noTrafficMinutes": summary.get("noTrafficTravelTimeInSeconds", summary.get("travelTimeInSeconds", 0)) / 60
-            })
-        
+
+        results = parse_route_summary(res.json())
+
         # Cache store
         if results:
             set_cached_item(traffic_cache, cache_key, results)
@@ -122,7 +289,37 @@ def get_tomtom_route_summary(coords: List[Tuple[float, float]], profile: str = "
         print(f"DEBUG: TomTom Route Summary Exception: {e}")
         return []
 
+async def get_tomtom_route_summary_async(coords: List[Tuple[float, float]], profile: str = "car") -> List[Dict]:
+    if not settings.TOMTOM_API_KEY or len(coords) < 2:
+        return []
+
+    cache_key = summary_cache_key(coords, profile)
+    cached = await get_cached_item_async(traffic_cache, cache_key)
+    if cached:
+        return cached
+
+    async def fetch():
+        try:
+            res = await http_request("tomtom", "GET", build_route_summary_url(coords, profile))
+            if not res.is_success:
+                print(f"DEBUG: TomTom Route Summary Error: {res.status_code} {res.text}")
+                return []
+
+            results = parse_route_summary(res.json())
+            if results:
+                await set_cached_item_async(traffic_cache, cache_key, results)
+            return results
+        except Exception as e:
+            print(f"DEBUG: TomTom Route Summary Exception: {e}")
+            return []
+
+    return await single_flight(cache_key, fetch)
+
 def get_tomtom_leg_details(start: Tuple[float, float], end: Tuple[float, float], profile: str = "car") -> Optional[Dict]:
     """Legacy individual leg fetch (fallback)"""
     res = get_tomtom_route_summary([start, end], profile)
     return res[0] if res else None
+
+async def get_tomtom_leg_details_async(start: Tuple[float, float], end: Tuple[float, float], profile: str = "car") -> Optional[Dict]:
+    res = await get_tomtom_route_summary_async([start, end], profile)
+    return res[0] if res else None
@@ -1,27 +1,42 @@
 import requests
 from typing import Optional, Dict
 from ..config import settings
+from .http_pool import http_request, provider_timeout
+
+def weather_url(lat: float, lon: float) -> str:
+    return f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={settings.OPENWEATHER_API_KEY}&units=metric"
+
+def parse_weather(data: Dict) -> Dict:
+    return {
+        "temp": round(data["main"]["temp"]),
+        "description": data["weather"][0]["description"],
+        "iconCode": data["weather"][0]["icon"][:2],
+        "location": data.get("name", "Unknown")
+    }
 
 def get_weather_data(lat: float, lon: float) -> Optional[Dict]:
     """
     Fetches weather data from OpenWeatherMap for a given lat/lon.
     """
     try:
-        response = requests.get(
-            f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={settings.OPENWEATHER_API_KEY}&units=metric"
-        )
+        response = requests.get(weather_url(lat, lon), timeout=provider_timeout("weather"))
         if not response.ok:
             print(f"DEBUG: Weather API error: {response.status_code}")
             return None
-        
-        data = response.json()
-        
-        return {
-            "temp": round(data["main"]["temp"]),
-            "description": data["weather"][0]["description"],
-            "iconCode": data["weather"][0]["icon"][:2],
-            "location": data.get("name", "Unknown")
-        }
+
+        return parse_weather(response.json())
+    except Exception as e:
+        print(f"DEBUG: Error fetching weather: {e}")
+        return None
+
+async def get_weather_data_async(lat: float, lon: float) -> Optional[Dict]:
+    try:
+        response = await http_request("weather", "GET", weather_url(lat, lon))
+        if not response.is_success:
+            print(f"DEBUG: Weather API error: {response.status_code}")
+            return None
+
+        return parse_weather(response.json())
     except Exception as e:
         print(f"DEBUG: Error fetching weather: {e}")
         return None
@@ -1,6 +1,20 @@
+import asyncio
 import requests
 from typing import Dict, Optional, List, Tuple
-from ..engine.cache_manager import wiki_cache, get_cached_item, set_cached_item
+from ..engine.cache_manager import (
+    wiki_cache, get_cached_item, set_cached_item,
+    get_cached_item_async, get_cached_items_async, set_cached_item_async, set_cached_items_async, single_flight
+)
+from .http_pool import http_request, provider_timeout
+
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+WIKI_TITLES_BATCH = 20 # MediaWiki returns intro extracts for at most 20 pages per query
+
+def wiki_cache_key(name: str, lat: Optional[float] = None, lon: Optional[float] = None) -> str:
+    cache_key = f"wiki:{name}"
+    if lat and lon:
+        cache_key += f":geo:{lat:.3f},{lon:.3f}"
+    return cache_key
 
 def fetch_wiki_data(name: str, lat: Optional[float] = None, lon: Optional[float] = None) -> Optional[Dict]:
     """
@@ -10,10 +24,7 @@ def fetch_wiki_data(name: str, lat: Optional[float] = None, lon: Optional[float]
     - Stage 2: GeoSearch (Find articles near coords)
     - Stage 3: Fuzzy Search Generator
     """
-    cache_key = f"wiki:{name}"
-    if lat and lon:
-        cache_key += f":geo:{lat:.3f},{lon:.3f}"
-    
+    cache_key = wiki_cache_key(name, lat, lon)
     cached = get_cached_item(wiki_cache, cache_key)
     if cached:
         return cached
@@ -21,7 +32,7 @@ def fetch_wiki_data(name: str, lat: Optional[float] = None, lon: Optional[float]
     try:
         # Stage 1: Exact Title Match (with redirects)
         data = wiki_api_call({"titles": name, "redirects": "1"})
-        if is_valid_wiki(data): 
+        if is_valid_wiki(data):
             set_cached_item(wiki_cache, cache_key, data)
             return data
 
@@ -35,7 +46,7 @@ def fetch_wiki_data(name: str, lat: Optional[float] = None, lon: Optional[float]
             if geo_id_data and geo_id_data.get("pageId"):
                 # Recursive fetch for the found pageId
                 geo_data = wiki_api_call({"pageids": geo_id_data["pageId"]})
-                if is_valid_wiki(geo_data): 
+                if is_valid_wiki(geo_data):
                     set_cached_item(wiki_cache, cache_key, geo_data)
                     return geo_data
 
@@ -47,21 +58,102 @@ def fetch_wiki_data(name: str, lat: Optional[float] = None, lon: Optional[float]
         })
         if is_valid_wiki(search_data):
             set_cached_item(wiki_cache, cache_key, search_data)
-        
+
         return search_data
 
     except Exception as e:
         print(f"DEBUG: Wiki Enrichment Critical Fail for {name}: {e}")
         return {}
 
-def wiki_api_call(params: Dict[str, str]) -> Dict:
-    base_url = "https://en.wikipedia.org/w/api.php"
-    
-    # Wikipedia REQUIRES a User-Agent. requests generic UA is often blocked.
-    headers = {
-        "User-Agent": "YathiraiPlanner/1.0 (https://yathirai.ai; travel@yathirai.ai) requests/2.0"
-    }
+async def fetch_wiki_data_async(name: str, lat: Optional[float] = None, lon: Optional[float] = None) -> Optional[Dict]:
+    """Async variant of fetch_wiki_data over the pooled Wikipedia client."""
+    cache_key = wiki_cache_key(name, lat, lon)
+    cached = await get_cached_item_async(wiki_cache, cache_key)
+    if cached:
+        return cached
+
+    # Concurrent lookups of the same stop share one staged enrichment
+    return await single_flight(cache_key, lambda: enrich_stages_async(cache_key, name, lat, lon))
+
+async def enrich_stages_async(cache_key: str, name: str, lat: Optional[float], lon: Optional[float]) -> Optional[Dict]:
+    try:
+        # Stage 1: Exact Title Match (with redirects)
+        data = await wiki_api_call_async({"titles": name, "redirects": "1"})
+        if is_valid_wiki(data):
+            await set_cached_item_async(wiki_cache, cache_key, data)
+            return data
+
+        return await enrich_fallback_stages_async(cache_key, name, lat, lon)
+
+    except Exception as e:
+        print(f"DEBUG: Wiki Enrichment Critical Fail for {name}: {e}")
+        return {}
+
+async def enrich_fallback_stages_async(cache_key: str, name: str, lat: Optional[float], lon: Optional[float]) -> Optional[Dict]:
+    """Stages 2-3 for a place whose exact title didn't match."""
+    try:
+        # Stage 2: GeoSearch (Best for local landmarks)
+        # As a generator, the nearest article's extract comes back in the same call
+        if lat is not None and lon is not None:
+            geo_data = await wiki_api_call_async({
+                "generator": "geosearch",
+                "ggscoord": f"{lat}|{lon}",
+                "ggsradius": "500",
+                "ggslimit": "1"
+            })
+            if is_valid_wiki(geo_data):
+                await set_cached_item_async(wiki_cache, cache_key, geo_data)
+                return geo_data
+
+        # Stage 3: Fuzzy Search Generator
+        search_data = await wiki_api_call_async({
+            "generator": "search",
+            "gsrsearch": name,
+            "gsrlimit": "1"
+        })
+        if is_valid_wiki(search_data):
+            await set_cached_item_async(wiki_cache, cache_key, search_data)
+
+        return search_data
+
+    except Exception as e:
+        print(f"DEBUG: Wiki Enrichment Critical Fail for {name}: {e}")
+        return {}
+
+async def fetch_wiki_data_batch_async(places: List[Tuple[str, Optional[float], Optional[float]]]) -> List[Dict]:
+    """
+    Batch enrichment for many (name, lat, lon) places, results in input order.
+    - Stage 0: Cache Check (one bulk lookup)
+    - Stage 1: Exact Titles, WIKI_TITLES_BATCH per multi-title query, batches in parallel
+    - Stages 2-3: GeoSearch / Fuzzy Search, concurrently for the places stage 1 missed
+    """
+    keys = [wiki_cache_key(name, lat, lon) for name, lat, lon in places]
+    results: Dict[str, Dict] = {key: value for key, value in (await get_cached_items_async(wiki_cache, keys)).items() if value}
+
+    pending = {key: place for key, place in zip(keys, places) if key not in results}
+    # "|" separates titles, so such names can only go through search
+    titles = list(dict.fromkeys(name for name, _, _ in pending.values() if name and "|" not in name))
+    batches = [titles[i:i + WIKI_TITLES_BATCH] for i in range(0, len(titles), WIKI_TITLES_BATCH)]
+    by_title: Dict[str, Dict] = {}
+    for found in await asyncio.gather(*[wiki_titles_call_async(batch) for batch in batches]):
+        by_title.update(found)
+
+    exact = {key: by_title[name] for key, (name, _, _) in pending.items() if name in by_title}
+    await set_cached_items_async(wiki_cache, exact)
+    results.update(exact)
+
+    leftovers = [(key, place) for key, place in pending.items() if key not in exact]
+    if leftovers:
+        print(f"DEBUG: Wiki batch: {len(exact)}/{len(pending)} exact titles, {len(leftovers)} to fallbacks")
+        fallbacks = await asyncio.gather(*[
+            single_flight(key, lambda key=key, place=place: enrich_fallback_stages_async(key, *place))
+            for key, place in leftovers
+        ])
+        results.update({key: data or {} for (key, _), data in zip(leftovers, fallbacks)})
+
+    return [results.get(key, {}) for key in keys]
 
+def build_wiki_params(params: Dict[str, str]) -> Dict[str, str]:
     standard_params = {
         "action": "query",
         "format": "json",
@@ -72,13 +164,32 @@ def wiki_api_call(params: Dict[str, str]) -> Dict:
         "piprop": "thumbnail",
         "pithumbsize": "1000"
     }
-    
-    # Merge and call
-    full_params = {**standard_params, **params}
-    
+
+    # Merge
+    return {**standard_params, **params}
+
+def wiki_api_call(params: Dict[str, str]) -> Dict:
+    # Wikipedia REQUIRES a User-Agent. requests generic UA is often blocked.
+    headers = {
+        "User-Agent": "YathiraiPlanner/1.0 (https://yathirai.ai; travel@yathirai.ai) requests/2.0"
+    }
+
+    try:
+        res = requests.get(WIKI_API_URL, params=build_wiki_params(params), headers=headers, timeout=provider_timeout("wiki"))
+        if not res.ok:
+            print(f"DEBUG: Wiki API HTTP Error {res.status_code} for {params.get('titles') or params.get('gsrsearch')}")
+            return {}
+        data = res.json()
+    except Exception as e:
+        print(f"DEBUG: Wiki API Exception: {e}")
+        return {}
+
+    return parse_wiki_response(data)
+
+async def wiki_api_call_async(params: Dict[str, str]) -> Dict:
     try:
-        res = requests.get(base_url, params=full_params, headers=headers, timeout=5)
-        if not res.ok: 
+        res = await http_request("wiki", "GET", WIKI_API_URL, params=build_wiki_params(params))
+        if not res.is_success:
             print(f"DEBUG: Wiki API HTTP Error {res.status_code} for {params.get('titles') or params.get('gsrsearch')}")
             return {}
         data = res.json()
@@ -86,21 +197,70 @@ def wiki_api_call(params: Dict[str, str]) -> Dict:
         print(f"DEBUG: Wiki API Exception: {e}")
         return {}
 
+    return parse_wiki_response(data)
+
+async def wiki_titles_call_async(titles: List[str]) -> Dict[str, Dict]:
+    """Stage 1 for many titles in one query: {requested title: page data} for valid matches."""
+    try:
+        res = await http_request("wiki", "GET", WIKI_API_URL, params=build_wiki_params({
+            "titles": "|".join(titles),
+            "redirects": "1",
+            "exlimit": "max",
+            "pilimit": "max"
+        }))
+        if not res.is_success:
+            print(f"DEBUG: Wiki API HTTP Error {res.status_code} for {len(titles)} titles")
+            return {}
+        data = res.json()
+    except Exception as e:
+        print(f"DEBUG: Wiki API Exception: {e}")
+        return {}
+
+    return parse_wiki_titles_response(data, titles)
+
+def parse_wiki_titles_response(data: Dict, titles: List[str]) -> Dict[str, Dict]:
+    query_data = data.get("query", {})
+    # Follow each requested title through normalisation ("eiffel tower" -> "Eiffel tower") and redirects
+    renames = {
+        entry["from"]: entry["to"]
+        for step in ("normalized", "redirects")
+        for entry in query_data.get(step, [])
+    }
+    pages = {
+        page.get("title"): (page_id, page)
+        for page_id, page in query_data.get("pages", {}).items()
+        if not page_id.startswith("-")
+    }
+
+    found = {}
+    for title in titles:
+        resolved = title
+        for _ in range(3): # normalized -> redirect (-> normalized redirect target)
+            resolved = renames.get(resolved, resolved)
+        if resolved in pages:
+            parsed = parse_wiki_page(*pages[resolved])
+            if is_valid_wiki(parsed):
+                found[title] = parsed
+    return found
+
+def parse_wiki_response(data: Dict) -> Dict:
     query_data = data.get("query", {})
-    
+
     # Special case: geosearch list returns a list of results - just return pageId to trigger detail fetch
     if "geosearch" in query_data and query_data["geosearch"]:
         return {"pageId": str(query_data["geosearch"][0]["pageid"])}
 
     pages = query_data.get("pages", {})
     if not pages: return {}
-    
+
     page_id = next(iter(pages))
     if page_id == "-1": return {}
-    
-    page = pages[page_id]
+
+    return parse_wiki_page(page_id, pages[page_id])
+
+def parse_wiki_page(page_id: str, page: Dict) -> Dict:
     extract = page.get("extract", "")
-    
+
     # Disambiguation filter (relaxed)
     if extract and ("may refer to:" in extract.lower() or len(extract) < 20):
         return {}
@@ -114,6 +274,3 @@ def wiki_api_call(params: Dict[str, str]) -> Dict:
 def is_valid_wiki(data: Optional[Dict]) -> bool:
     # LOOSENED: Accept if we have a summary OR a photo
     return bool(data and (data.get("summary") or data.get("photo")))
-
-
-
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
@@ -12,6 +13,32 @@ class Settings(BaseSettings):
     
     # App Settings
     CORS_ALLOWED_ORIGINS: List[str] = ["http://localhost:3000"]
+
+    # Route Solver Settings
+    # Days with more stops than TSP_EXACT_LIMIT use the heuristic tier
+    TSP_EXACT_LIMIT: int = 15
+    TSP_HEURISTIC_BUDGET_MS: float = 250.0
+    # Branch-and-bound pruning keeps days up to TSP_PRUNED_EXACT_LIMIT stops exact
+    TSP_BRANCH_AND_BOUND: bool = False
+    TSP_PRUNED_EXACT_LIMIT: int = 20
+    # Solver process pool size (0 = one worker per CPU)
+    TSP_SOLVER_WORKERS: int = 0
+    
+    # Local road graph (directory built by `python -m api.engine.road_graph`); empty = providers only
+    ROAD_GRAPH_PATH: str = ""
+    
+    # /api/recommend ranking: "cohere" (falls back to local when unavailable) or "local" (no network)
+    RECOMMEND_BACKEND: str = "cohere"
+    # sentence-transformers model for the local ranker (e.g. "all-MiniLM-L6-v2"); empty = BM25
+    LOCAL_EMBEDDING_MODEL: str = ""
+    
+    # Embedding store for /api/recommend ranking (one sub-directory per model); empty = in-memory only
+    EMBEDDING_STORE_PATH: str = os.path.join(tempfile.gettempdir(), "yathirai_embeddings")
+    
+    # Cache Backend: "memory" (per process), "sqlite" (per host, survives restarts) or "redis" (shared)
+    CACHE_BACKEND: str = "memory"
+    CACHE_SQLITE_PATH: str = os.path.join(tempfile.gettempdir(), "yathirai_cache.sqlite3")
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
     
     # Environment loading configuration
     # Note: Vercel production sets these in the dashboard, 
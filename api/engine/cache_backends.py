@@ -0,0 +1,230 @@
+from cachetools import TTLCache
+from typing import Any, Dict, List, Optional
+import json
+import sqlite3
+import threading
+import time
+
+# V9.1: Pluggable Cache Backends
+# Every backend exposes the same tiny mapping API used by cache_manager:
+#   cache.get(key) -> value | None, cache[key] = value, cache.clear()
+# plus get_many(keys) -> {key: value} / set_many({key: value}) for bulk cell lookups.
+# Values go through JSON for the shared backends, so only JSON-friendly
+# payloads (dicts, lists, numbers, strings) should be cached.
+# Shared backends do blocking I/O (blocking = True): async code reaches them
+# through the *_async helpers in cache_manager, which run them in a thread.
+
+class MemoryCacheBackend(TTLCache):
+    """Per-process TTL cache (the original behaviour)."""
+    blocking = False
+
+    def __init__(self, namespace: str, maxsize: int, ttl: int):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.namespace = namespace
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many(self, items: Dict[str, Any]):
+        for key, value in items.items():
+            self[key] = value
+
+class SqliteCacheBackend:
+    """
+    On-disk TTL cache shared by every worker on the host and kept across restarts.
+    All namespaces live in one table; WAL mode lets readers and a writer overlap.
+    """
+    PURGE_EVERY = 200 # Writes between expired-row sweeps
+
+    _connections = {}
+    _lock = threading.Lock()
+
+    def __init__(self, namespace: str, maxsize: int, ttl: int, path: str):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._writes = 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = self._connections.get(self.path)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections[self.path] = conn
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Optional[Any]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __setitem__(self, key: str, value: Any):
+        self.set_many({key: value})
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, value FROM cache WHERE namespace = ? AND expires_at > ? AND key IN ({','.join('?' * len(chunk))})",
+                    (self.namespace, now, *chunk)
+                ).fetchall()
+                found.update({key: json.loads(value) for key, value in rows})
+        return found
+
+    def set_many(self, items: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        rows = [(self.namespace, key, json.dumps(value), expires_at) for key, value in items.items()]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            before = self._writes
+            self._writes += len(rows)
+            if self._writes // self.PURGE_EVERY != before // self.PURGE_EVERY:
+                self._purge(conn)
+            conn.commit()
+
+    def _purge(self, conn: sqlite3.Connection):
+        # Drop expired rows, then trim the namespace back to maxsize (soonest-expiring first)
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.maxsize)
+        )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            conn.commit()
+
+class RedisCacheBackend:
+    """
+    Redis-protocol cache shared across workers and hosts. Works against any server
+    speaking RESP (Redis, Valkey, KeyDB or a local stand-in). TTLs are enforced by
+    the server; maxsize is left to the server's eviction policy.
+    """
+
+    _clients = {}
+
+    def __init__(self, namespace: str, maxsize: int, ttl: int, url: str):
+        import redis # Optional dependency, only needed for this backend
+
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.prefix = f"yathirai:{namespace}:"
+        client = self._clients.get(url)
+        if client is None:
+            client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+            client.ping() # Fail fast at startup so create_cache_backend can fall back
+            self._clients[url] = client
+        self.client = client
+
+    def get(self, key: str, default: Any = None) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else default
+
+    def __setitem__(self, key: str, value: Any):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        raw = self.client.mget([self.prefix + key for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, raw) if value is not None}
+
+    def set_many(self, items: Dict[str, Any]):
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+        pipe.execute()
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*", count=500))
+        if keys:
+            self.client.delete(*keys)
+
+class CircuitBreakerCache:
+    """
+    Shared backend behind a circuit breaker. A failed call opens the breaker for
+    COOLDOWN seconds, during which calls go to a per-process memory cache instead of
+    waiting on socket timeouts again; the first call after that retries the backend.
+    """
+    blocking = True
+    COOLDOWN = 30.0
+
+    def __init__(self, backend, fallback: MemoryCacheBackend):
+        self.backend = backend
+        self.fallback = fallback
+        self.namespace = backend.namespace
+        self._open_until = 0.0
+        self._fallback_lock = threading.Lock() # TTLCache isn't thread-safe and calls come from worker threads
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def _call(self, method: str, *args):
+        if not self.is_open:
+            try:
+                return getattr(self.backend, method)(*args)
+            except Exception as e:
+                self._open_until = time.monotonic() + self.COOLDOWN
+                print(f"DEBUG: [Cache Backend] {self.namespace} failed ({e}). Using memory for {self.COOLDOWN:.0f}s.")
+        with self._fallback_lock:
+            return getattr(self.fallback, method)(*args)
+
+    def get(self, key: str, default: Any = None) -> Optional[Any]:
+        return self._call("get", key, default)
+
+    def __setitem__(self, key: str, value: Any):
+        self._call("__setitem__", key, value)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return self._call("get_many", keys)
+
+    def set_many(self, items: Dict[str, Any]):
+        self._call("set_many", items)
+
+    def clear(self):
+        with self._fallback_lock:
+            self.fallback.clear()
+        self._call("clear")
+
+def create_cache_backend(kind: str, namespace: str, maxsize: int, ttl: int, sqlite_path: str, redis_url: str):
+    """Builds the configured backend, falling back to memory if it can't be initialised."""
+    try:
+        if kind == "sqlite":
+            return CircuitBreakerCache(SqliteCacheBackend(namespace, maxsize, ttl, sqlite_path), MemoryCacheBackend(namespace, maxsize, ttl))
+        if kind == "redis":
+            return CircuitBreakerCache(RedisCacheBackend(namespace, maxsize, ttl, redis_url), MemoryCacheBackend(namespace, maxsize, ttl))
+    except Exception as e:
+        print(f"DEBUG: [Cache Backend] {kind} unavailable for {namespace} ({e}). Using memory.")
+    return MemoryCacheBackend(namespace, maxsize, ttl)
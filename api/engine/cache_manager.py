@@ -1,28 +1,56 @@
 from cachetools import TTLCache, LRUCache
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
 import time
+from ..config import settings
+from .cache_backends import create_cache_backend
 
 # V8.5: Multi-Layer Caching Engine
 # Cache levels are sized by 'number of entries' and 'seconds to live'
+# V9.1: Each level is stored in the backend picked by CACHE_BACKEND
+# ("memory" per process, "sqlite" on disk, "redis" shared across hosts).
+
+def make_cache(namespace: str, maxsize: int, ttl: int):
+    return create_cache_backend(
+        settings.CACHE_BACKEND, namespace, maxsize, ttl,
+        settings.CACHE_SQLITE_PATH, settings.CACHE_REDIS_URL
+    )
 
 # 📍 Geocoding Cache (Cities, Landmarks) - 1 Hour TTL
 # Sized at 512 entries to cover most user searches in a session
-geo_cache = TTLCache(maxsize=512, ttl=3600)
+geo_cache = make_cache("geo", maxsize=512, ttl=3600)
 
 # 🏛️ POI Insight Cache (Wikipedia descriptions) - 24 Hour TTL
 # Descriptions are static, so we can cache them for a long time
-wiki_cache = TTLCache(maxsize=256, ttl=86400)
+wiki_cache = make_cache("wiki", maxsize=256, ttl=86400)
 
 # 🪄 AI Magic Parser Cache (Structured Trip Plans) - 30 Day TTL
 # LLM outputs for common prompts are very static. 
-magic_cache = TTLCache(maxsize=248, ttl=2592000)
+magic_cache = make_cache("magic", maxsize=248, ttl=2592000)
 
 # 🚥 Traffic Cache (Duration Matrices, Leg Summaries) - 5 Minute TTL
 # Short TTL reflects the dynamic nature of traffic while preventing
 # redundant API hits during dashboard switching/re-planning.
-traffic_cache = TTLCache(maxsize=128, ttl=300)
+traffic_cache = make_cache("traffic", maxsize=128, ttl=300)
+
+# 🧮 Matrix Cell Cache (origin→destination live/historical minutes) - 15 Minute TTL
+# One entry per cell, keyed by rounded coords, mode and traffic time bucket, so a
+# new day's matrix only fetches the cells no earlier matrix has covered.
+matrix_cache = make_cache("matrix", maxsize=50000, ttl=900)
+
+# 🛣️ Route Leg Cache (Directions geometry per endpoint pair) - 24 Hour TTL
+# Road geometry barely changes, so re-plans and patches re-use every unchanged leg.
+route_cache = make_cache("route", maxsize=4096, ttl=86400)
 
-def get_cached_item(cache: TTLCache, key: str) -> Optional[Any]:
+# 📌 POI Tile Cache (Overpass results per intent and geohash tile) - 7 Day TTL
+# OSM POIs change slowly, so popular cities are answered without calling Overpass.
+poi_cache = make_cache("poi", maxsize=4096, ttl=604800)
+
+# 🗺️ Plan State Cache (Per-day matrices, orders, polylines) - 1 Hour TTL
+# Backs /api/plan/patch so a single-stop edit only re-solves the affected day(s).
+plan_cache = make_cache("plan", maxsize=128, ttl=3600)
+
+def get_cached_item(cache, key: str) -> Optional[Any]:
     """Retrieves an item from the specific cache if it exists and hasn't expired."""
     try:
         val = cache.get(key)
@@ -32,17 +60,82 @@ def get_cached_item(cache: TTLCache, key: str) -> Optional[Any]:
     except Exception:
         return None
 
-def set_cached_item(cache: TTLCache, key: str, value: Any):
+def set_cached_item(cache, key: str, value: Any):
     """Stores an item in the specific cache."""
     try:
         cache[key] = value
     except Exception as e:
         print(f"DEBUG: [Cache Set Error] {e}")
 
+def get_cached_items(cache, keys: List[str]) -> Dict[str, Any]:
+    """Bulk lookup; returns only the keys that were found."""
+    try:
+        found = cache.get_many(keys)
+        if found:
+            print(f"DEBUG: [Cache Hit] {len(found)}/{len(keys)} keys")
+        return found
+    except Exception:
+        return {}
+
+def set_cached_items(cache, items: Dict[str, Any]):
+    """Bulk store (one transaction / round trip where the backend supports it)."""
+    try:
+        cache.set_many(items)
+    except Exception as e:
+        print(f"DEBUG: [Cache Set Error] {e}")
+
+# 🧵 Async Access
+# Async handlers use these so a shared backend's disk or network round trip runs
+# in a worker thread instead of stalling the event loop; memory caches stay inline.
+async def _run_cache_call(cache, call: Callable, *args) -> Any:
+    if getattr(cache, "blocking", False):
+        return await asyncio.to_thread(call, cache, *args)
+    return call(cache, *args)
+
+async def get_cached_item_async(cache, key: str) -> Optional[Any]:
+    return await _run_cache_call(cache, get_cached_item, key)
+
+async def set_cached_item_async(cache, key: str, value: Any):
+    await _run_cache_call(cache, set_cached_item, key, value)
+
+async def get_cached_items_async(cache, keys: List[str]) -> Dict[str, Any]:
+    return await _run_cache_call(cache, get_cached_items, keys)
+
+async def set_cached_items_async(cache, items: Dict[str, Any]):
+    await _run_cache_call(cache, set_cached_items, items)
+
+# ✈️ Single-Flight Registry
+# In-flight upstream calls keyed by the same cache keys the clients build
+# (geocode:..., matrix:..., summary:..., wiki:...). Concurrent misses for one key
+# await a single shared call instead of each hitting the provider.
+_in_flight: Dict[str, asyncio.Future] = {}
+
+async def single_flight(key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs fetch() once per key at a time; concurrent callers share its result or error."""
+    pending = _in_flight.get(key)
+    if pending is not None:
+        print(f"DEBUG: [Coalesced] Key: {key[:30]}...")
+        # Shield so a cancelled waiter doesn't cancel the shared call
+        return await asyncio.shield(pending)
+
+    task = asyncio.ensure_future(fetch())
+    _in_flight[key] = task
+
+    def release(done: asyncio.Future):
+        if _in_flight.get(key) is done:
+            del _in_flight[key]
+
+    task.add_done_callback(release)
+    return await asyncio.shield(task)
+
 def clear_all_caches():
     """Manual trigger to clear all memory (e.g., on settings change)"""
     geo_cache.clear()
     wiki_cache.clear()
     magic_cache.clear()
     traffic_cache.clear()
+    matrix_cache.clear()
+    route_cache.clear()
+    poi_cache.clear()
+    plan_cache.clear()
     print("DEBUG: All backend caches cleared.")
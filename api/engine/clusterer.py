@@ -1,6 +1,9 @@
 import math
-from typing import List, Dict, Tuple, Optional
+import numpy as np
+from collections import deque
+from typing import Deque, List, Dict, Tuple, Optional
 from datetime import datetime
+from .distance_estimator import estimate_durations_array
 
 class ClusterablePlace(dict):
     name: str
@@ -31,7 +34,8 @@ def cluster_places(
     places: List[ClusterablePlace],
     start_date: str,
     num_days: int,
-    base_coords: Optional[Tuple[float, float]] = None
+    base_coords: Optional[Tuple[float, float]] = None,
+    engine: str = "numpy"
 ) -> List[ClusteredDay]:
     """
     Python Implementation of greedy centroid-based spatial partitioning.
@@ -39,6 +43,8 @@ def cluster_places(
     :param start_date: Trip start date (YYYY-MM-DD)
     :param num_days: Total days in trip
     :param base_coords: Anchor point (e.g., hotel/city center)
+    :param engine: "numpy" (running centroid sums, vectorized scoring) or "legacy"
+                   (centroids recomputed per candidate). Both give the same assignments.
     """
     clusters = [{"places": [], "indices": []} for _ in range(num_days)]
 
@@ -48,7 +54,7 @@ def cluster_places(
     global_centroid = calculate_centroid(active_places_with_coords, base_coords or (0, 0))
 
     trip_start = datetime.fromisoformat(start_date)
-    unassigned_indices: List[int] = []
+    unassigned_indices: Deque[int] = deque()
 
     # 1. Hard Reservation Assignment
     for idx, p in enumerate(places):
@@ -68,11 +74,19 @@ def cluster_places(
     # Give empty days one unassigned spot to anchor its centroid
     for d in range(num_days):
         if len(clusters[d]["places"]) == 0 and unassigned_indices:
-            seed_idx = unassigned_indices.pop(0)
+            seed_idx = unassigned_indices.popleft()
             clusters[d]["places"].append(places[seed_idx])
             clusters[d]["indices"].append(seed_idx)
 
     # 3. Greedy Proximity Assignment for remaining spots
+    if engine == "legacy":
+        assign_greedy_legacy(clusters, places, unassigned_indices, base_coords or global_centroid)
+    else:
+        assign_greedy_numpy(clusters, places, unassigned_indices, base_coords or global_centroid)
+
+    return clusters
+
+def assign_greedy_legacy(clusters: List[ClusteredDay], places: List[ClusterablePlace], unassigned_indices: Deque[int], fallback: Tuple[float, float]):
     for idx in unassigned_indices:
         p = places[idx]
         if not p.get("coords"):
@@ -86,7 +100,7 @@ def cluster_places(
 
         for day_idx, day in enumerate(clusters):
             # Centroid of the day
-            centroid = calculate_centroid(day["places"], base_coords or global_centroid)
+            centroid = calculate_centroid(day["places"], fallback)
             dist = calculate_distance(p["coords"], centroid)
             
             # Load Balancing Adjustment (Imbalance Penalty)
@@ -100,4 +114,186 @@ def cluster_places(
         clusters[best_day]["places"].append(p)
         clusters[best_day]["indices"].append(idx)
 
+def assign_greedy_numpy(clusters: List[ClusteredDay], places: List[ClusterablePlace], unassigned_indices: Deque[int], fallback: Tuple[float, float]):
+    """
+    Same greedy rule as assign_greedy_legacy, but each day's centroid is kept as
+    running lat/lon sums (accumulated in the same order, so the floats match) and
+    all days are scored for a place in one vectorized step.
+    No spatial index: the lookup is over the num_days centroids, not over places,
+    and both the centroids and the size penalty change after every assignment,
+    so an index would be rebuilt per place to search a handful of points.
+    The legacy cost came from recomputing centroids (O(places) per day per place);
+    the running sums make each step O(num_days).
+    """
+    num_days = len(clusters)
+    sum_lat = np.zeros(num_days)
+    sum_lon = np.zeros(num_days)
+    with_coords = np.zeros(num_days)
+    sizes = np.zeros(num_days)
+
+    def add(day_idx: int, p: ClusterablePlace):
+        sizes[day_idx] += 1
+        if p.get("coords"):
+            sum_lat[day_idx] += p["coords"][0]
+            sum_lon[day_idx] += p["coords"][1]
+            with_coords[day_idx] += 1
+
+    for day_idx, day in enumerate(clusters):
+        for p in day["places"]:
+            add(day_idx, p)
+
+    for idx in unassigned_indices:
+        p = places[idx]
+        if not p.get("coords"):
+            # Fallback for places without coords
+            clusters[0]["places"].append(p)
+            clusters[0]["indices"].append(idx)
+            add(0, p)
+            continue
+
+        has_coords = with_coords > 0
+        counts = np.where(has_coords, with_coords, 1.0)
+        centroid_lat = np.where(has_coords, sum_lat / counts, fallback[0])
+        centroid_lon = np.where(has_coords, sum_lon / counts, fallback[1])
+
+        dy = p["coords"][0] - centroid_lat
+        dx = p["coords"][1] - centroid_lon
+        # Load Balancing Adjustment (Imbalance Penalty): ~500m per item
+        adjusted = np.sqrt(dx * dx + dy * dy) + sizes * 0.005
+
+        best_day = int(np.argmin(adjusted)) # First minimum, like the strict '<' scan
+        clusters[best_day]["places"].append(p)
+        clusters[best_day]["indices"].append(idx)
+        add(best_day, p)
+
+# V9.4: Capacitated Clustering
+# Alternative partitioner that fills days by available minutes rather than by count.
+MAX_MEDOID_ITERATIONS = 10
+
+def cluster_places_capacitated(
+    places: List[ClusterablePlace],
+    start_date: str,
+    num_days: int,
+    base_coords: Optional[Tuple[float, float]] = None,
+    day_capacities: Optional[List[float]] = None,
+    profile: str = "driving-car",
+    durations: Optional[List[List[float]]] = None
+) -> List[ClusteredDay]:
+    """
+    Capacitated k-medoids over travel time.
+    Each day gets a medoid stop; places are assigned in order of regret (how much
+    worse their second-best day is) to the nearest medoid whose day still has room
+    for visit_duration + travel to the medoid. Medoids are then re-picked and the
+    assignment repeated until stable. Hard reservations stay on their date.
+    :param day_capacities: Available minutes per day (from activeHours); 720 if omitted
+    :param durations: Optional travel-minute matrix over `places`; estimated from coords if omitted
+    """
+    if num_days <= 0:
+        # No days to fill (argmin/argmax below need at least one day column)
+        return []
+
+    capacities = np.asarray(day_capacities if day_capacities is not None else [720.0] * num_days, dtype=np.float64)
+    trip_start = datetime.fromisoformat(start_date)
+
+    located = [idx for idx, p in enumerate(places) if p.get("coords")]
+    position = {idx: k for k, idx in enumerate(located)}
+    if durations is not None:
+        travel = np.asarray(durations, dtype=np.float64)[np.ix_(located, located)] if located else np.zeros((0, 0))
+    else:
+        travel = estimate_durations_array([places[idx]["coords"] for idx in located], profile) if located else np.zeros((0, 0))
+    visit = np.asarray([float(places[idx].get("visit_duration") or 0) for idx in located])
+
+    # 1. Hard Reservation Assignment (pinned for every iteration)
+    pinned: List[List[int]] = [[] for _ in range(num_days)]
+    free: List[int] = []
+    for idx, p in enumerate(places):
+        if p.get("reservation_date") and p.get("is_reservation"):
+            try:
+                diff_days = (datetime.fromisoformat(p["reservation_date"]) - trip_start).days
+                if 0 <= diff_days < num_days:
+                    pinned[diff_days].append(idx)
+                    continue
+            except ValueError:
+                pass
+        free.append(idx)
+
+    free_located = [position[idx] for idx in free if idx in position]
+    free_unlocated = [idx for idx in free if idx not in position]
+    pinned_located = [[position[idx] for idx in day if idx in position] for day in pinned]
+    pinned_unlocated_minutes = np.asarray([
+        sum(float(places[idx].get("visit_duration") or 0) for idx in day if idx not in position) for day in pinned
+    ], dtype=np.float64)
+
+    def pick_medoid(members: List[int]) -> Optional[int]:
+        if not members:
+            return None
+        return members[int(np.argmin(travel[np.ix_(members, members)].sum(axis=1)))]
+
+    # 2. Seeding: pinned days start from their reservations, the rest farthest-first
+    medoids: List[Optional[int]] = [pick_medoid(day) for day in pinned_located]
+    for d in range(num_days):
+        if medoids[d] is not None:
+            continue
+        candidates = [k for k in free_located if k not in medoids]
+        if not candidates:
+            continue
+        chosen = [m for m in medoids if m is not None]
+        if chosen:
+            medoids[d] = candidates[int(np.argmax(travel[np.ix_(candidates, chosen)].min(axis=1)))]
+        elif base_coords:
+            medoids[d] = min(candidates, key=lambda k: calculate_distance(places[located[k]]["coords"], base_coords))
+        else:
+            medoids[d] = candidates[0]
+
+    # 3. Regret-ordered capacitated assignment, alternating with medoid updates
+    assigned: Dict[int, int] = {}
+    for _ in range(MAX_MEDOID_ITERATIONS):
+        cost = np.full((len(located), num_days), np.inf)
+        for d, m in enumerate(medoids):
+            if m is not None:
+                cost[:, d] = travel[:, m]
+
+        loads = pinned_unlocated_minutes.copy()
+        for d, day in enumerate(pinned_located):
+            for k in day:
+                loads[d] += visit[k] + cost[k, d] if np.isfinite(cost[k, d]) else visit[k]
+
+        def regret(k: int) -> float:
+            finite = np.sort(cost[k][np.isfinite(cost[k])])
+            return finite[1] - finite[0] if len(finite) > 1 else 0.0
+
+        assigned = {}
+        for k in sorted(free_located, key=lambda k: (-regret(k), k)):
+            need = visit[k] + np.where(np.isfinite(cost[k]), cost[k], 0.0)
+            fits = np.isfinite(cost[k]) & (loads + need <= capacities)
+            if fits.any():
+                d = int(np.argmin(np.where(fits, cost[k], np.inf)))
+            else:
+                # Nothing fits: overflow the day that ends up least over capacity
+                d = int(np.argmin(loads + need - capacities))
+            assigned[k] = d
+            loads[d] += need[d]
+
+        members = [list(day) for day in pinned_located]
+        for k, d in assigned.items():
+            members[d].append(k)
+        new_medoids = [pick_medoid(day) if day else medoids[d] for d, day in enumerate(members)]
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+
+    # 4. Places without coords go to the day with the most spare minutes
+    day_indices = [list(day) for day in pinned]
+    for k, d in assigned.items():
+        day_indices[d].append(located[k])
+    spare = capacities - np.asarray([sum(float(places[i].get("visit_duration") or 0) for i in day) for day in day_indices])
+    for idx in free_unlocated:
+        d = int(np.argmax(spare))
+        day_indices[d].append(idx)
+        spare[d] -= float(places[idx].get("visit_duration") or 0)
+
+    clusters = []
+    for day in day_indices:
+        day = sorted(day)
+        clusters.append({"places": [places[i] for i in day], "indices": day})
     return clusters
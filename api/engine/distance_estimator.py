@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# V9.2: Offline Duration Estimator
+# Zero-latency stand-in for the ORS/TomTom matrices: great-circle distance scaled
+# by a per-mode road detour factor and average speed. Used for draft plans and as
+# the last-resort fallback when every provider is slow or rate-limited.
+
+EARTH_RADIUS_KM = 6371.0
+
+# Average door-to-door speed (km/h) and road-vs-crow-flies detour per ORS profile
+MODE_PROFILES: Dict[str, Dict[str, float]] = {
+    "driving-car": {"speed_kmh": 35.0, "detour": 1.35},
+    "foot-walking": {"speed_kmh": 4.8, "detour": 1.25},
+    "cycling-regular": {"speed_kmh": 14.0, "detour": 1.3}
+}
+
+# Calibration: multiplier learned from real matrices, per profile
+CALIBRATION_WEIGHT = 0.3 # Weight of each new observation (exponential moving average)
+CALIBRATION_BOUNDS = (0.5, 3.0)
+
+class EstimatorCalibration:
+    """
+    Per-profile multipliers, blended as an exponential moving average of observed
+    real/estimated ratios. State is per process (each worker learns its own);
+    the lock keeps updates from request threads consistent.
+    """
+
+    def __init__(self, weight: float = CALIBRATION_WEIGHT, bounds: Tuple[float, float] = CALIBRATION_BOUNDS):
+        self.weight = weight
+        self.bounds = bounds
+        self._scales: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def scale(self, profile: str) -> float:
+        with self._lock:
+            return self._scales.get(profile, 1.0)
+
+    def observe(self, profile: str, ratio: float) -> float:
+        """Blends one observed ratio into the profile's multiplier and returns the new value."""
+        with self._lock:
+            previous = self._scales.get(profile)
+            blended = ratio if previous is None else previous + self.weight * (ratio - previous)
+            self._scales[profile] = min(max(blended, self.bounds[0]), self.bounds[1])
+            return self._scales[profile]
+
+    def reset(self):
+        with self._lock:
+            self._scales.clear()
+
+calibration = EstimatorCalibration()
+
+def haversine_matrix_km(coords: List[Tuple[float, float]]) -> np.ndarray:
+    """Pairwise great-circle distances (km), computed for all pairs at once."""
+    pts = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat = pts[:, 0][:, None]
+    lon = pts[:, 1][:, None]
+
+    dlat = lat.T - lat
+    dlon = lon.T - lon
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+def uncalibrated_durations_array(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> np.ndarray:
+    """Travel minutes from the mode's fixed speed and detour alone."""
+    mode = MODE_PROFILES.get(profile, MODE_PROFILES["driving-car"])
+    return haversine_matrix_km(coords) * (mode["detour"] * 60.0 / mode["speed_kmh"])
+
+def estimate_durations_array(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> np.ndarray:
+    """Estimated travel minutes as an N x N array (diagonal is 0)."""
+    return uncalibrated_durations_array(coords, profile) * calibration.scale(profile)
+
+def estimate_durations_matrix(coords: List[Tuple[float, float]], profile: str = 'driving-car') -> List[List[float]]:
+    """Drop-in for ors_client.get_durations_matrix (minutes, same shape), without a network call."""
+    if len(coords) <= 1:
+        return [[0.0]]
+    return estimate_durations_array(coords, profile).tolist()
+
+def calibrate_estimator(coords: List[Tuple[float, float]], durations: List[List[float]], profile: str = 'driving-car') -> Optional[float]:
+    """
+    Nudges the profile's multiplier towards a real provider matrix for the same coords.
+    Uses the median real/estimated ratio over routable off-diagonal cells.
+    """
+    if len(coords) < 2:
+        return None
+
+    real = np.asarray(durations, dtype=np.float64)
+    estimate = uncalibrated_durations_array(coords, profile)
+    mask = (real > 0) & (real < 99999) & (estimate > 0.5) # Skip unroutable and near-identical pins
+    if not mask.any():
+        return None
+
+    return calibration.observe(profile, float(np.median(real[mask] / estimate[mask])))
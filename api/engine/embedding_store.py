@@ -0,0 +1,147 @@
+import hashlib
+import os
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl # POSIX only; without it concurrent writers on one host may interleave appends
+except ImportError:
+    fcntl = None
+
+# V9.7: Embedding Store
+# Persistent, append-only store of document/query embeddings so repeat
+# recommendations only embed POIs that have not been seen before. One directory
+# per embedding model:
+#   vectors.f32   float32 [rows, dim], rows appended in order (opened memory-mapped)
+#   keys.txt      one key per row, "<poi id>:<text hash>" or "query:<text hash>"
+#   dim.txt       vector width, written with the first batch
+# Workers on the same host share the files; a lock file serialises appends and
+# readers pick up rows written by other processes on their next lookup.
+
+EMBED_BATCH_SIZE = 96 # Cohere embed accepts at most 96 texts per call
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def document_key(poi_id, text: str) -> str:
+    """Key of a POI document; changes when the POI's name/tags (and so its text) change."""
+    return f"{poi_id}:{text_hash(text)}"
+
+def query_key(text: str) -> str:
+    return f"query:{text_hash(text)}"
+
+class EmbeddingStore:
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._keys_size = 0 # Bytes of keys.txt already indexed
+        self._lock = threading.Lock()
+        if path:
+            try:
+                os.makedirs(path, exist_ok=True)
+            except OSError as e:
+                print(f"DEBUG: Embedding store not writable at {path}: {e}")
+                self.path = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _refresh(self):
+        """Indexes rows appended (by any process) since the last refresh."""
+        if not self.path:
+            return
+        try:
+            size = os.path.getsize(self._file("keys.txt"))
+        except OSError:
+            return
+        if size == self._keys_size:
+            return
+
+        if self.dim is None:
+            with open(self._file("dim.txt")) as f:
+                self.dim = int(f.read().strip())
+        with open(self._file("keys.txt"), "rb") as f:
+            f.seek(self._keys_size)
+            chunk = f.read(size - self._keys_size)
+        # Only index complete lines; a concurrent append may still be in flight
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        for key in complete.decode("utf-8").splitlines():
+            self._rows[key] = len(self._rows)
+        self._keys_size += len(complete)
+
+        rows = len(self._rows)
+        self._matrix = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else np.zeros((0, self.dim), dtype=np.float32)
+
+    def _drop_orphans(self):
+        """
+        Cuts both files back to the indexed rows. A writer that died between the
+        vectors and keys writes leaves vectors without keys (or half a key line);
+        appending after them would shift every later row. Call with the lock held.
+        """
+        for name, size in (("vectors.f32", len(self._rows) * self.dim * 4), ("keys.txt", self._keys_size)):
+            try:
+                if os.path.getsize(self._file(name)) > size:
+                    print(f"DEBUG: Embedding store dropping an incomplete append from {name}")
+                    os.truncate(self._file(name), size)
+            except OSError:
+                pass
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        if not self.path:
+            for key in keys:
+                self._rows[key] = len(self._rows)
+            self._matrix = vectors if self._matrix.size == 0 else np.vstack([self._matrix, vectors])
+            return
+
+        with open(self._file(".lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another worker may have appended in the meantime; keep rows and keys aligned
+            self._refresh()
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not fresh:
+                return
+            if self.dim is None:
+                with open(self._file("dim.txt"), "w") as f:
+                    f.write(str(vectors.shape[1]))
+                self.dim = vectors.shape[1]
+            self._drop_orphans()
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float32).tobytes())
+            with open(self._file("keys.txt"), "ab") as f:
+                f.write("".join(keys[i] + "\n" for i in fresh).encode("utf-8"))
+            self._refresh()
+
+    def get_or_embed(self, keys: List[str], texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> np.ndarray:
+        """
+        Vectors for keys as a contiguous float32 [len(keys), dim] array.
+        Only keys missing from the store are passed to embed, in batches of EMBED_BATCH_SIZE.
+        """
+        with self._lock:
+            self._refresh()
+            missing = list(dict.fromkeys(k for k in keys if k not in self._rows))
+            if missing:
+                text_by_key = dict(zip(keys, texts))
+                print(f"DEBUG: Embedding {len(missing)}/{len(keys)} new texts")
+                for start in range(0, len(missing), EMBED_BATCH_SIZE):
+                    batch = missing[start:start + EMBED_BATCH_SIZE]
+                    vectors = np.asarray(embed([text_by_key[k] for k in batch]), dtype=np.float32)
+                    if self.dim is None and not self.path:
+                        self.dim = vectors.shape[1]
+                    self._append(batch, vectors)
+            rows = np.fromiter((self._rows[k] for k in keys), dtype=np.int64, count=len(keys))
+            return np.ascontiguousarray(self._matrix[rows])
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(base_path: Optional[str], model: str) -> EmbeddingStore:
+    """One store per (directory, model) per process; base_path empty = in-memory only."""
+    path = os.path.join(base_path, model) if base_path else None
+    with _stores_lock:
+        if (path or model) not in _stores:
+            _stores[path or model] = EmbeddingStore(path)
+        return _stores[path or model]
@@ -0,0 +1,69 @@
+import math
+from typing import List, Tuple
+
+# V9.9: Geohash Tiles
+# Standard base-32 geohashes, used as cache tiles for POI lookups. A tile is the
+# cell a geohash names; covering_tiles lists every cell a circle touches.
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0
+
+def encode(lat: float, lon: float, precision: int) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+def tile_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a tile in degrees."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def bbox(tile: str) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a tile."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in tile:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+def covering_tiles(lat: float, lon: float, radius_m: float, precision: int) -> List[str]:
+    """Geohashes of every tile intersecting the circle's bounding box."""
+    height, width = tile_size(precision)
+    d_lat = math.degrees(radius_m / 1000.0 / EARTH_RADIUS_KM)
+    south, north = max(lat - d_lat, -90.0), min(lat + d_lat, 90.0 - 1e-9)
+    cos_lat = max(math.cos(math.radians(max(abs(south), abs(north)))), 1e-6)
+    d_lon = min(d_lat / cos_lat, 180.0)
+
+    rows = range(math.floor((south + 90) / height), math.floor((north + 90) / height) + 1)
+    first_col = math.floor((lon - d_lon + 180) / width)
+    last_col = math.floor((lon + d_lon + 180) / width)
+    n_cols = int(360 / width)
+    cols = sorted({c % n_cols for c in range(first_col, min(last_col, first_col + n_cols - 1) + 1)})
+
+    return [
+        encode(-90 + (r + 0.5) * height, -180 + (c + 0.5) * width, precision)
+        for r in rows for c in cols
+    ]
@@ -0,0 +1,105 @@
+import re
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+from .embedding_store import document_key, query_key
+
+# V9.8: Local POI Ranking
+# Offline replacement for the Cohere ranking in /api/recommend. Two tiers:
+#   - LOCAL_EMBEDDING_MODEL set and sentence-transformers installed: a small CPU
+#     sentence-embedding model, loaded once per process, vectors kept in the
+#     embedding store like the Cohere ones
+#   - otherwise: BM25 over each POI's name and tag values
+# Both set poi["score"] (higher is better) and return the POIs sorted by it.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 2 # Name tokens count this many times (a cheap BM25F)
+# Tags that describe what a place is; other tags (addresses, ids, urls) only add noise
+DESCRIPTIVE_TAGS = [
+    "tourism", "historic", "leisure", "natural", "amenity", "building", "religion",
+    "denomination", "heritage", "museum", "artwork_type", "attraction", "description"
+]
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def poi_tokens(poi: Dict) -> List[str]:
+    tags = poi.get("tags", {})
+    tokens = tokenize(poi.get("name", "")) * NAME_WEIGHT
+    for key in DESCRIPTIVE_TAGS:
+        if tags.get(key):
+            tokens.extend(tokenize(str(tags[key])))
+    return tokens
+
+def bm25_scores(documents: List[List[str]], query_terms: List[str]) -> np.ndarray:
+    """BM25 score per document; only the query terms' columns are ever materialised."""
+    terms = list(dict.fromkeys(query_terms))
+    if not documents or not terms:
+        return np.zeros(len(documents))
+
+    column = {term: j for j, term in enumerate(terms)}
+    tf = np.zeros((len(documents), len(terms)), dtype=np.float64)
+    lengths = np.empty(len(documents), dtype=np.float64)
+    for i, tokens in enumerate(documents):
+        lengths[i] = len(tokens)
+        for token in tokens:
+            j = column.get(token)
+            if j is not None:
+                tf[i, j] += 1
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+    return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None])) @ idf
+
+def rank_pois_bm25(pois: List[Dict], interest: str, expansion: Optional[List[str]] = None) -> List[Dict]:
+    """
+    BM25 over name + descriptive tags. expansion terms (e.g. the intent's OSM tag
+    values) are matched too, so "gothic architecture" still favours castles and palaces.
+    """
+    documents = [poi_tokens(poi) for poi in pois]
+    scores = bm25_scores(documents, tokenize(interest or ""))
+    if expansion:
+        scores = scores + 0.5 * bm25_scores(documents, expansion)
+
+    for poi, score in zip(pois, scores.tolist()):
+        poi["score"] = score
+    return sorted(pois, key=lambda x: x.get("score", 0), reverse=True)
+
+_models: Dict[str, object] = {}
+_models_lock = threading.Lock()
+
+def load_local_model(name: str):
+    """sentence-transformers model, once per process; None if unset or unavailable."""
+    if not name:
+        return None
+    with _models_lock:
+        if name not in _models:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _models[name] = SentenceTransformer(name, device="cpu")
+                print(f"DEBUG: Local embedding model {name} loaded")
+            except Exception as e:
+                print(f"DEBUG: Local embedding model {name} unavailable: {e}")
+                _models[name] = None
+    return _models[name]
+
+def rank_pois_embedding(pois: List[Dict], interest: str, model, store, documents: List[str]) -> List[Dict]:
+    """Cosine similarity between the query and POI documents (vectors are normalised on encode)."""
+    def embed(texts: List[str]):
+        return model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+
+    query = interest or 'Top attractions'
+    query_vector = store.get_or_embed([query_key(query)], [query], embed)[0]
+    doc_vectors = store.get_or_embed(
+        [document_key(poi.get("id"), doc) for poi, doc in zip(pois, documents)],
+        documents,
+        embed
+    )
+    scores = doc_vectors @ query_vector
+    for i, poi in enumerate(pois):
+        poi["score"] = float(scores[i])
+    return sorted(pois, key=lambda x: x.get("score", 0), reverse=True)
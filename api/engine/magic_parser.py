@@ -1,20 +1,15 @@
 import requests
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from ..config import settings
-from .cache_manager import magic_cache, get_cached_item, set_cached_item
+from ..clients.http_pool import http_request, provider_timeout
+from .cache_manager import magic_cache, get_cached_item, set_cached_item, get_cached_item_async, set_cached_item_async
 
 # V8.6: AI Magic Parser (FastAPI Implementation)
 # Ported from Node.js with Dual-Model Fallback & Centralized Caching
 
-def parse_magic_prompt(prompt: str) -> Dict[str, Any]:
-    # Check Cache (30 Day TTL)
-    cache_key = f"magic:{prompt.strip().lower()}"
-    cached = get_cached_item(magic_cache, cache_key)
-    if cached:
-        return cached
-
+def build_system_prompt() -> str:
     today = datetime.now().strftime("%Y-%m-%d")
 
     system_prompt = f"""
@@ -45,21 +40,41 @@ def parse_magic_prompt(prompt: str) -> Dict[str, Any]:
         ]
       }}
     """
+    return system_prompt
 
-    def call_gemini(model_name: str):
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={settings.GEMINI_API_KEY}"
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "contents": [{
-                "parts": [{"text": f"{system_prompt}\n\nUser text: {prompt}"}]
-            }],
-            "generationConfig": {
-                "response_mime_type": "application/json"
-            }
+def gemini_request(model_name: str, prompt: str, system_prompt: str) -> Tuple[str, Dict, Dict]:
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent?key={settings.GEMINI_API_KEY}"
+    headers = {"Content-Type": "application/json"}
+    payload = {
+        "contents": [{
+            "parts": [{"text": f"{system_prompt}\n\nUser text: {prompt}"}]
+        }],
+        "generationConfig": {
+            "response_mime_type": "application/json"
         }
-        
+    }
+    return url, headers, payload
+
+def parse_gemini_result(data: Dict) -> Dict[str, Any]:
+    # Extract & Parse
+    raw_text = data['candidates'][0]['content']['parts'][0]['text']
+    # Clean up possible markdown noise
+    clean_json = raw_text.replace("```json", "").replace("```", "").strip()
+    return json.loads(clean_json)
+
+def parse_magic_prompt(prompt: str) -> Dict[str, Any]:
+    # Check Cache (30 Day TTL)
+    cache_key = f"magic:{prompt.strip().lower()}"
+    cached = get_cached_item(magic_cache, cache_key)
+    if cached:
+        return cached
+
+    system_prompt = build_system_prompt()
+
+    def call_gemini(model_name: str):
+        url, headers, payload = gemini_request(model_name, prompt, system_prompt)
         print(f"🤖 [Cache Miss] Calling Gemini {model_name}...")
-        res = requests.post(url, headers=headers, json=payload, timeout=15)
+        res = requests.post(url, headers=headers, json=payload, timeout=provider_timeout("gemini"))
         res.raise_for_status()
         return res.json()
 
@@ -71,11 +86,7 @@ def parse_magic_prompt(prompt: str) -> Dict[str, Any]:
             # Fallback to lite model
             data = call_gemini("gemini-3.1-flash-lite-preview")
 
-        # Extract & Parse
-        raw_text = data['candidates'][0]['content']['parts'][0]['text']
-        # Clean up possible markdown noise
-        clean_json = raw_text.replace("```json", "").replace("```", "").strip()
-        result = json.loads(clean_json)
+        result = parse_gemini_result(data)
 
         # Cache Success
         set_cached_item(magic_cache, cache_key, result)
@@ -84,3 +95,34 @@ def parse_magic_prompt(prompt: str) -> Dict[str, Any]:
     except Exception as e:
         print(f"❌ AI Magic Parser Error: {e}")
         raise e
+
+async def parse_magic_prompt_async(prompt: str) -> Dict[str, Any]:
+    """Async variant of parse_magic_prompt over the pooled Gemini client."""
+    cache_key = f"magic:{prompt.strip().lower()}"
+    cached = await get_cached_item_async(magic_cache, cache_key)
+    if cached:
+        return cached
+
+    system_prompt = build_system_prompt()
+
+    async def call_gemini(model_name: str):
+        url, headers, payload = gemini_request(model_name, prompt, system_prompt)
+        print(f"🤖 [Cache Miss] Calling Gemini {model_name}...")
+        res = await http_request("gemini", "POST", url, headers=headers, json=payload)
+        res.raise_for_status()
+        return res.json()
+
+    try:
+        try:
+            data = await call_gemini("gemini-2.5-flash")
+        except Exception:
+            # Fallback to lite model
+            data = await call_gemini("gemini-3.1-flash-lite-preview")
+
+        result = parse_gemini_result(data)
+        await set_cached_item_async(magic_cache, cache_key, result)
+        return result
+
+    except Exception as e:
+        print(f"❌ AI Magic Parser Error: {e}")
+        raise e
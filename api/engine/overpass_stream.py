@@ -0,0 +1,83 @@
+import codecs
+import heapq
+import itertools
+import json
+from typing import Any, Dict, List, Tuple
+
+# V9.10: Streaming Overpass Parsing
+# Overpass answers {"version": ..., "osm3s": {...}, "elements": [ {...}, ... ], ...}.
+# OverpassElementParser is fed the body chunk by chunk and hands back each
+# element as soon as it is complete, so at most one partial element is ever
+# buffered. TopK keeps the best K items seen so far, which bounds what a large
+# fallback response can leave behind in memory.
+
+MAX_HEADER_CHARS = 1 << 16 # Anything this long without "elements" is not an Overpass JSON answer
+MAX_ELEMENT_CHARS = 1 << 20 # Single elements are a few KB; bail out rather than buffer garbage
+
+class OverpassElementParser:
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._in_elements = False
+        self.done = False # The elements array was closed
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """Parses as many complete elements as the data so far allows."""
+        if self.done:
+            return []
+        self._buf = self._buf[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+
+        if not self._in_elements:
+            start = self._buf.find('"elements"')
+            bracket = self._buf.find("[", start) if start >= 0 else -1
+            if bracket < 0:
+                if len(self._buf) > MAX_HEADER_CHARS:
+                    raise ValueError("Overpass response has no elements array")
+                return []
+            self._in_elements = True
+            self._pos = bracket + 1
+
+        elements = []
+        buf, pos = self._buf, self._pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                self.done = True
+                break
+            try:
+                element, pos = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if len(buf) - pos > MAX_ELEMENT_CHARS:
+                    raise ValueError("Overpass element too large or malformed")
+                break # Incomplete element, wait for the next chunk
+            elements.append(element)
+
+        self._pos = pos
+        if self.done:
+            self._buf, self._pos = "", 0
+        return elements
+
+class TopK:
+    """Bounded min-heap: keeps the k highest-scored items pushed so far."""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = itertools.count() # Tie-breaker; earlier items win ties
+
+    def push(self, score: float, item: Any):
+        entry = (score, -next(self._seq), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self) -> List[Any]:
+        """Kept items, best first."""
+        return [item for _, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
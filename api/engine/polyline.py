@@ -0,0 +1,234 @@
+import math
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+# V9.6: Compact Route Geometry
+# Google encoded polylines (precision 5) and Douglas-Peucker simplification,
+# so routes can be shipped as short strings instead of raw GeoJSON coordinates.
+
+POLYLINE_PRECISION = 5
+
+def zoom_tolerance(zoom: int) -> float:
+    """Degrees covered by roughly one 256px-tile pixel at a web-map zoom level."""
+    return 360.0 / (256 * 2 ** zoom)
+
+def simplify_indices(points: List[List[float]], tolerance: float, fixed: Sequence[int] = ()) -> np.ndarray:
+    """
+    Sorted indices of the points Douglas-Peucker keeps over [lon, lat(, ...)] points.
+    Distances are planar in degrees with longitude scaled by cos(latitude), which is
+    plenty at route scale. The end points and every index in fixed (e.g. way_points)
+    are always kept; the line is simplified between them.
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return np.arange(n)
+
+    pts = np.asarray([p[:2] for p in points], dtype=np.float64)
+    xy = np.column_stack([pts[:, 0] * math.cos(math.radians(float(pts[:, 1].mean()))), pts[:, 1]])
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    for i in fixed:
+        if 0 <= i < n:
+            keep[i] = True
+
+    anchors = np.flatnonzero(keep)
+    stack = list(zip(anchors[:-1].tolist(), anchors[1:].tolist()))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a, b = xy[first], xy[last]
+        seg = xy[first + 1:last]
+        ab = b - a
+        length = math.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (seg[:, 1] - a[1]) - ab[1] * (seg[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep)
+
+def simplify_line(points: List[List[float]], tolerance: float, fixed: Sequence[int] = ()) -> List[List[float]]:
+    """Douglas-Peucker simplified copy of points (see simplify_indices)."""
+    return [points[i] for i in simplify_indices(points, tolerance, fixed)]
+
+def remap_index(kept: np.ndarray, index: int) -> int:
+    """Position in the simplified line of an original vertex (or of the last kept vertex before it)."""
+    return max(int(np.searchsorted(kept, index, side="right")) - 1, 0)
+
+def simplify_feature(feature: Dict, tolerance: float) -> Dict:
+    """
+    Simplifies a LineString feature, keeping its way_points vertices and remapping
+    properties.way_points and the segments' step way_points to the new indices.
+    """
+    geometry = feature.get("geometry", {})
+    props = feature.get("properties") or {}
+    way_points = props.get("way_points") or []
+    kept = simplify_indices(geometry["coordinates"], tolerance, way_points)
+    coords = geometry["coordinates"]
+    feature = {**feature, "geometry": {**geometry, "coordinates": [coords[i] for i in kept]}}
+    if not props:
+        return feature
+
+    props = {**props}
+    if way_points:
+        props["way_points"] = [remap_index(kept, wp) for wp in way_points]
+    if props.get("segments"):
+        props["segments"] = [
+            {**segment, "steps": [
+                {**step, "way_points": [remap_index(kept, wp) for wp in step["way_points"]]} if step.get("way_points") else step
+                for step in segment["steps"]
+            ]} if segment.get("steps") else segment
+            for segment in props["segments"]
+        ]
+    feature["properties"] = props
+    return feature
+
+def encode_polyline(points: List[List[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """Encodes [lon, lat] points (GeoJSON order) as a Google polyline string (lat, lon order)."""
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for point in points:
+        lat = int(round(point[1] * factor))
+        lon = int(round(point[0] * factor))
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return "".join(chunks)
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Inverse of encode_polyline; returns [lon, lat] points."""
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append([lon / factor, lat / factor])
+    return points
+
+def simplify_route(route: Optional[Dict], zoom: Optional[int]) -> Optional[Dict]:
+    """
+    Copy of a GeoJSON route with each LineString simplified for the given zoom.
+    Stops (way_points) stay vertices of the line and the indices are remapped.
+    """
+    if not route or zoom is None:
+        return route
+    tolerance = zoom_tolerance(zoom)
+    features = [
+        simplify_feature(feature, tolerance) if feature.get("geometry", {}).get("type") == "LineString" else feature
+        for feature in route.get("features", [])
+    ]
+    return {**route, "features": features}
+
+def encode_route(route: Optional[Dict], zoom: Optional[int] = None) -> Optional[Dict]:
+    """
+    Compact form of a GeoJSON route: encoded polyline(s) plus the route summary.
+    {"polylines": [str, ...], "way_points": [[int, ...], ...], "segments": [[{...}], ...], "summary": {...}}
+    - one polyline per LineString feature, with its way_points (stop vertex indices,
+    remapped after simplification) and per-stop-pair segments as distance/duration
+    only; turn-by-turn steps are not part of the compact form.
+    """
+    if not route:
+        return None
+    simplified = simplify_route(route, zoom)
+    summary = next(
+        (f.get("properties", {}).get("summary") for f in route.get("features", []) if f.get("properties", {}).get("summary")),
+        None
+    )
+    lines = [f for f in simplified.get("features", []) if f.get("geometry", {}).get("type") == "LineString"]
+    return {
+        "polylines": [encode_polyline(f["geometry"]["coordinates"]) for f in lines],
+        "way_points": [(f.get("properties") or {}).get("way_points", []) for f in lines],
+        "segments": [
+            [{"distance": s.get("distance", 0), "duration": s.get("duration", 0)} for s in (f.get("properties") or {}).get("segments", [])]
+            for f in lines
+        ],
+        "summary": summary
+    }
+
+def route_part(route: Optional[Dict], stops: List) -> Dict:
+    """
+    Normalises one leg/day route to {"coordinates", "way_points", "segments", "distance", "duration"}.
+    Routes without way_points (straight-line fallbacks, single stops) become a straight line through stops.
+    """
+    features = (route or {}).get("features") or [{}]
+    props = features[0].get("properties") or {}
+    line = features[0].get("geometry", {}).get("coordinates")
+    way_points = props.get("way_points")
+    if not line or not way_points or len(way_points) != len(stops):
+        line = [[lon, lat] for lat, lon in stops]
+        way_points = list(range(len(stops)))
+        props = {"segments": [{"distance": 0, "duration": 0} for _ in stops[1:]]}
+    summary = props.get("summary") or {}
+    return {
+        "coordinates": line,
+        "way_points": way_points,
+        "segments": props.get("segments", []),
+        "distance": summary.get("distance", 0),
+        "duration": summary.get("duration", 0)
+    }
+
+def stitch_routes(parts: List[Dict]) -> Dict:
+    """
+    Joins consecutive route parts (see route_part) that share their boundary stop
+    into one ORS-shaped FeatureCollection: a single LineString whose way_points
+    index every stop of the whole sequence, with segments and summary combined.
+    """
+    line: List[List[float]] = []
+    way_points: List[int] = []
+    segments: List[Dict] = []
+    distance = duration = 0
+    for part in parts:
+        coords, part_wps = part["coordinates"], part["way_points"]
+        if not line:
+            offset = 0
+            line.extend(coords)
+            way_points.extend(part_wps)
+        else:
+            # The part starts at the stop the previous part ended on
+            if coords and coords[0] == line[-1]:
+                offset = len(line) - 1
+                line.extend(coords[1:])
+            else:
+                offset = len(line)
+                line.extend(coords)
+            way_points.extend(wp + offset for wp in part_wps[1:])
+        segments.extend(part["segments"])
+        distance += part["distance"]
+        duration += part["duration"]
+
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": line},
+            "properties": {
+                "summary": {"distance": distance, "duration": duration},
+                "segments": segments,
+                "way_points": way_points
+            }
+        }]
+    }
@@ -1,8 +1,16 @@
+import math
 import os
 import requests
 import json
 from typing import List, Dict, Optional
 import numpy as np
+from ..clients.http_pool import http_stream, provider_timeout
+from ..config import settings
+from . import geohash
+from .cache_manager import get_cached_items_async, poi_cache, set_cached_items_async, single_flight
+from .embedding_store import document_key, get_embedding_store, query_key
+from .local_ranker import load_local_model, rank_pois_bm25, rank_pois_embedding, tokenize
+from .overpass_stream import OverpassElementParser, TopK
 
 # Intent -> OSM tag mapping
 INTENT_TO_TAGS = {
@@ -57,96 +65,344 @@ def build_overpass_query(lat: float, lon: float, radius: int, intent: str) -> st
     {limit_str}
     """
 
+OVERPASS_URL = 'https://overpass-api.de/api/interpreter'
+FALLBACK_RADII = [30000, 100000, 1000000]
+
+def map_overpass_element(el: Dict) -> Optional[Dict]:
+    """POI dict for one Overpass element, or None if it has no usable name or coordinates."""
+    tags = el.get('tags', {})
+    poi = {
+        "id": el.get('id'),
+        "name": tags.get('name') or tags.get('operator') or tags.get('tourism') or "Unknown",
+        "lat": el.get('lat') or (el.get('center', {}).get('lat')),
+        "lon": el.get('lon') or (el.get('center', {}).get('lon')),
+        "tags": tags,
+        "opening_hours": tags.get('opening_hours'),
+        "website": tags.get('website') or tags.get('contact:website')
+    }
+    if poi["name"] != "Unknown" and poi["lat"] and poi["lon"]:
+        return poi
+    return None
+
+def map_overpass_elements(data: Dict) -> List[Dict]:
+    return [poi for poi in map(map_overpass_element, data.get('elements', [])) if poi]
+
+# V9.10: Bounded Overpass Parsing
+# Responses are parsed element by element as they stream in. From PREFILTER_MIN_RADIUS
+# up (the 100 km / 1000 km fallbacks), only the PREFILTER_TOP_K best POIs by
+# heuristic score and distance are kept, whatever the response size.
+OVERPASS_CHUNK_BYTES = 64 * 1024
+PREFILTER_MIN_RADIUS = 100000
+PREFILTER_TOP_K = 100
+
+def poi_distance_km(poi: Dict, lat: float, lon: float) -> float:
+    d_lat = math.radians(poi["lat"] - lat)
+    d_lon = math.radians(poi["lon"] - lon)
+    h = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat)) * math.cos(math.radians(poi["lat"])) * math.sin(d_lon / 2) ** 2
+    return 2 * geohash.EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+def prefilter_score(poi: Dict, query: str, dist_km: float) -> float:
+    """Cheap pre-ranking: heuristic text score (lower-cased query), minus a log penalty for distance."""
+    return heuristic_score(poi, query) - math.log1p(dist_km)
+
+def make_poi_sink(lat: float, lon: float, interest: str, bounded: bool, radius: Optional[int] = None):
+    """
+    (add(element), result()) pair collecting mapped POIs. When bounded, only the
+    PREFILTER_TOP_K best within radius metres (if given) are kept.
+    """
+    if bounded:
+        best = TopK(PREFILTER_TOP_K)
+        query = interest.lower()
+        def add(el: Dict):
+            poi = map_overpass_element(el)
+            if poi:
+                dist_km = poi_distance_km(poi, lat, lon)
+                if radius is None or dist_km * 1000.0 <= radius:
+                    best.push(prefilter_score(poi, query, dist_km), poi)
+        return add, best.items
+
+    mapped: List[Dict] = []
+    def add(el: Dict):
+        poi = map_overpass_element(el)
+        if poi:
+            mapped.append(poi)
+    return add, lambda: mapped
+
 def fetch_nearby_pois(lat: float, lon: float, interest: str, radius: int = 3000, retry_count: int = 0) -> List[Dict]:
     intent = detect_intent(interest)
     query = build_overpass_query(lat, lon, radius, intent)
 
+    # The streamed response is closed before any retry, so retries never hold its connection
+    mapped = None
     try:
-        response = requests.post('https://overpass-api.de/api/interpreter', data=query, timeout=185)
-        if response.status_code != 200:
-            if retry_count < 3:
-                next_rad = [30000, 100000, 1000000][retry_count]
-                return fetch_nearby_pois(lat, lon, interest, next_rad, retry_count + 1)
-            return []
-
-        data = response.json()
-        mapped = []
-        for el in data.get('elements', []):
-            tags = el.get('tags', {})
-            poi = {
-                "id": el.get('id'),
-                "name": tags.get('name') or tags.get('operator') or tags.get('tourism') or "Unknown",
-                "lat": el.get('lat') or (el.get('center', {}).get('lat')),
-                "lon": el.get('lon') or (el.get('center', {}).get('lon')),
-                "tags": tags,
-                "opening_hours": tags.get('opening_hours'),
-                "website": tags.get('website') or tags.get('contact:website')
-            }
-            if poi["name"] != "Unknown" and poi["lat"] and poi["lon"]:
-                mapped.append(poi)
-
-        if not mapped and retry_count < 3:
-            next_rad = [30000, 100000, 1000000][retry_count]
-            return fetch_nearby_pois(lat, lon, interest, next_rad, retry_count + 1)
+        with requests.post(OVERPASS_URL, data=query, timeout=provider_timeout("overpass"), stream=True) as response:
+            if response.status_code == 200:
+                parser = OverpassElementParser()
+                add, result = make_poi_sink(lat, lon, interest, radius >= PREFILTER_MIN_RADIUS)
+                for chunk in response.iter_content(OVERPASS_CHUNK_BYTES):
+                    for el in parser.feed(chunk):
+                        add(el)
+                mapped = result()
+    except Exception as e:
+        print(f"DEBUG: Overpass request failed at {radius} m: {e}")
 
+    if mapped:
         return mapped
+    if retry_count < 3:
+        next_rad = FALLBACK_RADII[retry_count]
+        return fetch_nearby_pois(lat, lon, interest, next_rad, retry_count + 1)
+    return mapped or []
+
+# V9.9: Tiled POI Store
+# Overpass results are cached per (intent, geohash tile) in poi_cache, and a
+# lookup is answered from the tiles covering its circle, so only tiles no
+# earlier request has seen are fetched (all of them in one bbox query).
+# Larger radii use coarser tiles to keep the tile count per lookup small.
+# Tiles of geohash-4 and coarser (the 30 km+ fallbacks) keep the 500-element cap
+# wide queries always had; a capped answer may be missing POIs, so it is returned
+# but not cached. Coarse tiles (the 100 km+ fallbacks) are fetched per request
+# instead: their answer is pre-filtered for the query, so it can't be cached for
+# other queries, and the cap keeps each of those calls as cheap as before tiling.
+POI_TILE_PRECISIONS = [(5000, 5), (40000, 4), (250000, 3)] # (max radius m, geohash length)
+CAPPED_TILE_PRECISION = 4
+CAPPED_TILE_LIMIT = 500
+COARSE_TILE_PRECISION = 3
+
+def poi_tile_precision(radius: int) -> int:
+    return next((p for max_radius, p in POI_TILE_PRECISIONS if radius <= max_radius), 2)
+
+def poi_tile_cache_key(intent: str, tile: str) -> str:
+    return f"pois:{intent}:{tile}"
+
+def tile_element_limit(precision: int) -> Optional[int]:
+    """Server-side element cap for a tile query at this geohash length (None = uncapped)."""
+    if precision <= CAPPED_TILE_PRECISION:
+        return CAPPED_TILE_LIMIT
+    return None
+
+def build_overpass_tiles_query(tiles: List[str], intent: str) -> str:
+    tag_rules = INTENT_TO_TAGS.get(intent, INTENT_TO_TAGS["attraction"])
+    boxes = [",".join(str(v) for v in geohash.bbox(tile)) for tile in tiles]
+    queries = "\n".join([
+        f'node["{rule["key"]}"~"{rule["value"]}"]({box});\n'
+        f'way["{rule["key"]}"~"{rule["value"]}"]({box});'
+        for rule in tag_rules
+        for box in boxes
+    ])
+
+    limit = tile_element_limit(len(tiles[0]))
+    timeout_val = 180 if len(tiles[0]) <= COARSE_TILE_PRECISION else 90
+    limit_str = f"out center {limit};" if limit else "out center;"
+
+    return f"""
+    [out:json][timeout:{timeout_val}];
+    (
+      {queries}
+    );
+    {limit_str}
+    """
+
+async def stream_overpass_async(query: str, add) -> bool:
+    """POSTs query and feeds each streamed element to add(); False if Overpass failed."""
+    async with http_stream("overpass", "POST", OVERPASS_URL, content=query) as response:
+        if response.status_code != 200:
+            print(f"DEBUG: Overpass returned {response.status_code}")
+            return False
+        parser = OverpassElementParser()
+        async for chunk in response.aiter_bytes(OVERPASS_CHUNK_BYTES):
+            for el in parser.feed(chunk):
+                add(el)
+        return True
+
+async def fetch_poi_tiles_async(tiles: List[str], intent: str) -> Optional[Dict[str, List[Dict]]]:
+    """
+    One Overpass call for all tiles; POIs grouped by tile (None if Overpass failed).
+    Cached unless the element cap was hit, since the tiles may then be incomplete.
+    """
+    async def fetch():
+        by_tile: Dict[str, List[Dict]] = {tile: [] for tile in tiles}
+        precision = len(tiles[0])
+        limit = tile_element_limit(precision)
+        received = 0
+
+        def add(el: Dict):
+            nonlocal received
+            received += 1
+            poi = map_overpass_element(el)
+            if poi:
+                tile = geohash.encode(poi["lat"], poi["lon"], precision)
+                if tile in by_tile: # Ways crossing into a tile are kept by the tile holding their center
+                    by_tile[tile].append(poi)
+
+        if not await stream_overpass_async(build_overpass_tiles_query(tiles, intent), add):
+            return None
+        if limit and received >= limit:
+            print(f"DEBUG: Overpass tile answer hit the {limit}-element cap, not caching {len(tiles)} tiles")
+        else:
+            await set_cached_items_async(poi_cache, {poi_tile_cache_key(intent, tile): pois for tile, pois in by_tile.items()})
+        return by_tile
+
+    key = f"pois:{intent}:" + ",".join(sorted(tiles))
+    try:
+        return await single_flight(key, fetch)
+    except Exception as e:
+        print(f"DEBUG: Overpass tile fetch failed ({len(tiles)} tiles): {e}")
+        return None
+
+async def fetch_coarse_pois_async(tiles: List[str], intent: str, lat: float, lon: float, radius: int, interest: str) -> Optional[List[Dict]]:
+    """Uncached fetch for coarse tiles, keeping only the PREFILTER_TOP_K best POIs in radius for this query."""
+    async def fetch():
+        add, result = make_poi_sink(lat, lon, interest, bounded=True, radius=radius)
+        if not await stream_overpass_async(build_overpass_tiles_query(tiles, intent), add):
+            return None
+        return result()
+
+    key = f"pois:{intent}:{lat:.4f},{lon:.4f},{radius}:{interest.lower()}"
+    try:
+        return await single_flight(key, fetch)
     except Exception as e:
-        if retry_count < 3:
-            next_rad = [30000, 100000, 1000000][retry_count]
-            return fetch_nearby_pois(lat, lon, interest, next_rad, retry_count + 1)
+        print(f"DEBUG: Overpass coarse fetch failed ({len(tiles)} tiles): {e}")
+        return None
+
+def within_radius(candidates: List[Dict], lat: float, lon: float, radius: int) -> List[Dict]:
+    """Candidates within radius metres, nearest first (one vectorised great-circle pass)."""
+    if not candidates:
         return []
+    pts = np.radians(np.array([[poi["lat"], poi["lon"]] for poi in candidates], dtype=np.float64))
+    lat0, lon0 = math.radians(lat), math.radians(lon)
+    h = np.sin((pts[:, 0] - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(pts[:, 0]) * np.sin((pts[:, 1] - lon0) / 2) ** 2
+    dist_m = 2 * geohash.EARTH_RADIUS_KM * 1000.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    inside = np.flatnonzero(dist_m <= radius)
+    return [candidates[i] for i in inside[np.argsort(dist_m[inside], kind="stable")]]
+
+async def get_pois_in_radius_async(lat: float, lon: float, radius: int, intent: str, interest: str = "") -> Optional[List[Dict]]:
+    """POIs of an intent within radius metres, nearest first; None if uncached tiles could not be fetched."""
+    precision = poi_tile_precision(radius)
+    tiles = geohash.covering_tiles(lat, lon, radius, precision)
+    if precision <= COARSE_TILE_PRECISION:
+        pois = await fetch_coarse_pois_async(tiles, intent, lat, lon, radius, interest)
+        return None if pois is None else within_radius(pois, lat, lon, radius)
+
+    keys = [poi_tile_cache_key(intent, tile) for tile in tiles]
+    found = await get_cached_items_async(poi_cache, keys)
+
+    missing = [tile for tile, key in zip(tiles, keys) if key not in found]
+    if missing:
+        fetched = await fetch_poi_tiles_async(missing, intent)
+        if fetched is None:
+            return None
+        for tile, pois in fetched.items():
+            found[poi_tile_cache_key(intent, tile)] = pois
+
+    return within_radius([poi for key in keys for poi in found.get(key, [])], lat, lon, radius)
+
+async def fetch_nearby_pois_async(lat: float, lon: float, interest: str, radius: int = 3000) -> List[Dict]:
+    """Async variant of fetch_nearby_pois: same radius escalation, served from the tiled POI store."""
+    intent = detect_intent(interest)
+    radii = [radius] + FALLBACK_RADII
+
+    for attempt, current_radius in enumerate(radii):
+        pois = await get_pois_in_radius_async(lat, lon, current_radius, intent, interest)
+        if pois is None:
+            continue
+        if pois or attempt == len(radii) - 1:
+            return pois
+
+    return []
+
+def heuristic_score(poi: Dict, query: str) -> float:
+    """Substring score of a POI for a lower-cased query."""
+    name = poi.get("name", "").lower()
+    tags = str(poi.get("tags", {})).lower()
+    score = 0
+    if query in name: score += 8
+    if query in tags: score += 5
+
+    terms = [t for t in query.split() if len(t) > 2]
+    for term in terms:
+        if term in name: score += 3
+        if term in tags: score += 2
+
+    if poi.get("tags", {}).get("tourism"):
+        score += 1
+    return score
 
 def rank_pois_heuristic(pois: List[Dict], interest: str) -> List[Dict]:
     query = interest.lower()
     for poi in pois:
-        name = poi.get("name", "").lower()
-        tags = str(poi.get("tags", {})).lower()
-        score = 0
-        if query in name: score += 8
-        if query in tags: score += 5
+        poi["score"] = heuristic_score(poi, query)
 
-        terms = [t for t in query.split() if len(t) > 2]
-        for term in terms:
-            if term in name: score += 3
-            if term in tags: score += 2
+    return sorted(pois, key=lambda x: x.get("score", 0), reverse=True)
 
-        if poi.get("tags", {}).get("tourism"):
-            score += 1
-        poi["score"] = score
+COHERE_EMBED_MODEL = "embed-english-v3.0"
+_cohere_clients: Dict[str, object] = {}
 
-    return sorted(pois, key=lambda x: x.get("score", 0), reverse=True)
+def get_cohere_client(api_key: str):
+    """One Cohere client (and its HTTP connection pool) per key per process."""
+    if api_key not in _cohere_clients:
+        import cohere
+        _cohere_clients[api_key] = cohere.Client(api_key)
+    return _cohere_clients[api_key]
+
+def poi_document(poi: Dict) -> str:
+    tags = poi.get('tags', {})
+    return f"{poi['name']}. {tags.get('tourism', '')} {tags.get('historic', '')} {tags.get('description', '')}".strip()
+
+def rank_pois_local(pois: List[Dict], interest: str) -> List[Dict]:
+    """Ranks without any network call: local embedding model if configured, BM25 otherwise."""
+    if not pois:
+        return pois
+    try:
+        model = load_local_model(settings.LOCAL_EMBEDDING_MODEL)
+        if model is not None:
+            store = get_embedding_store(settings.EMBEDDING_STORE_PATH, settings.LOCAL_EMBEDDING_MODEL.replace("/", "__"))
+            return rank_pois_embedding(pois, interest, model, store, [poi_document(poi) for poi in pois])
+
+        intent = detect_intent(interest or "")
+        expansion = [
+            term
+            for rule in INTENT_TO_TAGS.get(intent, INTENT_TO_TAGS["attraction"])
+            for value in rule["value"].split("|")
+            for term in tokenize(value)
+        ]
+        return rank_pois_bm25(pois, interest, expansion)
+    except Exception as e:
+        print(f"DEBUG: Local ranking failed: {e}")
+        return rank_pois_heuristic(pois, interest)
+
+def rank_pois(pois: List[Dict], interest: str) -> List[Dict]:
+    """Ranks with the configured RECOMMEND_BACKEND ("cohere" falls back to the local ranker)."""
+    if settings.RECOMMEND_BACKEND == "local":
+        return rank_pois_local(pois, interest)
+    return rank_pois_with_cohere(pois, interest, settings.COHERE_API_KEY)
 
 def rank_pois_with_cohere(pois: List[Dict], interest: str, api_key: str) -> List[Dict]:
     if not api_key:
-        return rank_pois_heuristic(pois, interest)
+        return rank_pois_local(pois, interest)
+    if not pois:
+        return pois
 
     try:
-        import cohere
-        co = cohere.Client(api_key)
-        
+        co = get_cohere_client(api_key)
+        store = get_embedding_store(settings.EMBEDDING_STORE_PATH, COHERE_EMBED_MODEL)
+
+        def embed(input_type: str):
+            return lambda texts: co.embed(texts=texts, model=COHERE_EMBED_MODEL, input_type=input_type).embeddings
+
         query = interest or 'Top attractions'
-        documents = [
-            f"{poi['name']}. {poi['tags'].get('tourism', '')} {poi['tags'].get('historic', '')} {poi['tags'].get('description', '')}".strip()
-            for poi in pois
-        ]
+        documents = [poi_document(poi) for poi in pois]
 
-        # Cohere v3 Embeddings
-        query_response = co.embed(
-            texts=[query],
-            model="embed-english-v3.0",
-            input_type="search_query"
-        )
-        doc_response = co.embed(
-            texts=documents,
-            model="embed-english-v3.0",
-            input_type="search_document"
+        # Cohere v3 Embeddings, served from the store for anything embedded before
+        query_vector = store.get_or_embed([query_key(query)], [query], embed("search_query"))[0]
+        doc_vectors = store.get_or_embed(
+            [document_key(poi.get("id"), doc) for poi, doc in zip(pois, documents)],
+            documents,
+            embed("search_document")
         )
 
-        query_vector = np.array(query_response.embeddings[0])
-        doc_vectors = np.array(doc_response.embeddings)
-
         # Dot product for similarity
-        scores = np.dot(doc_vectors, query_vector)
+        scores = doc_vectors @ query_vector
 
         for i, poi in enumerate(pois):
             poi["score"] = float(scores[i])
@@ -154,4 +410,4 @@ def rank_pois_with_cohere(pois: List[Dict], interest: str, api_key: str) -> List
         return sorted(pois, key=lambda x: x.get("score", 0), reverse=True)
     except Exception as e:
         print(f"Cohere Error: {e}")
-        return rank_pois_heuristic(pois, interest)
+        return rank_pois_local(pois, interest)
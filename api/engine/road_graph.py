@@ -0,0 +1,511 @@
+import glob
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import uuid
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# V9.3: Local Road Graph Engine
+# Optional in-process routing over a pre-built road graph (ROAD_GRAPH_PATH).
+# The graph is a directory of .npy arrays in CSR layout, opened memory-mapped so
+# workers share the OS page cache instead of each loading the whole city:
+#   lat.npy, lon.npy          float32 [nodes]   node coordinates
+#   indptr.npy                int64   [nodes+1] out-edge offsets per tail node
+#   tail.npy, head.npy        int32   [edges]   edge endpoints
+#   length_m.npy              float32 [edges]   edge length in metres
+#   speed_kmh.npy             float32 [edges]   car speed (maxspeed or road-class default)
+#   access.npy                uint8   [edges]   ACCESS_* bitmask
+# Build one from an OSM PBF extract with:  python -m api.engine.road_graph city.osm.pbf out_dir
+# Routing runs in scipy.sparse.csgraph (optional dependency, only needed with a graph).
+# Each profile's edge weights are derived once and saved beside the graph as
+# csr_<profile>_<build>_*.npy, so later processes map them instead of recomputing.
+# <build> is the id write_road_graph puts in meta.json, so a rebuilt graph never
+# picks up weights derived from the old one.
+# Searches are bounded: no path can beat the straight line at the profile's top
+# speed, so a search capped at L minutes only needs the nodes within L minutes of
+# that speed around its sources. Each search runs on that subgraph with limit=L,
+# and L grows until every target is settled or provably unreachable.
+
+ACCESS_CAR = 1
+ACCESS_FOOT = 2
+ACCESS_BIKE = 4
+
+# ORS profile -> (access flag, fixed speed km/h or None to use the per-edge car speed)
+PROFILE_MODES: Dict[str, Tuple[int, Optional[float]]] = {
+    "driving-car": (ACCESS_CAR, None),
+    "foot-walking": (ACCESS_FOOT, 4.8),
+    "cycling-regular": (ACCESS_BIKE, 15.0)
+}
+
+# Coordinates further than this from any graph node are treated as outside the extract
+MAX_SNAP_KM = 1.0
+
+GRAPH_ARRAYS = ["lat", "lon", "indptr", "tail", "head", "length_m", "speed_kmh", "access"]
+PROFILE_CSR_ARRAYS = ["data", "indices", "indptr", "edge"]
+MIN_EDGE_MINUTES = 1e-6 # csgraph ignores zero-weight entries, so keep duplicate-node edges routable
+EARTH_RADIUS_KM = 6371.0
+SEARCH_SLACK = 2.5 # First search limit, as a multiple of the straight-line-at-top-speed lower bound
+SEARCH_GROWTH = 2.0 # Limit multiplier for targets still unsettled after a search
+
+class RoadGraph:
+    def __init__(self, path: str):
+        self.path = path
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self._matrices: Dict[str, Tuple[object, np.ndarray]] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}
+        self._tree = None
+        self._extent = None # (unit-xyz centre, radius km) of a sphere cap holding every node
+        self._lock = threading.Lock()
+        self.build = graph_build_id(path)
+
+    def _cached_arrays(self, profile: str) -> Dict[str, np.ndarray]:
+        """
+        The profile's routable edges as a de-duplicated CSR (cheapest of any parallel
+        edges): data (minutes), indices (head), indptr, edge (original edge id).
+        Built once and saved next to the graph, then memory-mapped like the graph itself.
+        Unreadable or inconsistent files (e.g. another worker mid-write) count as a miss.
+        """
+        prefix = os.path.join(self.path, f"csr_{profile}_{self.build}_")
+        cached = self._load_csr(prefix)
+        if cached is not None:
+            return cached
+
+        flag, speed = PROFILE_MODES.get(profile, PROFILE_MODES["driving-car"])
+        edges = np.flatnonzero(np.asarray(self.access) & flag)
+        speed_kmh = self.speed_kmh[edges] if speed is None else np.float32(speed)
+        minutes = np.maximum(self.length_m[edges] / (speed_kmh * np.float32(1000.0 / 60.0)), MIN_EDGE_MINUTES)
+        tail, head = self.tail[edges], self.head[edges]
+
+        order = np.lexsort((minutes, head, tail))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = (tail[order][1:] != tail[order][:-1]) | (head[order][1:] != head[order][:-1])
+        order = order[first]
+
+        arrays = {
+            # csgraph works in float64; storing it that way lets it use the mapped pages as-is
+            "data": minutes[order].astype(np.float64),
+            "indices": head[order].astype(np.int32),
+            "indptr": np.concatenate([[0], np.cumsum(np.bincount(tail[order], minlength=len(self.lat)))]).astype(np.int32),
+            "edge": edges[order].astype(np.int32)
+        }
+        try:
+            for name, array in arrays.items():
+                # Complete files only: readers either see the old state or the whole array
+                fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".csr-", suffix=".npy")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        np.save(f, array)
+                    os.replace(tmp, f"{prefix}{name}.npy")
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+        except OSError as e:
+            print(f"DEBUG: Road graph weights for {profile} kept in memory ({e})")
+            return arrays
+        return self._load_csr(prefix) or arrays
+
+    def _load_csr(self, prefix: str) -> Optional[Dict[str, np.ndarray]]:
+        try:
+            arrays = {name: np.load(f"{prefix}{name}.npy", mmap_mode="r") for name in PROFILE_CSR_ARRAYS}
+        except (OSError, ValueError, EOFError):
+            return None
+        n_entries = len(arrays["data"])
+        if len(arrays["indptr"]) != len(self.lat) + 1 or len(arrays["indices"]) != n_entries or len(arrays["edge"]) != n_entries or int(arrays["indptr"][-1]) != n_entries:
+            return None
+        return arrays
+
+    def profile_matrix(self, profile: str):
+        """(scipy CSR of edge minutes, original edge id per stored entry) for a profile."""
+        with self._lock:
+            if profile not in self._matrices:
+                from scipy.sparse import csr_matrix # Optional dependency, only needed with a road graph
+                arrays = self._cached_arrays(profile)
+                n = len(self.lat)
+                matrix = csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=(n, n), copy=False)
+                self._matrices[profile] = (matrix, arrays["edge"])
+            return self._matrices[profile]
+
+    def profile_bounds(self, profile: str) -> Tuple[float, float]:
+        """
+        (top speed km/h, longest edge minutes) of a profile. The speed is measured
+        against the straight line between edge endpoints, so straight-line distance
+        over it is a true lower bound on any path's minutes.
+        """
+        matrix, edge_ids = self.profile_matrix(profile)
+        with self._lock:
+            if profile not in self._bounds:
+                minutes = np.asarray(matrix.data)
+                if minutes.size == 0:
+                    self._bounds[profile] = (1.0, 0.0)
+                else:
+                    edges = np.asarray(edge_ids)
+                    tail, head = np.asarray(self.tail)[edges], np.asarray(self.head)[edges]
+                    km = _great_circle_km(self.lat[tail], self.lon[tail], self.lat[head], self.lon[head])
+                    self._bounds[profile] = (max(float(np.max(km / minutes)) * 60.0, 1e-6), float(minutes.max()))
+            return self._bounds[profile]
+
+    def _spatial_index(self):
+        """KD-tree over unit-sphere xyz (chord distance orders neighbours like great-circle distance)."""
+        with self._lock:
+            if self._tree is None:
+                from scipy.spatial import cKDTree
+                xyz = _unit_xyz(self.lat, self.lon)
+                self._tree = cKDTree(xyz)
+                centre = xyz.mean(axis=0)
+                centre /= max(np.linalg.norm(centre), 1e-12)
+                radius = float(np.max(_chord_to_km(np.linalg.norm(xyz - centre, axis=1)))) if len(xyz) else 0.0
+                self._extent = (centre, radius)
+        return self._tree
+
+    def snap(self, coords: List[Tuple[float, float]]) -> List[Optional[int]]:
+        """Nearest graph node per (lat, lon), or None if outside MAX_SNAP_KM."""
+        chord, idx = self._spatial_index().query(_unit_xyz(*np.asarray(coords, dtype=np.float64).reshape(-1, 2).T))
+        return [int(i) if c * EARTH_RADIUS_KM <= MAX_SNAP_KM else None for c, i in zip(np.atleast_1d(chord), np.atleast_1d(idx))]
+
+    def _nodes_within(self, sources: List[int], radius_km: float) -> Optional[np.ndarray]:
+        """
+        Sorted ids of the nodes in one circle covering radius_km around every source
+        (a superset of the union of the per-source circles); None if that is every node.
+        """
+        tree = self._spatial_index()
+        centre, extent_km = self._extent
+        xyz = _unit_xyz(self.lat[sources], self.lon[sources])
+        mid = xyz.mean(axis=0)
+        mid /= max(np.linalg.norm(mid), 1e-12)
+        reach_km = radius_km + float(np.max(_chord_to_km(np.linalg.norm(xyz - mid, axis=1))))
+        if _chord_to_km(np.linalg.norm(mid - centre)) + extent_km <= reach_km:
+            return None
+        chord = 2.0 * math.sin(min(reach_km / EARTH_RADIUS_KM, math.pi) / 2.0) * (1 + 1e-6)
+        nodes = np.flatnonzero(np.sum((tree.data - mid) ** 2, axis=1) <= chord * chord)
+        return None if len(nodes) == len(self.lat) else nodes
+
+    def _search(self, profile: str, targets_by_source: Dict[int, List[int]], predecessors: bool = False) -> Dict[int, tuple]:
+        """
+        Bounded one-to-many Dijkstra per source. Returns source -> (minutes per target,
+        inf if unreachable) or, with predecessors, source -> (minutes, subgraph CSR,
+        subgraph node ids, subgraph edge ids, predecessor row in subgraph ids).
+        """
+        from scipy.sparse.csgraph import dijkstra
+        matrix, edge_ids = self.profile_matrix(profile)
+        top_kmh, longest_edge = self.profile_bounds(profile)
+
+        limits = {}
+        for source, targets in targets_by_source.items():
+            km = _great_circle_km(self.lat[source], self.lon[source], self.lat[targets], self.lon[targets])
+            limits[source] = max(SEARCH_SLACK * float(np.max(km, initial=0.0)) / top_kmh * 60.0, longest_edge, MIN_EDGE_MINUTES)
+
+        results: Dict[int, tuple] = {}
+        settled: Dict[int, int] = {}
+        pending = sorted(targets_by_source)
+        while pending:
+            limit = max(limits[source] for source in pending)
+            nodes = self._nodes_within(pending, limit / 60.0 * top_kmh)
+            if nodes is None:
+                sub, sub_edges, local = matrix, edge_ids, np.asarray(pending)
+            else:
+                sub, sub_edges = _subgraph(matrix, edge_ids, nodes)
+                local = np.searchsorted(nodes, pending)
+            found = dijkstra(sub, directed=True, indices=local, limit=limit, return_predecessors=predecessors)
+            dist, pred = found if predecessors else (found, None)
+
+            still_pending = []
+            for row, source in enumerate(pending):
+                targets = np.asarray(targets_by_source[source])
+                if nodes is None:
+                    minutes = dist[row, targets]
+                else:
+                    at = np.minimum(np.searchsorted(nodes, targets), len(nodes) - 1)
+                    minutes = np.where(nodes[at] == targets, dist[row, at], np.inf)
+                count = int(np.count_nonzero(np.isfinite(dist[row])))
+                # A longer limit that settles no new node means the rest is unreachable, as
+                # long as the limit grew by more than any single edge (checked when growing)
+                exhausted = settled.get(source) == count
+                if np.all(np.isfinite(minutes)) or exhausted:
+                    results[source] = (minutes, sub, nodes, sub_edges, pred[row]) if predecessors else (minutes,)
+                else:
+                    settled[source] = count
+                    limits[source] = max(limit * SEARCH_GROWTH, limit + 2 * longest_edge)
+                    still_pending.append(source)
+            pending = still_pending
+        return results
+
+    def durations(self, sources: List[int], targets: List[int], profile: str) -> np.ndarray:
+        """Minutes from every source to every target (inf where unreachable), one bounded search per source."""
+        found = self._search(profile, {source: list(targets) for source in sources})
+        return np.array([found[source][0] for source in sources], dtype=np.float64).reshape(len(sources), len(targets))
+
+    def shortest_paths(self, legs: List[Tuple[int, int]], profile: str) -> List[Tuple[float, List[int]]]:
+        """(minutes, edge ids along the path) per (source, target) leg; (inf, []) if unreachable."""
+        targets_by_source: Dict[int, List[int]] = {}
+        for source, target in legs:
+            targets_by_source.setdefault(source, []).append(target)
+        found = self._search(profile, targets_by_source, predecessors=True)
+        position = {source: {} for source in targets_by_source}
+        for source, targets in targets_by_source.items():
+            for k, target in enumerate(targets):
+                position[source][target] = k
+
+        paths = []
+        for source, target in legs:
+            minutes, sub, nodes, sub_edges, pred = found[source]
+            total = float(minutes[position[source][target]])
+            if not np.isfinite(total):
+                paths.append((math.inf, []))
+                continue
+            to_local = (lambda v: v) if nodes is None else (lambda v: int(np.searchsorted(nodes, v)))
+            start_local = to_local(source)
+            path = [to_local(target)]
+            while path[-1] != start_local:
+                path.append(int(pred[path[-1]]))
+            path.reverse()
+            edges = []
+            for u, v in zip(path, path[1:]):
+                start, end = int(sub.indptr[u]), int(sub.indptr[u + 1])
+                # Row entries are sorted by head, so the (u, v) entry is a binary search away
+                k = start + int(np.searchsorted(sub.indices[start:end], v))
+                edges.append(int(sub_edges[k]))
+            paths.append((total, edges))
+        return paths
+
+def _subgraph(matrix, edge_ids: np.ndarray, nodes: np.ndarray):
+    """(CSR restricted to the sorted node ids, renumbered 0..len-1; original edge id per entry)."""
+    from scipy.sparse import csr_matrix
+    starts = np.asarray(matrix.indptr[nodes], dtype=np.int64)
+    counts = np.asarray(matrix.indptr[nodes + 1], dtype=np.int64) - starts
+    entries = np.arange(int(counts.sum()), dtype=np.int64) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    heads = np.asarray(matrix.indices[entries])
+    local = np.minimum(np.searchsorted(nodes, heads), len(nodes) - 1)
+    keep = nodes[local] == heads
+    rows = np.repeat(np.arange(len(nodes)), counts)[keep]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(nodes)))]).astype(np.int32)
+    sub = csr_matrix((np.asarray(matrix.data[entries[keep]]), local[keep].astype(np.int32), indptr), shape=(len(nodes), len(nodes)))
+    return sub, np.asarray(edge_ids[entries[keep]])
+
+def _great_circle_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    p1, p2 = np.radians(np.asarray(lat1, dtype=np.float64)), np.radians(np.asarray(lat2, dtype=np.float64))
+    d_lon = np.radians(np.asarray(lon2, dtype=np.float64) - np.asarray(lon1, dtype=np.float64))
+    h = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+def _chord_to_km(chord) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0.0, 1.0))
+
+def graph_build_id(path: str) -> str:
+    """meta.json's build id; graphs written before build ids fall back to a hash of the arrays' size and mtime."""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            build = json.load(f).get("build")
+        if build:
+            return str(build)
+    except (OSError, ValueError):
+        pass
+    stats = [os.stat(os.path.join(path, f"{name}.npy")) for name in GRAPH_ARRAYS]
+    return hashlib.sha1(repr([(s.st_size, s.st_mtime_ns) for s in stats]).encode()).hexdigest()[:16]
+
+def _unit_xyz(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+_graphs: Dict[str, Optional[RoadGraph]] = {}
+_graphs_lock = threading.Lock()
+
+def load_road_graph(path: Optional[str]) -> Optional[RoadGraph]:
+    """Opens (once per process) the graph at path; None if unset or unreadable."""
+    if not path:
+        return None
+    with _graphs_lock:
+        if path not in _graphs:
+            try:
+                _graphs[path] = RoadGraph(path)
+                print(f"DEBUG: Road graph loaded from {path} ({len(_graphs[path].lat)} nodes)")
+            except Exception as e:
+                print(f"DEBUG: Road graph unavailable at {path}: {e}")
+                _graphs[path] = None
+    return _graphs[path]
+
+def get_local_durations_matrix(coords: List[Tuple[float, float]], profile: str = 'driving-car', graph_path: Optional[str] = None) -> Optional[List[List[float]]]:
+    """
+    Local counterpart of ors_client.get_durations_matrix (minutes, 99999 if unroutable).
+    Returns None when no graph is loaded or a coordinate lies outside it.
+    """
+    graph = load_road_graph(graph_path)
+    if graph is None:
+        return None
+    if len(coords) <= 1:
+        return [[0.0]]
+
+    nodes = graph.snap(coords)
+    if any(node is None for node in nodes):
+        return None
+
+    minutes = graph.durations(nodes, nodes, profile)
+    minutes[~np.isfinite(minutes)] = 99999
+    np.fill_diagonal(minutes, 0.0)
+    return minutes.tolist()
+
+def get_local_route_polyline(coords: List[Tuple[float, float]], profile: str = 'driving-car', graph_path: Optional[str] = None) -> Optional[Dict]:
+    """
+    Local counterpart of ors_client.get_route_polyline (GeoJSON FeatureCollection).
+    Returns None when no graph is loaded or any leg can't be routed.
+    """
+    graph = load_road_graph(graph_path)
+    if graph is None or len(coords) < 2:
+        return None
+
+    nodes = graph.snap(coords)
+    if any(node is None for node in nodes):
+        return None
+
+    line = [[float(graph.lon[nodes[0]]), float(graph.lat[nodes[0]])]]
+    way_points = [0]
+    segments = []
+    for minutes, edges in graph.shortest_paths(list(zip(nodes, nodes[1:])), profile):
+        if minutes == math.inf:
+            return None
+        heads = graph.head[edges].tolist() if edges else []
+        line.extend([float(graph.lon[v]), float(graph.lat[v])] for v in heads)
+        way_points.append(len(line) - 1)
+        segments.append({
+            "distance": float(np.sum(graph.length_m[edges])) if edges else 0.0,
+            "duration": minutes * 60
+        })
+
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": line},
+            "properties": {
+                "summary": {
+                    "distance": sum(s["distance"] for s in segments),
+                    "duration": sum(s["duration"] for s in segments)
+                },
+                "segments": segments,
+                "way_points": way_points
+            }
+        }]
+    }
+
+# --- Graph builder (offline step, needs the optional `osmium` package) ---
+
+# Default car speeds (km/h) by OSM highway class; classes not listed are not routable
+HIGHWAY_SPEEDS = {
+    "motorway": 100, "motorway_link": 60, "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 40, "secondary": 50, "secondary_link": 40,
+    "tertiary": 40, "tertiary_link": 30, "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 30,
+    "pedestrian": 5, "footway": 5, "path": 5, "steps": 3, "cycleway": 15, "track": 15
+}
+NO_CAR = {"pedestrian", "footway", "path", "steps", "cycleway", "track"}
+NO_FOOT = {"motorway", "motorway_link", "trunk", "trunk_link"}
+NO_BIKE = {"motorway", "motorway_link", "trunk", "trunk_link", "footway", "steps", "pedestrian"}
+
+def parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        number = float(value.split()[0])
+    except ValueError:
+        return None
+    return number * 1.609 if "mph" in value else number
+
+def build_road_graph(pbf_path: str, out_dir: str) -> Dict[str, int]:
+    """Builds the CSR arrays described above from an OSM PBF extract."""
+    import osmium # Optional dependency, only needed to build graphs
+
+    tails, heads, lengths, speeds, access = [], [], [], [], []
+    node_index: Dict[int, int] = {}
+    lats, lons = [], []
+
+    def node_id(location, osm_id: int) -> int:
+        idx = node_index.get(osm_id)
+        if idx is None:
+            idx = node_index[osm_id] = len(lats)
+            lats.append(location.lat)
+            lons.append(location.lon)
+        return idx
+
+    class WayHandler(osmium.SimpleHandler):
+        def way(self, w):
+            highway = w.tags.get("highway")
+            if highway not in HIGHWAY_SPEEDS:
+                return
+            flags = 0
+            if highway not in NO_CAR and w.tags.get("motor_vehicle") != "no":
+                flags |= ACCESS_CAR
+            if highway not in NO_FOOT and w.tags.get("foot") != "no":
+                flags |= ACCESS_FOOT
+            if highway not in NO_BIKE and w.tags.get("bicycle") != "no":
+                flags |= ACCESS_BIKE
+            if not flags:
+                return
+
+            speed = parse_maxspeed(w.tags.get("maxspeed")) or HIGHWAY_SPEEDS[highway]
+            oneway = w.tags.get("oneway") in ("yes", "1", "true") or highway in ("motorway", "motorway_link")
+            try:
+                refs = [(node_id(n.location, n.ref), n.location) for n in w.nodes]
+            except osmium.InvalidLocationError:
+                return
+
+            for (a, loc_a), (b, loc_b) in zip(refs, refs[1:]):
+                meters = _haversine_m(loc_a.lat, loc_a.lon, loc_b.lat, loc_b.lon)
+                # One-way streets stay walkable against the flow
+                for u, v, f in ((a, b, flags), (b, a, (ACCESS_FOOT & flags) if oneway else flags)):
+                    if f:
+                        tails.append(u)
+                        heads.append(v)
+                        lengths.append(meters)
+                        speeds.append(speed)
+                        access.append(f)
+
+    WayHandler().apply_file(pbf_path, locations=True)
+    return write_road_graph(out_dir, lats, lons, tails, heads, lengths, speeds, access)
+
+def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(h))
+
+def write_road_graph(out_dir: str, lats, lons, tails, heads, lengths, speeds, access) -> Dict[str, int]:
+    """Sorts an edge list into CSR and writes the .npy arrays."""
+    n_nodes = len(lats)
+    tail = np.asarray(tails, dtype=np.int32)
+    head = np.asarray(heads, dtype=np.int32)
+
+    order = np.argsort(tail, kind="stable")
+    tail, head = tail[order], head[order]
+    arrays = {
+        "lat": np.asarray(lats, dtype=np.float32),
+        "lon": np.asarray(lons, dtype=np.float32),
+        "indptr": np.concatenate([[0], np.cumsum(np.bincount(tail, minlength=n_nodes))]).astype(np.int64),
+        "tail": tail,
+        "head": head,
+        "length_m": np.asarray(lengths, dtype=np.float32)[order],
+        "speed_kmh": np.asarray(speeds, dtype=np.float32)[order],
+        "access": np.asarray(access, dtype=np.uint8)[order]
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Profile weights derived from a previous graph in this directory are stale now
+    for stale in glob.glob(os.path.join(out_dir, "csr_*.npy")):
+        os.remove(stale)
+    for name, array in arrays.items():
+        np.save(os.path.join(out_dir, f"{name}.npy"), array)
+    stats = {"nodes": n_nodes, "edges": int(len(tail))}
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({**stats, "build": uuid.uuid4().hex}, f)
+    return stats
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m api.engine.road_graph <extract.osm.pbf> <out_dir>")
+        sys.exit(1)
+    print(build_road_graph(sys.argv[1], sys.argv[2]))
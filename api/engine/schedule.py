@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import List, Dict, Optional, Tuple
 
 class Place(dict):
@@ -30,6 +31,69 @@ def set_time_on_date(d: datetime, hours: int, minutes: int) -> datetime:
     return d.replace(hour=hours, minute=minutes, second=0, microsecond=0)
 
 def generate_schedule(
+    places: List[Place],
+    coords: List[Tuple[float, float]],
+    order: List[int],
+    start_date: datetime,
+    active_hours: Dict[str, ActiveHours],
+    durations_matrix: Optional[List[List[float]]],
+    base_durations_matrix: Optional[List[List[float]]] = None,
+    historical_durations_matrix: Optional[List[List[float]]] = None,
+    engine: str = "columnar",
+    live_legs: Optional[List[float]] = None,
+    historical_legs: Optional[List[float]] = None
+) -> List[ScheduleStop]:
+    """
+    Python Implementation of temporal schedule generation with traffic awareness.
+    Travel times come either from n x n matrices (only [order[i-1]][order[i]] is read)
+    or, in O(n), from leg vectors: live_legs[i] / historical_legs[i] are the minutes
+    from order[i] to order[i+1].
+    :param engine: "columnar" (integer timeline, same output) or "legacy" (datetime walk).
+                   Timezone-aware inputs always use the legacy walk.
+    """
+    if live_legs is None:
+        live_legs = matrix_to_legs(order, durations_matrix)
+        if historical_durations_matrix:
+            historical_legs = matrix_to_legs(order, historical_durations_matrix)
+    # Legs that were not supplied count as 0 minutes, as missing matrix cells always did
+    live_legs = pad_legs(live_legs, len(order))
+    if historical_legs is not None:
+        historical_legs = pad_legs(historical_legs, len(order))
+
+    if engine == "columnar":
+        schedule = generate_schedule_columnar(
+            places, coords, order, start_date, active_hours,
+            live_legs, historical_legs
+        )
+        if schedule is not None:
+            return schedule
+
+    if durations_matrix is None:
+        durations_matrix = legs_to_sparse(order, live_legs)
+        if historical_legs is not None:
+            historical_durations_matrix = legs_to_sparse(order, historical_legs)
+    return generate_schedule_legacy(
+        places, coords, order, start_date, active_hours,
+        durations_matrix, base_durations_matrix, historical_durations_matrix
+    )
+
+def matrix_to_legs(order: List[int], matrix: List[List[float]]) -> List[float]:
+    return [matrix[order[i - 1]][order[i]] for i in range(1, len(order))]
+
+def pad_legs(legs: List[float], n_stops: int) -> List[float]:
+    """Leg vector cut or zero-filled to exactly n_stops - 1 entries."""
+    n_legs = max(n_stops - 1, 0)
+    legs = list(legs[:n_legs])
+    return legs + [0] * (n_legs - len(legs))
+
+def legs_to_sparse(order: List[int], legs: List[float]) -> Dict[int, Dict[int, float]]:
+    """Leg vector as a {from: {to: minutes}} lookup, indexable like a matrix."""
+    sparse: Dict[int, Dict[int, float]] = {}
+    for i, minutes in enumerate(legs):
+        sparse.setdefault(order[i], {})[order[i + 1]] = minutes
+    return sparse
+
+def generate_schedule_legacy(
     places: List[Place],
     coords: List[Tuple[float, float]],
     order: List[int],
@@ -41,6 +105,7 @@ def generate_schedule(
 ) -> List[ScheduleStop]:
     """
     Python Implementation of temporal schedule generation with traffic awareness.
+    Walks the timeline with datetime objects (reference implementation).
     """
     schedule = []
 
@@ -166,3 +231,206 @@ def generate_schedule(
 
     return schedule
 
+
+# V9.5: Columnar Schedule Generation
+# The timeline is kept as integer microseconds since 0001-01-01 (proleptic ordinal
+# days * DAY_US + time of day), which is exactly what datetime + timedelta
+# arithmetic resolves to. Minute values go through timedelta once for the same
+# rounding, dates and active hours are parsed once up front, and strings are
+# formatted at the end (once per distinct day for the date parts).
+MICROSECOND = timedelta(microseconds=1)
+MINUTE_US = 60 * 1_000_000
+DAY_US = 1440 * MINUTE_US
+DEFAULT_ACTIVE_HOURS = {"start": {"hours": 8, "minutes": 0}, "end": {"hours": 20, "minutes": 0}}
+
+@lru_cache(maxsize=4096)
+def minutes_to_us(minutes: float) -> int:
+    return timedelta(minutes=minutes) // MICROSECOND
+
+def datetime_to_us(dt: datetime) -> int:
+    return dt.toordinal() * DAY_US + ((dt.hour * 60 + dt.minute) * 60 + dt.second) * 1_000_000 + dt.microsecond
+
+def clock_to_us(clock: Dict[str, int]) -> Optional[int]:
+    hours, minutes = clock["hours"], clock["minutes"]
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None # datetime.replace would raise; leave that to the legacy walk
+    return (hours * 60 + minutes) * MINUTE_US
+
+def parse_forced_date(value) -> Optional[int]:
+    """Forced date as a proleptic ordinal (None if absent or unparseable)."""
+    if not value:
+        return None
+    try:
+        # Handle YYYY-MM-DD or full ISO strings
+        if 'T' in value:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).date().toordinal()
+        return datetime.date(datetime.fromisoformat(value)).toordinal()
+    except (ValueError, TypeError):
+        return None
+
+def generate_schedule_columnar(
+    places: List[Place],
+    coords: List[Tuple[float, float]],
+    order: List[int],
+    start_date: datetime,
+    active_hours: Dict[str, ActiveHours],
+    live_legs: List[float],
+    historical_legs: Optional[List[float]] = None
+) -> Optional[List[ScheduleStop]]:
+    """
+    Integer-timeline equivalent of generate_schedule_legacy with byte-identical output.
+    Returns None for inputs it can't reproduce exactly (timezone-aware datetimes,
+    out-of-range clock values) so the caller falls back to the legacy walk.
+    """
+    if start_date.tzinfo is not None:
+        return None
+
+    # Active hours per ordinal day: (start, end) offsets from midnight
+    hours_by_day: Dict[int, Tuple[int, int]] = {}
+    for date_str, params in active_hours.items():
+        try:
+            day = datetime.strptime(date_str, "%Y-%m-%d")
+        except (ValueError, TypeError):
+            continue
+        if day.strftime("%Y-%m-%d") != date_str:
+            continue # The legacy lookup only matches canonical keys
+        start_us, end_us = clock_to_us(params["start"]), clock_to_us(params["end"])
+        if start_us is None or end_us is None:
+            return None
+        hours_by_day[day.toordinal()] = (start_us, end_us)
+    default_hours = (clock_to_us(DEFAULT_ACTIVE_HOURS["start"]), clock_to_us(DEFAULT_ACTIVE_HOURS["end"]))
+
+    def day_hours(day: int) -> Tuple[int, int]:
+        return hours_by_day.get(day, default_hours)
+
+    # Pre-parse per-stop inputs
+    n = len(order)
+    forced_days: List[Optional[int]] = []
+    reservations: List[Optional[int]] = []
+    visit_us: List[int] = []
+    for idx in order:
+        place = places[idx]
+        forced_days.append(parse_forced_date(place.get("forcedDate") or place.get("forced_date")))
+
+        reservation = place.get("reservation_time")
+        if reservation and isinstance(reservation, str):
+            try:
+                reservation = datetime.fromisoformat(reservation.replace('Z', '+00:00'))
+            except (ValueError, TypeError):
+                reservation = None
+        if reservation and isinstance(reservation, datetime):
+            if reservation.tzinfo is not None:
+                return None
+            reservations.append(datetime_to_us(reservation))
+        else:
+            reservations.append(None)
+
+        visit_us.append(minutes_to_us(place.get("visit_duration", 60)))
+
+    travel = [0] * n
+    hist = [0] * n
+    delay = [0] * n
+    for i in range(1, n):
+        travel[i] = live_legs[i - 1]
+        if historical_legs is not None:
+            hist[i] = historical_legs[i - 1]
+            delay[i] = travel[i] - hist[i]
+        else:
+            hist[i] = travel[i]
+
+    # Timeline (integer microseconds)
+    start_day = start_date.toordinal()
+    current = start_day * DAY_US + day_hours(start_day)[0]
+    starts: List[int] = []
+    ends: List[int] = []
+    for i in range(n):
+        # Forced Date Alignment
+        target = forced_days[i]
+        if target is not None and current // DAY_US < target:
+            current = target * DAY_US + day_hours(target)[0]
+
+        arrival = current
+        if i > 0:
+            arrival += minutes_to_us(travel[i])
+
+        day = arrival // DAY_US
+        open_us, close_us = day_hours(day)
+        day_start = day * DAY_US + open_us
+        day_end = day * DAY_US + close_us
+        if day_end <= day_start:
+            day_end += DAY_US
+
+        if arrival < day_start:
+            arrival = day_start
+
+        # If we arrived after the day ended, move to next day's start
+        if arrival > day_end:
+            day = arrival // DAY_US + 1
+            open_us, close_us = day_hours(day)
+            arrival = day * DAY_US + open_us
+            day_end = day * DAY_US + close_us
+            if close_us <= open_us:
+                day_end += DAY_US
+
+        # Hard Reservation Sync
+        reservation = reservations[i]
+        if reservation is not None and arrival < reservation:
+            arrival = reservation
+            day = arrival // DAY_US
+            open_us, close_us = day_hours(day)
+            day_end = day * DAY_US + close_us
+            if close_us <= open_us:
+                day_end += DAY_US
+
+        visit_start = arrival
+        visit_end = visit_start + visit_us[i]
+
+        # If the visit itself exceeds the day, move the whole visit to tomorrow
+        if visit_end > day_end:
+            day = arrival // DAY_US + 1
+            visit_start = day * DAY_US + day_hours(day)[0]
+            visit_end = visit_start + visit_us[i]
+
+        current = visit_end
+        starts.append(visit_start)
+        ends.append(visit_end)
+
+    # Formatting
+    day_labels: Dict[int, Tuple[str, str]] = {}
+
+    def day_label(day: int) -> Tuple[str, str]:
+        if day not in day_labels:
+            d = datetime.fromordinal(day)
+            day_labels[day] = (d.strftime("%Y-%m-%d"), d.strftime("%A"))
+        return day_labels[day]
+
+    def iso(us: int) -> Tuple[str, str, str, str]:
+        day, rest = divmod(us, DAY_US)
+        seconds, micros = divmod(rest, 1_000_000)
+        minutes, secs = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        date_str, weekday = day_label(day)
+        clock = f"{hours:02d}:{minutes:02d}"
+        text = f"{date_str}T{clock}:{secs:02d}" + (f".{micros:06d}" if micros else "")
+        return text, date_str, weekday, clock
+
+    schedule = []
+    for i, idx in enumerate(order):
+        place = places[idx]
+        arrival_text, date_str, weekday, clock = iso(starts[i])
+        schedule.append({
+            "id": place.get("id") or f"stop-{i}",
+            "place": place["name"],
+            "latlon": coords[idx],
+            "arrival": arrival_text,
+            "departure": iso(ends[i])[0],
+            "day": weekday,
+            "date": date_str,
+            "time": clock,
+            "isReservation": bool(place.get("reservation_time")),
+            "travelMinutes": travel[i],
+            "trafficDelayMinutes": delay[i],
+            "historicalMinutes": hist[i]
+        })
+
+    return schedule
@@ -1,28 +1,30 @@
 from typing import List, Tuple, Dict, Optional
 from datetime import datetime
+import time
 import numpy as np
 
+TRAFFIC_BUFFER = 5.0 # 5 minute safety buffer
+
+# Size-aware dispatch: exact DP up to this many stops, heuristic search beyond it
+EXACT_SOLVER_MAX_STOPS = 15
+HEURISTIC_TIME_BUDGET_MS = 250.0
+
+# Branch-and-bound mode: only surviving states are stored, so larger days stay exact
+PRUNED_EXACT_MAX_STOPS = 20
+PRUNED_MAX_CANDIDATES = 8_000_000 # Per-layer expansion cap before giving up on exactness
+UPPER_BOUND_BUDGET_MS = 25.0
+
+class PrunedStateOverflow(Exception):
+    """A pruned DP layer outgrew PRUNED_MAX_CANDIDATES; the caller should fall back to the heuristic tier."""
+
 def count_bits(n: int) -> int:
     return bin(n).count('1')
 
-def optimize_route(
-    coords: List[Tuple[float, float]],
-    durations: List[List[float]],
-    places: Optional[List[Dict]] = None,
-    fixed_start: bool = False,
-    start_minutes: float = 480.0, # Default to 8:00 AM if not provided
-) -> Dict:
+def prepare_constraints(n: int, places: Optional[List[Dict]]) -> Tuple[List[float], List[Optional[float]]]:
     """
-    Python Implementation of Held-Karp TSP with Time Windows (TSPTW).
-    Identifies the shortest path that satisfies all reservation constraints
-    given traffic-affected durations and visit durations.
+    Extracts per-node visit durations and reservation windows (minutes from midnight).
+    Shared by every solver engine so they all see identical constraints.
     """
-    n = len(coords)
-    if n == 0:
-        return {"optimized_coords": [], "order": []}
-    if n == 1:
-        return {"optimized_coords": [coords[0]], "order": [0]}
-
     # visit_durations map
     visit_durations = [0.0] * n
     if places:
@@ -48,12 +50,82 @@ def optimize_route(
                 except Exception:
                     pass
 
+    return visit_durations, reservation_windows
+
+def optimize_route(
+    coords: List[Tuple[float, float]],
+    durations: List[List[float]],
+    places: Optional[List[Dict]] = None,
+    fixed_start: bool = False,
+    start_minutes: float = 480.0, # Default to 8:00 AM if not provided
+    engine: str = "numpy",
+    exact_limit: int = EXACT_SOLVER_MAX_STOPS,
+    time_budget_ms: float = HEURISTIC_TIME_BUDGET_MS,
+    prune: bool = False,
+    prune_limit: int = PRUNED_EXACT_MAX_STOPS,
+) -> Dict:
+    """
+    Python Implementation of TSP with Time Windows (TSPTW).
+    Identifies the shortest path that satisfies all reservation constraints
+    given traffic-affected durations and visit durations.
+    - Up to `exact_limit` stops: Held-Karp DP (tier "exact")
+    - Beyond it: time-window-aware construction + 2-opt/Or-opt search (tier "heuristic")
+    :param engine: "numpy" (dense vectorized DP) or "dict" (reference implementation)
+    :param time_budget_ms: Local search budget for the heuristic tier
+    :param prune: Use branch-and-bound pruning, which keeps days up to `prune_limit` exact
+    """
+    n = len(coords)
+    if n == 0:
+        return {"optimized_coords": [], "order": [], "tier": "exact"}
+    if n == 1:
+        return {"optimized_coords": [coords[0]], "order": [0], "tier": "exact"}
+
+    visit_durations, reservation_windows = prepare_constraints(n, places)
+
+    if prune and n <= max(exact_limit, prune_limit):
+        tier = "exact"
+        try:
+            path = _held_karp_pruned(n, durations, visit_durations, reservation_windows, fixed_start, start_minutes)
+        except PrunedStateOverflow:
+            print(f"⚠️ TSPTW: Pruned state space too large for {n} stops. Using heuristic tier.")
+            tier = "heuristic"
+            path = _solve_heuristic(
+                n, durations, visit_durations, reservation_windows, fixed_start, start_minutes, time_budget_ms
+            )
+    elif n > exact_limit:
+        tier = "heuristic"
+        path = _solve_heuristic(
+            n, durations, visit_durations, reservation_windows, fixed_start, start_minutes, time_budget_ms
+        )
+    elif engine == "dict":
+        tier = "exact"
+        path = _held_karp_dict(n, durations, visit_durations, reservation_windows, fixed_start, start_minutes)
+    else:
+        tier = "exact"
+        path = _held_karp_numpy(n, durations, visit_durations, reservation_windows, fixed_start, start_minutes)
+
+    if path is None:
+        # Fallback if hard constraints were impossible for ALL paths (rare)
+        # In this case, just return the most reasonable greedy or sequential order
+        print("⚠️ TSPTW: No path found satisfying all hard reservation windows. Falling back.")
+        return {"optimized_coords": coords, "order": list(range(n)), "tier": "fallback"}
+
+    optimized_coords = [coords[i] for i in path]
+    return {"optimized_coords": optimized_coords, "order": path, "tier": tier}
+
+def _held_karp_dict(
+    n: int,
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    fixed_start: bool,
+    start_minutes: float,
+) -> Optional[List[int]]:
+    """Reference Held-Karp keyed by (mask, node) tuples. Returns the path or None if infeasible."""
     # dp map -> key: (mask, node), value: (finish_time, prev_node)
     # finish_time is the earliest minutes-from-midnight you finish visiting the node
     dp: Dict[Tuple[int, int], Tuple[float, int]] = {}
 
-    TRAFFIC_BUFFER = 5.0 # 5 minute safety buffer
-
     if fixed_start:
         # Day starts at node 0 (Stay Location) at 'start_minutes'
         # Stay location visit_duration is usually 0 here as we just 'leave' it
@@ -110,10 +182,7 @@ def optimize_route(
             end_node = j
 
     if end_node == -1:
-        # Fallback if hard constraints were impossible for ALL paths (rare)
-        # In this case, just return the most reasonable greedy or sequential order
-        print("⚠️ TSPTW: No path found satisfying all hard reservation windows. Falling back.")
-        return {"optimized_coords": coords, "order": list(range(n))}
+        return None
 
     path = []
     curr_mask = full_mask
@@ -126,5 +195,352 @@ def optimize_route(
         curr_node = prev_node
 
     path.reverse()
-    optimized_coords = [coords[i] for i in path]
-    return {"optimized_coords": optimized_coords, "order": path}
+    return path
+
+def _held_karp_numpy(
+    n: int,
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    fixed_start: bool,
+    start_minutes: float,
+) -> Optional[List[int]]:
+    """
+    Vectorized Held-Karp over dense (2^n, n) arrays.
+    Each subset-size layer is relaxed at once with NumPy broadcasting; pruning and
+    tie-breaking (lowest predecessor index wins) match the dict engine exactly.
+    """
+    num_masks = 1 << n
+    travel = np.asarray(durations, dtype=np.float64)[:n, :n]
+    visits = np.asarray(visit_durations, dtype=np.float64)
+
+    # Reservation bounds: latest allowed arrival and earliest allowed start per node
+    latest_arrival = np.array(
+        [r + TRAFFIC_BUFFER if r is not None else np.inf for r in reservation_windows], dtype=np.float64
+    )
+    earliest_start = np.array(
+        [r if r is not None else 0.0 for r in reservation_windows], dtype=np.float64
+    )
+
+    # finish[mask, node] = earliest finish time; pred[mask, node] = previous node
+    finish = np.full((num_masks, n), np.inf, dtype=np.float64)
+    pred = np.full((num_masks, n), -1, dtype=np.int16)
+
+    if fixed_start:
+        finish[1, 0] = start_minutes + visits[0]
+    else:
+        singles = 1 << np.arange(n)
+        finish[singles, np.arange(n)] = start_minutes + visits
+
+    # Group masks into layers by popcount once instead of rescanning 2^n masks per size
+    all_masks = np.arange(num_masks, dtype=np.int64)
+    popcount = np.zeros(num_masks, dtype=np.int8)
+    for b in range(n):
+        popcount += ((all_masks >> b) & 1).astype(np.int8)
+    order = np.argsort(popcount, kind="stable")
+    bounds = np.searchsorted(popcount[order], np.arange(n + 2))
+
+    for size in range(2, n + 1):
+        layer = order[bounds[size]:bounds[size + 1]]
+        for j in range(n):
+            bit = 1 << j
+            masks = layer[(layer & bit) != 0]
+            if masks.size == 0:
+                continue
+            prev_masks = masks ^ bit
+
+            # arrival[m, k] = finish(prev_mask, k) + travel(k -> j)
+            arrival = finish[prev_masks] + travel[:, j]
+            # Safety Constraint: paths that are late for reservation j are invalid
+            arrival[arrival > latest_arrival[j]] = np.inf
+            candidate = np.maximum(arrival, earliest_start[j]) + visits[j]
+
+            best_k = np.argmin(candidate, axis=1)
+            best_finish = candidate[np.arange(masks.size), best_k]
+            valid = best_finish < np.inf
+            finish[masks[valid], j] = best_finish[valid]
+            pred[masks[valid], j] = best_k[valid]
+
+    full_mask = num_masks - 1
+    end_node = int(np.argmin(finish[full_mask]))
+    if not finish[full_mask, end_node] < np.inf:
+        return None
+
+    path = []
+    curr_mask = full_mask
+    curr_node = end_node
+    while curr_node != -1:
+        path.append(curr_node)
+        prev_node = int(pred[curr_mask, curr_node])
+        curr_mask = curr_mask ^ (1 << curr_node)
+        curr_node = prev_node
+
+    path.reverse()
+    return path
+
+def evaluate_route(
+    path: List[int],
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    start_minutes: float,
+) -> Tuple[float, float]:
+    """
+    Simulates a fixed visiting order with the same timing rules as the DP.
+    Returns (lateness, finish): total minutes past reservation windows (0 when feasible)
+    and the finish time of the last stop. Lower is better, lateness first.
+    """
+    lateness = 0.0
+    t = start_minutes + visit_durations[path[0]]
+    for a, b in zip(path, path[1:]):
+        arrival = t + durations[a][b]
+        res_b = reservation_windows[b]
+        if res_b is not None:
+            if arrival > res_b + TRAFFIC_BUFFER:
+                lateness += arrival - (res_b + TRAFFIC_BUFFER)
+            arrival = max(arrival, res_b)
+        t = arrival + visit_durations[b]
+    return lateness, t
+
+def _construct_route(
+    first: int,
+    n: int,
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    start_minutes: float,
+) -> List[int]:
+    """
+    Time-window-aware nearest neighbour: repeatedly moves to the stop that finishes
+    earliest while keeping every remaining reservation reachable. When no such stop
+    exists, the most urgent reservation is visited next.
+    """
+    reserved = [i for i in range(n) if reservation_windows[i] is not None]
+    path = [first]
+    unvisited = set(range(n))
+    unvisited.discard(first)
+    t = start_minutes + visit_durations[first]
+    curr = first
+
+    while unvisited:
+        best_safe, best_safe_finish = -1, float('inf')
+        best_any, best_any_finish = -1, float('inf')
+        for j in unvisited:
+            arrival = t + durations[curr][j]
+            res_j = reservation_windows[j]
+            if res_j is not None:
+                if arrival > res_j + TRAFFIC_BUFFER:
+                    continue
+                arrival = max(arrival, res_j)
+            finish_j = arrival + visit_durations[j]
+            if finish_j < best_any_finish:
+                best_any, best_any_finish = j, finish_j
+            # Would visiting j first make a later reservation unreachable?
+            safe = all(
+                finish_j + durations[j][u] <= reservation_windows[u] + TRAFFIC_BUFFER
+                for u in reserved if u in unvisited and u != j
+            )
+            if safe and finish_j < best_safe_finish:
+                best_safe, best_safe_finish = j, finish_j
+
+        if best_safe != -1:
+            nxt = best_safe
+        else:
+            pending = [u for u in reserved if u in unvisited]
+            if pending:
+                nxt = min(pending, key=lambda u: reservation_windows[u])
+            elif best_any != -1:
+                nxt = best_any
+            else:
+                nxt = min(unvisited, key=lambda u: durations[curr][u])
+
+        arrival = t + durations[curr][nxt]
+        if reservation_windows[nxt] is not None:
+            arrival = max(arrival, reservation_windows[nxt])
+        t = arrival + visit_durations[nxt]
+        path.append(nxt)
+        unvisited.discard(nxt)
+        curr = nxt
+
+    return path
+
+def _solve_heuristic(
+    n: int,
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    fixed_start: bool,
+    start_minutes: float,
+    time_budget_ms: float,
+) -> Optional[List[int]]:
+    """
+    Heuristic TSPTW tier for days too large for exact Held-Karp.
+    Builds a route with time-window-aware nearest neighbour, then improves it with
+    2-opt (segment reversal) and Or-opt (moving runs of 1-3 stops) until no move
+    helps or the time budget runs out. Returns None if no feasible route was found.
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000.0
+
+    def score(path: List[int]) -> Tuple[float, float]:
+        return evaluate_route(path, durations, visit_durations, reservation_windows, start_minutes)
+
+    # 1. Construction (every start node unless the day is anchored at node 0)
+    starts = [0] if fixed_start else list(range(n))
+    best_path, best_score = None, (float('inf'), float('inf'))
+    for first in starts:
+        candidate = _construct_route(first, n, durations, visit_durations, reservation_windows, start_minutes)
+        candidate_score = score(candidate)
+        if candidate_score < best_score:
+            best_path, best_score = candidate, candidate_score
+        if time.perf_counter() > deadline:
+            break
+
+    # 2. Local search (first improvement); node 0 stays pinned when the start is fixed
+    lo = 1 if fixed_start else 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+
+        # 2-opt: reverse path[i..k]
+        for i in range(lo, n - 1):
+            for k in range(i + 1, n):
+                candidate = best_path[:i] + best_path[i:k + 1][::-1] + best_path[k + 1:]
+                candidate_score = score(candidate)
+                if candidate_score < best_score:
+                    best_path, best_score, improved = candidate, candidate_score, True
+            if time.perf_counter() > deadline:
+                break
+
+        # Or-opt: move a run of 1-3 stops to another position
+        for seg_len in (1, 2, 3):
+            for i in range(lo, n - seg_len + 1):
+                segment = best_path[i:i + seg_len]
+                rest = best_path[:i] + best_path[i + seg_len:]
+                for pos in range(lo, len(rest) + 1):
+                    if pos == i:
+                        continue
+                    candidate = rest[:pos] + segment + rest[pos:]
+                    candidate_score = score(candidate)
+                    if candidate_score < best_score:
+                        best_path, best_score, improved = candidate, candidate_score, True
+                        break
+                if time.perf_counter() > deadline:
+                    break
+
+    if best_score[0] > 0:
+        return None
+    return best_path
+
+def _held_karp_pruned(
+    n: int,
+    durations: List[List[float]],
+    visit_durations: List[float],
+    reservation_windows: List[Optional[float]],
+    fixed_start: bool,
+    start_minutes: float,
+) -> Optional[List[int]]:
+    """
+    Branch-and-bound Held-Karp. States live in sparse per-layer arrays and are dropped when
+    - their lower bound (finish + cheapest entry edge and visit for every unvisited stop)
+      exceeds the incumbent tour seeded by the heuristic tier, or
+    - some unvisited reservation can no longer be reached in time.
+    Both bounds are monotone along a path, so surviving states keep their exact DP values
+    and the returned route matches the dense engines. Raises PrunedStateOverflow when a layer
+    grows past PRUNED_MAX_CANDIDATES.
+    """
+    travel = np.asarray(durations, dtype=np.float64)[:n, :n]
+    visits = np.asarray(visit_durations, dtype=np.float64)
+    latest_arrival = np.array(
+        [r + TRAFFIC_BUFFER if r is not None else np.inf for r in reservation_windows], dtype=np.float64
+    )
+    earliest_start = np.array(
+        [r if r is not None else 0.0 for r in reservation_windows], dtype=np.float64
+    )
+    reserved = [u for u in range(n) if reservation_windows[u] is not None]
+
+    # Cheapest way to enter each node (any predecessor), plus its visit
+    off_diagonal = travel + np.diag(np.full(n, np.inf))
+    min_entry = off_diagonal.min(axis=0)
+    entry_cost = min_entry + visits
+    total_entry_cost = float(entry_cost.sum())
+
+    # Incumbent upper bound from a fast greedy tour
+    upper_bound = np.inf
+    seed = _solve_heuristic(
+        n, durations, visit_durations, reservation_windows, fixed_start, start_minutes, UPPER_BOUND_BUDGET_MS
+    )
+    if seed is not None:
+        upper_bound = evaluate_route(seed, durations, visit_durations, reservation_windows, start_minutes)[1] + 1e-9
+
+    def keep(masks: np.ndarray, finish: np.ndarray) -> np.ndarray:
+        visited_cost = np.zeros(masks.size, dtype=np.float64)
+        for b in range(n):
+            visited_cost += ((masks >> b) & 1) * entry_cost[b]
+        bound = finish + (total_entry_cost - visited_cost)
+        alive = np.ones(masks.size, dtype=bool)
+        for u in reserved:
+            pending = ((masks >> u) & 1) == 0
+            # Later reservation already unreachable
+            alive &= ~(pending & (finish + min_entry[u] > latest_arrival[u]))
+            bound = np.where(pending, np.maximum(bound, earliest_start[u] + visits[u]), bound)
+        return alive & (bound <= upper_bound)
+
+    if fixed_start:
+        masks = np.array([1], dtype=np.int64)
+        nodes = np.array([0], dtype=np.int64)
+        finish = np.array([start_minutes + visits[0]], dtype=np.float64)
+    else:
+        nodes = np.arange(n, dtype=np.int64)
+        masks = np.left_shift(1, nodes)
+        finish = start_minutes + visits
+    alive = keep(masks, finish)
+    masks, nodes, finish = masks[alive], nodes[alive], finish[alive]
+
+    # Per-layer (nodes, parent index) for path reconstruction
+    history = [(nodes, np.full(nodes.size, -1, dtype=np.int64))]
+    bits = np.left_shift(1, np.arange(n, dtype=np.int64))
+
+    for _ in range(2, n + 1):
+        if masks.size == 0:
+            return None
+        if masks.size * n > PRUNED_MAX_CANDIDATES:
+            raise PrunedStateOverflow("TSPTW state space exceeds pruning cap")
+
+        # Expand every state (mask, k) to every unvisited j at once
+        arrival = finish[:, None] + travel[nodes]
+        arrival[(masks[:, None] & bits) != 0] = np.inf
+        arrival[arrival > latest_arrival] = np.inf
+        candidate = np.maximum(arrival, earliest_start) + visits
+
+        parent_idx, next_node = np.nonzero(candidate < np.inf)
+        next_finish = candidate[parent_idx, next_node]
+        next_mask = masks[parent_idx] | bits[next_node]
+
+        # Keep the best predecessor per (mask, node): min finish, then lowest previous node
+        key = next_mask * n + next_node
+        ranked = np.lexsort((nodes[parent_idx], next_finish, key))
+        first = np.ones(ranked.size, dtype=bool)
+        first[1:] = key[ranked[1:]] != key[ranked[:-1]]
+        winners = ranked[first]
+
+        masks = next_mask[winners]
+        nodes = next_node[winners]
+        finish = next_finish[winners]
+        parents = parent_idx[winners]
+
+        alive = keep(masks, finish)
+        masks, nodes, finish, parents = masks[alive], nodes[alive], finish[alive], parents[alive]
+        history.append((nodes, parents))
+
+    if finish.size == 0:
+        return None
+
+    # States are sorted by (mask, node), so argmin picks the lowest end node on ties
+    state = int(np.argmin(finish))
+    path = []
+    for layer_nodes, layer_parents in reversed(history):
+        path.append(int(layer_nodes[state]))
+        state = int(layer_parents[state])
+
+    path.reverse()
+    return path
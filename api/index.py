@@ -1,23 +1,59 @@
 from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import json
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Tuple, Dict, Optional
+from typing import AsyncIterator, List, Tuple, Dict, Optional
 from datetime import datetime, timedelta
+from functools import partial
+import uuid
 from .config import settings
 
 # Import engines
 from .engine.tsp_solver import optimize_route
-from .engine.clusterer import cluster_places
-from .engine.recommendation import fetch_nearby_pois, rank_pois_with_cohere
+from .engine.clusterer import cluster_places, cluster_places_capacitated, calculate_centroid, calculate_distance
+from .engine.recommendation import fetch_nearby_pois_async, rank_pois
 from .engine.schedule import generate_schedule
+from .engine.cache_manager import plan_cache, get_cached_item_async, set_cached_item_async
+from .engine.distance_estimator import estimate_durations_matrix, calibrate_estimator
+from .engine.road_graph import get_local_durations_matrix, get_local_route_polyline
+from .engine.polyline import encode_route, simplify_route, route_part, stitch_routes
 
 # Import clients
-from .clients.ors_client import get_coordinates, get_durations_matrix, get_route_polyline, get_autocomplete_suggestions
-from .clients.tomtom_client import get_tomtom_durations_matrix, get_tomtom_leg_details, get_tomtom_route_summary
-from .clients.wiki_client import fetch_wiki_data
-from .clients.weather_client import get_weather_data
+from .clients.ors_client import get_coordinates_async, get_coordinates_batch_async, get_durations_matrix_async, get_route_polyline_async, get_autocomplete_suggestions_async, straight_line_route
+from .clients.tomtom_client import get_tomtom_traffic_matrices_async, get_tomtom_leg_details_async, get_tomtom_route_summary_async
+from .clients.wiki_client import fetch_wiki_data_async, fetch_wiki_data_batch_async
+from .clients.weather_client import get_weather_data_async
+from .clients.http_pool import start_http_clients, close_http_clients
 
-app = FastAPI()
+# CPU-bound TSP solves run in a process pool so they never block the event loop
+solver_pool: Optional[ProcessPoolExecutor] = None
+
+def create_solver_pool() -> Optional[ProcessPoolExecutor]:
+    try:
+        return ProcessPoolExecutor(max_workers=settings.TSP_SOLVER_WORKERS or None)
+    except (OSError, NotImplementedError) as e:
+        # Some serverless sandboxes forbid multiprocessing; solves fall back to threads
+        print(f"DEBUG: Solver process pool unavailable: {e}")
+        return None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global solver_pool
+    solver_pool = create_solver_pool()
+    # Pooled keep-alive HTTP clients, one per provider host
+    await start_http_clients()
+    yield
+    await close_http_clients()
+    if solver_pool:
+        solver_pool.shutdown(wait=False, cancel_futures=True)
+        solver_pool = None
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS Middleware
 app.add_middleware(
@@ -58,42 +94,354 @@ class PlanInput(BaseModel):
     places: List[PlaceInput]
     transportMode: str = "driving-car"
     activeHours: Dict[str, ActiveHours]
+    draft: bool = False # Offline estimates only (no matrix/route provider calls)
+    clusteringMode: str = "greedy" # "greedy" (centroid + count penalty) | "capacitated" (fills days by activeHours minutes)
+    routeFormat: str = "geojson" # "geojson" (routeGeoJson) | "polyline" (routePolylines, encoded)
+    routeZoom: Optional[int] = None # Douglas-Peucker simplification for this map zoom level
 
 @app.get("/api/health")
 def health_check():
     return {"status": "healthy", "engine": "Python (FastAPI)", "platform": "Vercel"}
 
-@app.post("/api/plan")
-async def plan_trip(input_data: PlanInput):
+def apply_reservation_times(day_places: List[Dict]):
+    """Map reservation date/clock to reservation_time for both Solver and Scheduler"""
+    for p in day_places:
+        if p.get("is_reservation") and p.get("reservation_date") and p.get("reservation_clock"):
+            try:
+                # Append :00 to ensure backwards compatibility with python 3.9 fromisoformat
+                time_str = f"{p['reservation_date']}T{p['reservation_clock']}:00"
+                p["reservation_time"] = datetime.fromisoformat(time_str)
+            except ValueError:
+                pass
+
+def stay_anchor(day_idx: int, date_str: str, kind: str) -> Dict:
+    return {
+        "id": f"hotel-{kind}-{day_idx}", 
+        "name": f"Stay Location ({kind.capitalize()})", 
+        "visit_duration": 0, 
+        "is_reservation": False,
+        "is_stay_anchor": True,
+        "forcedDate": date_str
+    }
+
+def day_start_minutes(input_data: PlanInput, date_str: str) -> float:
+    # V8.1: Traffic-Aware Temporal Initialization
+    # Determine the day's start time from activeHours
+    start_min = 480.0 # Default 8 AM
+    if input_data.activeHours and date_str in input_data.activeHours:
+        day_cfg = input_data.activeHours[date_str]
+        start_min = day_cfg.start["hours"] * 60 + day_cfg.start["minutes"]
+    return start_min
+
+def day_capacity_minutes(input_data: PlanInput, date_str: str) -> float:
+    """Minutes available for visits and travel on a day (activeHours, default 08:00-20:00)."""
+    if input_data.activeHours and date_str in input_data.activeHours:
+        day_cfg = input_data.activeHours[date_str]
+        start_min = day_cfg.start["hours"] * 60 + day_cfg.start["minutes"]
+        end_min = day_cfg.end["hours"] * 60 + day_cfg.end["minutes"]
+        return end_min - start_min if end_min > start_min else end_min + 1440 - start_min
+    return 720.0
+
+async def fetch_durations_matrix(coords: List, transport_mode: str) -> List[List[float]]:
+    """Non-traffic durations: local road graph when configured (and covering coords), else ORS."""
+    if settings.ROAD_GRAPH_PATH:
+        local = await asyncio.to_thread(get_local_durations_matrix, coords, transport_mode, settings.ROAD_GRAPH_PATH)
+        if local:
+            return local
+    return await get_durations_matrix_async(coords, transport_mode)
+
+async def fetch_day_matrices(day_coords: List, transport_mode: str, draft: bool = False) -> Tuple[List[List[float]], List[List[float]]]:
+    # V9.2: Draft plans never wait on a provider
+    if draft:
+        estimate = estimate_durations_matrix(day_coords, transport_mode)
+        return estimate, estimate
+
+    # V8.2: Dual-Track Traffic Matrix Fetching (Live vs Historical Baseline)
+    # Both tracks come from one upstream call per block of uncached cells
+    durations_live, durations_hist = await get_tomtom_traffic_matrices_async(day_coords) or (None, None)
+
+    # Fallback to ORS if TomTom fails, then to the offline estimator
+    if not durations_live:
+        try:
+            durations_live = await fetch_durations_matrix(day_coords, transport_mode)
+        except Exception as e:
+            print(f"DEBUG: Matrix providers unavailable ({e}). Using offline estimate.")
+            estimate = estimate_durations_matrix(day_coords, transport_mode)
+            return estimate, estimate
+
+    # Keep the offline estimator tuned to what the providers actually report
+    calibrate_estimator(day_coords, durations_live, transport_mode)
+    if not durations_hist:
+        durations_hist = durations_live
+    return durations_live, durations_hist
+
+async def estimate_or_fetch_leg(a, b, transport_mode: str) -> Tuple[float, float]:
+    """Single leg from the road graph / ORS, or the offline estimate if neither is available."""
     try:
-        # Step 1: Geocoding & Context
-        base_city_coords = None
-        if input_data.baseCity:
-            base_city_coords = get_coordinates(input_data.baseCity)
-        
-        anchor_coords = input_data.accommodationCoords
-        focus_coords = anchor_coords or base_city_coords
-
-        valid_places = [p.dict() for p in input_data.places if p.name.strip()]
-        
-        # Step 2: Ensure all places have coordinates (Geocode if missing)
-        # Using a "Chain of Proximity": Each place is geocoded relative to the PREVIOUS pin's location.
-        # Using a "Chain of Proximity"
-        # focus_coords initialized above
-        for p in valid_places:
-            if not p.get("coords") and p.get("name"):
-                try:
-                    lat, lon = get_coordinates(p["name"], focus_coords)
-                    p["coords"] = [lat, lon]
-                    # Update focus for next item in chain
-                    focus_coords = [lat, lon]
-                except Exception as e:
-                    print(f"⚠️ Failed to geocode {p['name']}: {e}")
-            elif p.get("coords"):
-                # If it already has coords (e.g. from map pick), update focus too!
-                focus_coords = p["coords"]
-
-        # Step 3: Clustering
+        minutes = (await fetch_durations_matrix([a, b], transport_mode))[0][1]
+    except Exception as e:
+        print(f"DEBUG: ORS leg unavailable ({e}). Using offline estimate.")
+        minutes = estimate_durations_matrix([a, b], transport_mode)[0][1]
+    return (minutes, minutes)
+
+def draft_route(coords: List) -> Optional[Dict]:
+    """Straight-line stand-in for a directions polyline (draft plans)."""
+    if len(coords) < 2:
+        return None
+    return straight_line_route([[lon, lat] for lat, lon in coords], {"draft": True})
+
+async def fetch_route(coords: List, input_data: PlanInput) -> Optional[Dict]:
+    if input_data.draft:
+        return draft_route(coords)
+    if settings.ROAD_GRAPH_PATH:
+        local = await asyncio.to_thread(get_local_route_polyline, coords, input_data.transportMode, settings.ROAD_GRAPH_PATH)
+        if local:
+            return local
+    return await get_route_polyline_async(coords, input_data.transportMode)
+
+async def run_solver(*args, **kwargs) -> Dict:
+    """
+    Runs optimize_route in the solver process pool (or a thread if none is available).
+    A pool whose worker died is replaced, and the solve that hit it runs in a thread.
+    """
+    global solver_pool
+    pool = solver_pool
+    if pool is None:
+        return await asyncio.to_thread(optimize_route, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, partial(optimize_route, *args, **kwargs))
+    except BrokenProcessPool as e:
+        # A broken pool fails every later submit; concurrent solves only replace it once
+        if solver_pool is pool:
+            print(f"DEBUG: Solver process pool broken ({e}), starting a new one")
+            pool.shutdown(wait=False, cancel_futures=True)
+            solver_pool = create_solver_pool()
+        return await asyncio.to_thread(optimize_route, *args, **kwargs)
+
+async def solve_day(day_idx: int, day_state: Dict, input_data: PlanInput, anchor_coords) -> Dict:
+    """
+    Orders one day's stops from its (already fetched) matrices.
+    day_state holds the day's stops, coords, date and live/historical matrices;
+    'order' and 'tier' are written back so the state can be re-used by /api/plan/patch.
+    """
+    date_str = day_state["date"]
+    day_places = [dict(p) for p in day_state["places"]]
+    apply_reservation_times(day_places)
+
+    # Set forced date for the scheduler
+    for p in day_places:
+        p["forcedDate"] = date_str
+
+    day_coords = list(day_state["coords"])
+    
+    # Anchor at start/end of day if available
+    if anchor_coords:
+        day_coords = [anchor_coords] + day_coords
+        # CRITICAL: Assign forcedDate to anchor to ensure schedule generator aligns to day morning
+        day_places = [stay_anchor(day_idx, date_str, "start")] + day_places
+
+    # Optimize with Time-Windows using LIVE traffic
+    result = await run_solver(
+        day_coords, 
+        day_state["live"], 
+        day_places, 
+        fixed_start=bool(anchor_coords),
+        start_minutes=day_start_minutes(input_data, date_str),
+        exact_limit=settings.TSP_EXACT_LIMIT,
+        time_budget_ms=settings.TSP_HEURISTIC_BUDGET_MS,
+        prune=settings.TSP_BRANCH_AND_BOUND,
+        prune_limit=settings.TSP_PRUNED_EXACT_LIMIT
+    )
+    print(f"DEBUG: Day {day_idx} solved with {result['tier']} tier ({len(day_coords)} stops)")
+
+    # Assembly
+    ordered_places = [day_places[i] for i in result["order"]]
+    ordered_coords = [day_coords[i] for i in result["order"]] # FIXED: Don't scramble coords
+    if anchor_coords:
+        # Add end anchor
+        ordered_places.append(stay_anchor(day_idx, date_str, "end"))
+        ordered_coords.append(anchor_coords)
+
+    day_state["order"] = result["order"]
+    day_state["tier"] = result["tier"]
+    return {"places": ordered_places, "coords": ordered_coords}
+
+def leg_key(a, b) -> str:
+    return f"{a[0]:.5f},{a[1]:.5f}|{b[0]:.5f},{b[1]:.5f}"
+
+def day_matrix_indices(day_idx: int, day_state: Dict, anchor_coords) -> List[Tuple[int, int]]:
+    """(day_idx, matrix index) for each stop of a solved day, end anchor included."""
+    indices = [(day_idx, i) for i in day_state["order"]]
+    if anchor_coords:
+        indices.append((day_idx, 0))
+    return indices
+
+async def lookup_legs(
+    ordered_coords: List,
+    matrix_indices: List[Tuple[int, int]],
+    days_state: List[Dict],
+    input_data: PlanInput,
+    cached_legs: Optional[Dict[str, List[float]]] = None,
+    traffic: bool = True
+) -> List[Tuple[float, float]]:
+    """
+    (live, historical) minutes for each consecutive pair, without an n x n matrix:
+    cached legs first, then the day matrices, then a single-leg fetch for legs
+    between days (TomTom when traffic is set, else ORS / road graph / estimate).
+    """
+    cached_legs = cached_legs or {}
+
+    async def leg(i: int) -> Tuple[float, float]:
+        a, b = ordered_coords[i], ordered_coords[i + 1]
+        (day_a, idx_a), (day_b, idx_b) = matrix_indices[i], matrix_indices[i + 1]
+        key = leg_key(a, b)
+        if key in cached_legs:
+            return tuple(cached_legs[key])
+        if day_a == day_b:
+            return (days_state[day_a]["live"][idx_a][idx_b], days_state[day_a]["hist"][idx_a][idx_b])
+        if tuple(a) == tuple(b):
+            return (0.0, 0.0) # Back-to-back stay anchors
+        if input_data.draft:
+            minutes = estimate_durations_matrix([a, b], input_data.transportMode)[0][1]
+            return (minutes, minutes)
+        if traffic:
+            details = await get_tomtom_leg_details_async(a, b, input_data.transportMode)
+            if details:
+                return (details["liveMinutes"], details["historicalMinutes"])
+        return await estimate_or_fetch_leg(a, b, input_data.transportMode)
+
+    return list(await asyncio.gather(*[leg(i) for i in range(len(ordered_coords) - 1)]))
+
+def build_schedule(input_data: PlanInput, ordered_places: List[Dict], ordered_coords: List, legs: List[Tuple[float, float]]) -> List[Dict]:
+    # The scheduler only needs the adjacent pairs, so pass the legs as vectors (O(n), no n x n matrices)
+    active_hours_dict = {k: v.dict() for k, v in input_data.activeHours.items()}
+    n_legs = max(len(ordered_coords) - 1, 0)
+    if len(legs) != n_legs:
+        print(f"DEBUG: {len(legs)} legs for {len(ordered_coords)} stops, zero-filling")
+        legs = (list(legs) + [(0.0, 0.0)] * n_legs)[:n_legs]
+    
+    return generate_schedule(
+        ordered_places,
+        ordered_coords,
+        list(range(len(ordered_places))),
+        datetime.fromisoformat(input_data.startDate),
+        active_hours_dict,
+        None,
+        live_legs=[live for live, _ in legs],
+        historical_legs=[hist for _, hist in legs]
+    )
+
+async def plan_day(day_idx: int, day_state: Dict, input_data: PlanInput, anchor_coords) -> Dict:
+    """Fetch matrices, solve and fetch the polyline for one day. Days run concurrently."""
+    day_coords = [anchor_coords] + day_state["coords"] if anchor_coords else day_state["coords"]
+    day_state["live"], day_state["hist"] = await fetch_day_matrices(day_coords, input_data.transportMode, input_data.draft)
+
+    solved = await solve_day(day_idx, day_state, input_data, anchor_coords)
+
+    # Capture Day Polyline (Must include the return leg if anchor exists)
+    day_state["route"] = await fetch_route(solved["coords"], input_data)
+    return solved
+
+async def build_full_route(day_paths: List[List], day_routes: List[Optional[Dict]], input_data: PlanInput) -> Dict:
+    """
+    The full-trip route stitched locally: each day's route joined by the inter-day leg
+    (last stop of one day -> first stop of the next), so no whole-trip directions call.
+    Legs come from the per-leg route cache when possible.
+    """
+    pairs = [(prev[-1], nxt[0]) for prev, nxt in zip(day_paths, day_paths[1:])]
+    connectors = await asyncio.gather(*[
+        fetch_route([a, b], input_data) for a, b in pairs if tuple(a) != tuple(b)
+    ])
+    connectors = iter(connectors)
+
+    parts = []
+    for i, (path, route) in enumerate(zip(day_paths, day_routes)):
+        if i > 0:
+            a, b = pairs[i - 1]
+            # Back-to-back stay anchors are a zero-length leg
+            parts.append(route_part(next(connectors) if tuple(a) != tuple(b) else None, [a, b]))
+        parts.append(route_part(route, path))
+    return stitch_routes(parts)
+
+def format_route(route: Optional[Dict], input_data: PlanInput) -> Optional[Dict]:
+    if input_data.routeFormat == "polyline":
+        return encode_route(route, input_data.routeZoom)
+    return simplify_route(route, input_data.routeZoom)
+
+def format_routes(day_routes: Dict[str, Optional[Dict]], full_route: Dict, input_data: PlanInput) -> Dict:
+    """
+    Response route fields. GeoJSON mode keeps routeGeoJson (days + stitched "all");
+    polyline mode returns routePolylines per day plus the encoded full route.
+    """
+    if input_data.routeFormat == "polyline":
+        return {"routePolylines": {
+            **{day: format_route(route, input_data) for day, route in day_routes.items()},
+            "all": format_route(full_route, input_data)
+        }}
+    return {"routeGeoJson": {
+        **{day: format_route(route, input_data) for day, route in day_routes.items()},
+        "all": format_route(full_route, input_data)
+    }}
+
+async def store_plan_state(state: Dict) -> str:
+    token = uuid.uuid4().hex
+    await set_cached_item_async(plan_cache, f"plan:{token}", state)
+    return token
+
+async def plan_events(input_data: PlanInput) -> AsyncIterator[Dict]:
+    """
+    The plan pipeline as a sequence of progress events:
+    "geocode" (resolved coords), one "day" per solved day (ordered stops, polyline,
+    solver tier; in completion order), then "plan" with the full result.
+    """
+    # Step 1: Geocoding & Context
+    base_city_coords = None
+    if input_data.baseCity:
+        base_city_coords = await get_coordinates_async(input_data.baseCity)
+    
+    anchor_coords = input_data.accommodationCoords
+    focus_coords = anchor_coords or base_city_coords
+
+    valid_places = [p.dict() for p in input_data.places if p.name.strip()]
+    
+    # Step 2: Ensure all places have coordinates (Geocode if missing)
+    # Batch geocoding: all places resolve concurrently around the focus, then only
+    # outliers are re-queried with the "Chain of Proximity" (previous pin as focus).
+    geocoded = await get_coordinates_batch_async(
+        [p["name"] for p in valid_places],
+        focus_coords,
+        [p.get("coords") for p in valid_places]
+    )
+    for p, res in zip(valid_places, geocoded):
+        if isinstance(res, Exception):
+            print(f"⚠️ Failed to geocode {p['name']}: {res}")
+        elif not p.get("coords"):
+            p["coords"] = [res[0], res[1]]
+
+    yield {
+        "type": "geocode",
+        "places": [
+            {"id": p["id"], "name": p["name"], "coords": p.get("coords")}
+            for p in valid_places
+        ]
+    }
+
+    # Step 3: Clustering
+    if input_data.clusteringMode == "capacitated":
+        trip_start = datetime.fromisoformat(input_data.startDate)
+        clustered_days = cluster_places_capacitated(
+            valid_places,
+            input_data.startDate,
+            input_data.tripLength,
+            anchor_coords or base_city_coords,
+            [
+                day_capacity_minutes(input_data, (trip_start + timedelta(days=d)).strftime("%Y-%m-%d"))
+                for d in range(input_data.tripLength)
+            ],
+            input_data.transportMode
+        )
+    else:
         clustered_days = cluster_places(
             valid_places,
             input_data.startDate,
@@ -101,184 +449,359 @@ async def plan_trip(input_data: PlanInput):
             anchor_coords or base_city_coords # Still use base_city for clustering stability
         )
 
+    final_ordered_places = []
+    final_ordered_coords = []
+    days_state = []
+
+    # Step 3: TSP Solver Per Day (all days fanned out concurrently)
+    route_geojson = {}
+    solver_tiers = {}
+
+    for day_idx, day in enumerate(clustered_days):
+        dt = datetime.fromisoformat(input_data.startDate) + timedelta(days=day_idx)
+        day_state = {
+            "date": dt.strftime("%Y-%m-%d"),
+            "places": [dict(p) for p in day["places"]],
+            "coords": [p["coords"] for p in day["places"]],
+            "live": None,
+            "hist": None,
+            "order": [],
+            "route": None
+        }
+        days_state.append(day_state)
+
+    active_days = [day_idx for day_idx, day in enumerate(clustered_days) if day["indices"]]
+
+    async def plan_indexed_day(day_idx: int) -> Tuple[int, Dict]:
+        return day_idx, await plan_day(day_idx, days_state[day_idx], input_data, anchor_coords)
+
+    # Each day is reported as soon as it is solved (completion order)
+    solved_days = {}
+    tasks = [asyncio.ensure_future(plan_indexed_day(day_idx)) for day_idx in active_days]
+    try:
+        for next_day in asyncio.as_completed(tasks):
+            day_idx, solved = await next_day
+            solved_days[day_idx] = solved
+            yield {
+                "type": "day",
+                "day": day_idx,
+                "date": days_state[day_idx]["date"],
+                "stops": [
+                    {"id": p.get("id"), "name": p["name"], "coords": c}
+                    for p, c in zip(solved["places"], solved["coords"])
+                ],
+                "route": format_route(days_state[day_idx]["route"], input_data),
+                "tier": days_state[day_idx]["tier"]
+            }
+    finally:
+        # A dropped stream must not leave day tasks running
+        for task in tasks:
+            task.cancel()
+
+    # Reassemble in day order
+    day_paths = []
+    matrix_indices = [] # (day_idx, matrix index) per final stop, for leg lookups
+    for day_idx in active_days:
+        solved = solved_days[day_idx]
+        day_paths.append(solved["coords"])
+        final_ordered_places.extend(solved["places"])
+        final_ordered_coords.extend(solved["coords"])
+        matrix_indices.extend(day_matrix_indices(day_idx, days_state[day_idx], anchor_coords))
+        solver_tiers[str(day_idx)] = days_state[day_idx]["tier"]
+        route_geojson[str(day_idx)] = days_state[day_idx]["route"]
+
+    # Step 4 & 5: Route Summary (for the schedule) and the full-trip route in parallel
+    # NEW V8.3: Use Route Summary (Sequence) instead of Matrix to bypass 100-cell limit
+    # The full-trip route is stitched from the day routes + inter-day legs, not refetched
+    full_route_task = build_full_route(day_paths, [days_state[d]["route"] for d in active_days], input_data)
+    if input_data.draft:
+        leg_summaries, full_route = [], await full_route_task
+    else:
+        leg_summaries, full_route = await asyncio.gather(
+            get_tomtom_route_summary_async(final_ordered_coords, input_data.transportMode),
+            full_route_task
+        )
+    
+    if leg_summaries:
+        legs = [(sim["liveMinutes"], sim["historicalMinutes"]) for sim in leg_summaries]
+    else:
+        # Fallback if TomTom is unavailable: same-day legs come from the day matrices,
+        # and only the legs between days are fetched (ORS, then the offline estimate)
+        legs = await lookup_legs(final_ordered_coords, matrix_indices, days_state, input_data, traffic=False)
+
+    # Step 4: Schedule Generation with Traffic Comparison
+    schedule = build_schedule(input_data, final_ordered_places, final_ordered_coords, legs)
+
+    # Step 6: Keep per-day state so single-stop edits can be patched in place
+    plan_token = await store_plan_state({
+        "input": input_data.dict(),
+        "days": days_state,
+        "legs": {
+            leg_key(a, b): list(leg)
+            for a, b, leg in zip(final_ordered_coords, final_ordered_coords[1:], legs)
+        }
+    })
+
+    yield {
+        "type": "plan",
+        "result": {
+            "schedule": schedule,
+            **format_routes(route_geojson, full_route, input_data),
+            "orderedCoords": final_ordered_coords,
+            "solverTiers": solver_tiers,
+            "planToken": plan_token
+        }
+    }
+
+@app.post("/api/plan")
+async def plan_trip(input_data: PlanInput):
+    try:
+        async for event in plan_events(input_data):
+            if event["type"] == "plan":
+                return event["result"]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/plan/stream")
+async def plan_trip_stream(input_data: PlanInput):
+    """
+    Streaming /api/plan (NDJSON, one event per line, see plan_events).
+    Failures after the stream has started arrive as a final {"type": "error"} line.
+    """
+    async def ndjson():
+        try:
+            async for event in plan_events(input_data):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+class PlanPatchInput(BaseModel):
+    planToken: str
+    op: str # "add" | "remove" | "move"
+    place: Optional[PlaceInput] = None # Required for "add"
+    placeId: Optional[str] = None # Required for "remove" / "move"
+    day: Optional[int] = None # Target day for "add" / "move" (nearest day if omitted)
+
+def drop_matrix_index(matrix: List[List[float]], idx: int) -> List[List[float]]:
+    return [row[:idx] + row[idx + 1:] for i, row in enumerate(matrix) if i != idx]
+
+def pick_patch_day(days_state: List[Dict], place: Dict, input_data: PlanInput, fallback_coords) -> int:
+    # Hard reservations stay pinned to their date
+    if place.get("is_reservation") and place.get("reservation_date"):
+        for day_idx, day_state in enumerate(days_state):
+            if day_state["date"] == place["reservation_date"]:
+                return day_idx
+
+    # Otherwise join the day with the nearest centroid
+    best_day, best_dist = 0, float('inf')
+    for day_idx, day_state in enumerate(days_state):
+        centroid = calculate_centroid(day_state["places"], fallback_coords or place["coords"])
+        dist = calculate_distance(place["coords"], centroid)
+        if dist < best_dist:
+            best_day, best_dist = day_idx, dist
+    return best_day
+
+@app.post("/api/plan/patch")
+async def patch_plan(patch: PlanPatchInput):
+    """
+    Incremental re-plan for a single add/remove/move edit.
+    Only the affected day(s) are re-fetched and re-solved; every other day re-uses
+    its cached matrices, order and polyline from the previous plan.
+    """
+    state = await get_cached_item_async(plan_cache, f"plan:{patch.planToken}")
+    if not state:
+        raise HTTPException(status_code=404, detail="Plan token expired or unknown. Re-run /api/plan.")
+    if patch.op not in ("add", "remove", "move"):
+        raise HTTPException(status_code=400, detail=f"Unsupported patch op: {patch.op}")
+    if patch.day is not None and not 0 <= patch.day < len(state["days"]):
+        raise HTTPException(status_code=400, detail=f"Day {patch.day} is outside the plan (0-{len(state['days']) - 1})")
+
+    try:
+        input_data = PlanInput(**state["input"])
+        anchor_coords = input_data.accommodationCoords
+        offset = 1 if anchor_coords else 0
+        days_state = [dict(d) for d in state["days"]]
+        affected = set()
+
+        # Step 1: Apply the delta to the per-day state
+        moved_place = None
+        if patch.op in ("remove", "move"):
+            if not patch.placeId:
+                raise HTTPException(status_code=400, detail="placeId is required")
+            for day_idx, day_state in enumerate(days_state):
+                ids = [p.get("id") for p in day_state["places"]]
+                if patch.placeId in ids:
+                    i = ids.index(patch.placeId)
+                    moved_place = day_state["places"][i]
+                    day_state["places"] = day_state["places"][:i] + day_state["places"][i + 1:]
+                    day_state["coords"] = day_state["coords"][:i] + day_state["coords"][i + 1:]
+                    if day_state["places"]:
+                        # Shrinking a day never needs new durations
+                        day_state["live"] = drop_matrix_index(day_state["live"], i + offset)
+                        day_state["hist"] = drop_matrix_index(day_state["hist"], i + offset)
+                    else:
+                        day_state["live"] = day_state["hist"] = None
+                    affected.add(day_idx)
+                    break
+            if moved_place is None:
+                raise HTTPException(status_code=404, detail=f"Place not in plan: {patch.placeId}")
+
+        if patch.op in ("add", "move"):
+            if patch.op == "add":
+                if not patch.place:
+                    raise HTTPException(status_code=400, detail="place is required")
+                new_place = patch.place.dict()
+                if not new_place.get("coords"):
+                    focus = anchor_coords
+                    if not focus and input_data.baseCity:
+                        focus = await get_coordinates_async(input_data.baseCity)
+                    lat, lon = await get_coordinates_async(new_place["name"], focus)
+                    new_place["coords"] = [lat, lon]
+            else:
+                new_place = moved_place
+
+            if patch.day is not None:
+                target = patch.day
+            else:
+                target = pick_patch_day(days_state, new_place, input_data, anchor_coords)
+
+            day_state = days_state[target]
+            day_state["places"] = day_state["places"] + [new_place]
+            day_state["coords"] = day_state["coords"] + [new_place["coords"]]
+            day_coords = [anchor_coords] + day_state["coords"] if anchor_coords else day_state["coords"]
+            day_state["live"], day_state["hist"] = await fetch_day_matrices(day_coords, input_data.transportMode, input_data.draft)
+            affected.add(target)
+
+        # Step 2: Re-solve affected days, re-use everything else
         final_ordered_places = []
         final_ordered_coords = []
-        day_stop_counts = []
-
-        # Step 3: TSP Solver Per Day
+        matrix_indices = [] # (day_idx, matrix index) per final stop, for leg lookups
         route_geojson = {}
+        solver_tiers = {}
+        day_paths, day_routes = [], []
+
+        async def resolve_day(day_idx: int) -> Dict:
+            solved = await solve_day(day_idx, days_state[day_idx], input_data, anchor_coords)
+            days_state[day_idx]["route"] = await fetch_route(solved["coords"], input_data)
+            return solved
+
+        resolve_days = sorted(d for d in affected if days_state[d]["places"])
+        resolved = dict(zip(resolve_days, await asyncio.gather(*[resolve_day(d) for d in resolve_days])))
 
-        for day_idx, day in enumerate(clustered_days):
-            if not day["indices"]:
-                day_stop_counts.append(0)
+        for day_idx, day_state in enumerate(days_state):
+            if not day_state["places"]:
+                day_state["order"], day_state["route"] = [], None
                 continue
 
-            day_places = day["places"]
-            
-            # Map reservation date/clock to reservation_time for both Solver and Scheduler
-            for p in day_places:
-                if p.get("is_reservation") and p.get("reservation_date") and p.get("reservation_clock"):
-                    try:
-                        # Append :00 to ensure backwards compatibility with python 3.9 fromisoformat
-                        time_str = f"{p['reservation_date']}T{p['reservation_clock']}:00"
-                        p["reservation_time"] = datetime.fromisoformat(time_str)
-                    except ValueError:
-                        pass
-
-            # Set forced date for the scheduler
-            dt = datetime.fromisoformat(input_data.startDate) + timedelta(days=day_idx)
-            date_str = dt.strftime("%Y-%m-%d")
-            for p in day_places:
-                p["forcedDate"] = date_str
-
-            day_coords = [p["coords"] for p in day_places]
-            
-            # Anchor at start/end of day if available
-            if anchor_coords:
-                day_coords = [anchor_coords] + day_coords
-                # CRITICAL: Assign forcedDate to anchor to ensure schedule generator aligns to day morning
-                day_places = [{
-                    "id": f"hotel-start-{day_idx}", 
-                    "name": "Stay Location (Start)", 
-                    "visit_duration": 0, 
-                    "is_reservation": False,
-                    "is_stay_anchor": True,
-                    "forcedDate": date_str
-                }] + day_places
-
-            # V8.1: Traffic-Aware Temporal Initialization
-            # Determine the day's start time from activeHours
-            start_min = 480.0 # Default 8 AM
-            if input_data.activeHours and date_str in input_data.activeHours:
-                day_cfg = input_data.activeHours[date_str]
-                start_min = day_cfg.start["hours"] * 60 + day_cfg.start["minutes"]
-
-            # V8.2: Dual-Track Traffic Matrix Fetching (Live vs Historical Baseline)
-            durations_live = get_tomtom_durations_matrix(day_coords, traffic=True)
-            durations_hist = get_tomtom_durations_matrix(day_coords, traffic=False)
-            
-            # Fallback to ORS if TomTom fails
-            if not durations_live:
-                durations_live = get_durations_matrix(day_coords, input_data.transportMode)
-            if not durations_hist:
-                durations_hist = durations_live
-
-            # Optimize with Time-Windows using LIVE traffic
-            result = optimize_route(
-                day_coords, 
-                durations_live, 
-                day_places, 
-                fixed_start=bool(anchor_coords),
-                start_minutes=start_min
-            )
-            
-            # Assembly
-            day_optimized_coords = []
-            for order_idx in result["order"]:
-                p = day_places[order_idx]
-                day_optimized_coords.append(day_coords[order_idx])
-                final_ordered_coords.append(day_coords[order_idx]) # FIXED: Don't scramble coords
-                final_ordered_places.append(p)
-                
-            if anchor_coords:
-                # Add end anchor
-                end_anchor = {
-                    "id": f"hotel-end-{day_idx}", 
-                    "name": "Stay Location (End)", 
-                    "visit_duration": 0, 
-                    "is_reservation": False,
-                    "is_stay_anchor": True,
-                    "forcedDate": date_str
-                }
-                final_ordered_coords.append(anchor_coords)
-                final_ordered_places.append(end_anchor)
-                day_optimized_coords.append(anchor_coords)
-                day_stop_counts.append(len(result["order"]) + 1)
+            if day_idx in resolved:
+                solved = resolved[day_idx]
             else:
-                day_stop_counts.append(len(result["order"]))
-
-            # Capture Day Polyline (Must include the return leg if anchor exists)
-            day_polyline = get_route_polyline(day_optimized_coords, input_data.transportMode)
-            route_geojson[str(day_idx)] = day_polyline
-
-
-        # Step 4: Schedule Generation with Traffic Comparison
-        # NEW V8.3: Use Route Summary (Sequence) instead of Matrix to bypass 100-cell limit
-        leg_summaries = get_tomtom_route_summary(final_ordered_coords, input_data.transportMode)
-        
-        # Build 1D-sparse matrices for the scheduler (it only needs the adjacent pairs [idx][idx+1])
-        n_total = len(final_ordered_coords)
-        live_matrix = [[0.0] * n_total for _ in range(n_total)]
-        hist_matrix = [[0.0] * n_total for _ in range(n_total)]
-        
-        if leg_summaries:
-            for i, sim in enumerate(leg_summaries):
-                live_matrix[i][i+1] = sim["liveMinutes"]
-                hist_matrix[i][i+1] = sim["historicalMinutes"]
-        else:
-            # Fallback to general ORS matrix if TomTom is unavailable
-            full_durations = get_durations_matrix(final_ordered_coords, input_data.transportMode)
-            for i in range(n_total - 1):
-                live_matrix[i][i+1] = full_durations[i][i+1]
-                hist_matrix[i][i+1] = full_durations[i][i+1]
-
-        active_hours_dict = {k: v.dict() for k, v in input_data.activeHours.items()}
-        
-        schedule = generate_schedule(
-            final_ordered_places,
-            final_ordered_coords,
-            list(range(len(final_ordered_places))),
-            datetime.fromisoformat(input_data.startDate),
-            active_hours_dict,
-            live_matrix,
-            None, # base_durations_matrix (deprecated in favor of dual hist/live)
-            hist_matrix
-        )
-
-        # Step 5: Route Polyline
-        full_polyline = get_route_polyline(final_ordered_coords, input_data.transportMode)
-        route_geojson["all"] = full_polyline
+                # Rebuild the ordered stops from the cached order without re-solving
+                day_places = [dict(p) for p in day_state["places"]]
+                apply_reservation_times(day_places)
+                for p in day_places:
+                    p["forcedDate"] = day_state["date"]
+                day_coords = list(day_state["coords"])
+                if anchor_coords:
+                    day_places = [stay_anchor(day_idx, day_state["date"], "start")] + day_places
+                    day_coords = [anchor_coords] + day_coords
+                solved = {
+                    "places": [day_places[i] for i in day_state["order"]],
+                    "coords": [day_coords[i] for i in day_state["order"]]
+                }
+                if anchor_coords:
+                    solved["places"].append(stay_anchor(day_idx, day_state["date"], "end"))
+                    solved["coords"].append(anchor_coords)
+
+            final_ordered_places.extend(solved["places"])
+            final_ordered_coords.extend(solved["coords"])
+            matrix_indices.extend(day_matrix_indices(day_idx, day_state, anchor_coords))
+            route_geojson[str(day_idx)] = day_state["route"]
+            solver_tiers[str(day_idx)] = day_state.get("tier")
+            day_paths.append(solved["coords"])
+            day_routes.append(day_state["route"])
+
+        # Step 3: Legs - previous plan first, then day matrices, then a single-leg fetch
+        cached_legs = state["legs"]
+        legs = await lookup_legs(final_ordered_coords, matrix_indices, days_state, input_data, cached_legs)
+
+        schedule = build_schedule(input_data, final_ordered_places, final_ordered_coords, legs)
+        full_route = await build_full_route(day_paths, day_routes, input_data)
+
+        plan_token = await store_plan_state({
+            "input": state["input"],
+            "days": days_state,
+            "legs": {
+                **cached_legs,
+                **{leg_key(a, b): list(leg) for a, b, leg in zip(final_ordered_coords, final_ordered_coords[1:], legs)}
+            }
+        })
 
         return {
             "schedule": schedule,
-            "routeGeoJson": route_geojson,
-            "orderedCoords": final_ordered_coords
+            **format_routes(route_geojson, full_route, input_data),
+            "orderedCoords": final_ordered_coords,
+            "solverTiers": solver_tiers,
+            "planToken": plan_token,
+            "patchedDays": sorted(affected)
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/recommend")
 async def recommend(lat: float, lon: float, interest: str):
-    pois = fetch_nearby_pois(lat, lon, interest)
-    ranked = rank_pois_with_cohere(pois, interest, settings.COHERE_API_KEY)
+    pois = await fetch_nearby_pois_async(lat, lon, interest)
+    # Cohere SDK and the local ranker are blocking, keep them off the event loop
+    ranked = await asyncio.to_thread(rank_pois, pois, interest)
     return ranked[:10]
 
 @app.get("/api/enrich")
 async def enrich(name: str, lat: float, lon: float):
-    return fetch_wiki_data(name, lat, lon)
+    return await fetch_wiki_data_async(name, lat, lon)
+
+MAX_ENRICH_BATCH = 100
+
+class EnrichPlace(BaseModel):
+    name: str
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class EnrichBatchInput(BaseModel):
+    places: List[EnrichPlace]
+
+@app.post("/api/enrich")
+async def enrich_batch(input_data: EnrichBatchInput):
+    """Enriches many places at once; results are in request order ({} where nothing was found)."""
+    if len(input_data.places) > MAX_ENRICH_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ENRICH_BATCH} places per request")
+    return await fetch_wiki_data_batch_async([(p.name, p.lat, p.lon) for p in input_data.places])
 
 @app.get("/api/autocomplete")
 async def autocomplete(text: str, lat: Optional[float] = None, lon: Optional[float] = None, radius: Optional[int] = None):
     focus = (lat, lon) if lat is not None and lon is not None else None
-    return get_autocomplete_suggestions(text, focus, boundary_radius_km=radius)
+    return await get_autocomplete_suggestions_async(text, focus, boundary_radius_km=radius)
 
 @app.get("/api/geocode")
 async def geocode(text: str):
     try:
-        lat, lon = get_coordinates(text)
+        lat, lon = await get_coordinates_async(text)
         return {"lat": lat, "lon": lon}
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 @app.get("/api/weather")
 async def weather(lat: float, lon: float):
-    data = get_weather_data(lat, lon)
+    data = await get_weather_data_async(lat, lon)
     if not data:
         raise HTTPException(status_code=500, detail="Failed to fetch weather data")
     return data
 
-from .engine.magic_parser import parse_magic_prompt
+from .engine.magic_parser import parse_magic_prompt_async
 
 @app.post("/api/magic")
 async def magic_parse(data: Dict[str, str]):
@@ -286,6 +809,6 @@ async def magic_parse(data: Dict[str, str]):
     if not prompt:
         raise HTTPException(status_code=400, detail="Prompt is required")
     try:
-        return parse_magic_prompt(prompt)
+        return await parse_magic_prompt_async(prompt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,12 @@
+import pytest
+
+PROVIDER_KEYS = ["ORS_API_KEY", "GEMINI_API_KEY", "COHERE_API_KEY", "TOMTOM_API_KEY", "OPENWEATHER_API_KEY"]
+
+@pytest.fixture
+def provider_env(monkeypatch):
+    """
+    Dummy provider keys for the duration of one test, so modules that build
+    api.config.settings on import can be imported inside it.
+    """
+    for key in PROVIDER_KEYS:
+        monkeypatch.setenv(key, "test")
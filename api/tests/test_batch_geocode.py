@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+PARIS = (48.8566, 2.3522)
+TEXAS = (33.6609, -95.5555) # Paris, Texas: the classic same-name outlier
+
+@pytest.fixture
+def ors(provider_env):
+    from api.clients import ors_client
+    return ors_client
+
+def fake_geocoder(monkeypatch, ors, answers):
+    """
+    answers: name -> coords (or an Exception) for the first-pass lookup; chained
+    lookups (focus on a previous pin) resolve "name@near" if present.
+    """
+    calls = []
+
+    async def geocode(name, focus=None, boundary_radius_km=None):
+        calls.append((name, focus))
+        answer = answers.get(f"{name}@near") if focus is not None and focus != PARIS else answers.get(name)
+        if answer is None or isinstance(answer, Exception):
+            raise answer or Exception(f"Place not found: {name}")
+        return answer
+
+    monkeypatch.setattr(ors, "get_coordinates_async", geocode)
+    return calls
+
+def batch(ors, names, known=None):
+    return asyncio.run(ors.get_coordinates_batch_async(names, PARIS, known))
+
+def test_known_coords_are_kept_and_order_preserved(ors, monkeypatch):
+    calls = fake_geocoder(monkeypatch, ors, {"Louvre": (48.861, 2.336), "Orsay": (48.860, 2.326)})
+    results = batch(ors, ["Louvre", "Picked on map", "Orsay"], [None, [48.85, 2.30], None])
+    assert results == [(48.861, 2.336), (48.85, 2.30), (48.860, 2.326)]
+    assert sorted(calls) == [("Louvre", PARIS), ("Orsay", PARIS)]
+
+def test_failures_stay_per_place(ors, monkeypatch):
+    fake_geocoder(monkeypatch, ors, {"Louvre": (48.861, 2.336), "Typo": Exception("Place not found: Typo")})
+    results = batch(ors, ["Louvre", "Typo"])
+    assert results[0] == (48.861, 2.336)
+    assert isinstance(results[1], Exception) and "Typo" in str(results[1])
+
+def test_outliers_are_re_queried_near_the_previous_pin(ors, monkeypatch):
+    calls = fake_geocoder(monkeypatch, ors, {
+        "Louvre": (48.861, 2.336),
+        "Eiffel Tower": TEXAS,
+        "Eiffel Tower@near": (48.858, 2.294),
+        "Orsay": (48.860, 2.326),
+    })
+    results = batch(ors, ["Louvre", "Eiffel Tower", "Orsay"])
+    assert results == [(48.861, 2.336), (48.858, 2.294), (48.860, 2.326)]
+    # Only the outlier gets a second lookup, focused on the pin before it
+    assert calls[3:] == [("Eiffel Tower", (48.861, 2.336))]
+
+def test_a_failed_re_query_keeps_the_first_answer(ors, monkeypatch):
+    fake_geocoder(monkeypatch, ors, {"Louvre": (48.861, 2.336), "Orsay": (48.860, 2.326), "Eiffel Tower": TEXAS})
+    assert batch(ors, ["Louvre", "Orsay", "Eiffel Tower"])[2] == TEXAS
+
+def test_no_outlier_pass_below_three_pins(ors, monkeypatch):
+    calls = fake_geocoder(monkeypatch, ors, {"Louvre": (48.861, 2.336), "Eiffel Tower": TEXAS, "Eiffel Tower@near": (48.858, 2.294)})
+    assert batch(ors, ["Louvre", "Eiffel Tower"]) == [(48.861, 2.336), TEXAS]
+    assert len(calls) == 2
+
+def test_known_coords_are_never_re_queried(ors, monkeypatch):
+    calls = fake_geocoder(monkeypatch, ors, {"Louvre": (48.861, 2.336), "Orsay": (48.860, 2.326)})
+    results = batch(ors, ["Louvre", "Far pick", "Orsay"], [None, list(TEXAS), None])
+    assert results[1] == TEXAS
+    assert [name for name, _ in calls] == ["Louvre", "Orsay"]
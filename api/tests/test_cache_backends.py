@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.engine import cache_backends
+from api.engine.cache_backends import CircuitBreakerCache, MemoryCacheBackend, SqliteCacheBackend, create_cache_backend
+
+@pytest.fixture
+def cache_manager(provider_env):
+    from api.engine import cache_manager
+    return cache_manager
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    yield path
+    SqliteCacheBackend._connections.pop(path, None)
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    monkeypatch.setattr(cache_backends.RedisCacheBackend, "_clients", {})
+    return server
+
+def round_trip(cache):
+    cache["a"] = {"stops": [1, 2], "name": "x"}
+    cache.set_many({"b": [1.5, 2.5], "c": "text"})
+    assert cache.get("a") == {"stops": [1, 2], "name": "x"}
+    assert cache.get("missing") is None
+    assert cache.get_many(["a", "b", "c", "missing"]) == {"a": {"stops": [1, 2], "name": "x"}, "b": [1.5, 2.5], "c": "text"}
+    cache.clear()
+    assert cache.get_many(["a", "b", "c"]) == {}
+
+def test_memory_round_trip_and_ttl():
+    cache = MemoryCacheBackend("t", maxsize=10, ttl=60)
+    round_trip(cache)
+    cache["k"] = 1
+    cache.expire(time.monotonic() + 61)
+    assert cache.get("k") is None
+
+def test_sqlite_round_trip_ttl_and_namespaces(sqlite_path, monkeypatch):
+    cache = SqliteCacheBackend("a", maxsize=10, ttl=60, path=sqlite_path)
+    other = SqliteCacheBackend("b", maxsize=10, ttl=60, path=sqlite_path)
+    round_trip(cache)
+
+    cache["k"] = 1
+    other["k"] = 2
+    assert (cache.get("k"), other.get("k")) == (1, 2)
+    now = time.time()
+    monkeypatch.setattr(cache_backends.time, "time", lambda: now + 61)
+    assert cache.get("k") is None and cache.get_many(["k"]) == {}
+
+def test_sqlite_purge_trims_to_maxsize(sqlite_path, monkeypatch):
+    monkeypatch.setattr(SqliteCacheBackend, "PURGE_EVERY", 5)
+    cache = SqliteCacheBackend("p", maxsize=3, ttl=60, path=sqlite_path)
+    for i in range(5):
+        cache[f"k{i}"] = i
+    assert len(cache.get_many([f"k{i}" for i in range(5)])) == 3
+
+def test_redis_round_trip_and_ttl(fake_redis):
+    cache = cache_backends.RedisCacheBackend("r", maxsize=10, ttl=60, url="redis://test/0")
+    round_trip(cache)
+    cache["k"] = 1
+    assert 0 < cache.client.ttl("yathirai:r:k") <= 60
+
+def test_unreachable_redis_falls_back_to_memory():
+    pytest.importorskip("redis")
+    cache = create_cache_backend("redis", "down", 10, 60, "", "redis://127.0.0.1:1/0")
+    assert isinstance(cache, MemoryCacheBackend)
+
+class FlakyBackend:
+    namespace = "flaky"
+
+    def __init__(self):
+        self.calls = 0
+        self.down = True
+        self.data = {}
+
+    def get(self, key, default=None):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("down")
+        return self.data.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("down")
+        self.data[key] = value
+
+def test_breaker_routes_to_memory_after_a_failure(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(cache_backends.time, "monotonic", lambda: clock[0])
+    backend = FlakyBackend()
+    cache = CircuitBreakerCache(backend, MemoryCacheBackend("flaky", 10, 60))
+
+    cache["k"] = 1 # Fails once, then lands in memory
+    assert cache.is_open and backend.calls == 1
+    assert cache.get("k") == 1
+    assert backend.calls == 1 # No further round trips while open
+
+    clock[0] += CircuitBreakerCache.COOLDOWN + 1
+    backend.down = False
+    cache["k"] = 2
+    assert not cache.is_open and backend.data == {"k": 2}
+    assert cache.get("k") == 2
+
+def test_async_helpers_keep_blocking_backends_off_the_loop(cache_manager):
+    loop_thread = []
+    seen = []
+
+    class Recording(MemoryCacheBackend):
+        def get(self, key, default=None):
+            seen.append(threading.get_ident())
+            return super().get(key, default)
+
+    async def lookup(cache):
+        loop_thread.append(threading.get_ident())
+        return await cache_manager.get_cached_item_async(cache, "k")
+
+    blocking = Recording("b", 10, 60)
+    blocking.blocking = True
+    blocking["k"] = 1
+    assert asyncio.run(lookup(blocking)) == 1
+    assert seen[-1] != loop_thread[-1]
+
+    inline = Recording("i", 10, 60)
+    inline["k"] = 2
+    assert asyncio.run(lookup(inline)) == 2
+    assert seen[-1] == loop_thread[-1]
+
+def test_single_flight_coalesces_concurrent_calls(cache_manager):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": len(calls)}
+
+    async def main():
+        results = await asyncio.gather(*[cache_manager.single_flight("sf:key", fetch) for _ in range(5)])
+        assert cache_manager._in_flight == {}
+        again = await cache_manager.single_flight("sf:key", fetch)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == [{"value": 1}] * 5
+    assert again == {"value": 2} and len(calls) == 2
+
+def test_single_flight_shares_errors_and_survives_waiter_cancellation(cache_manager):
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        errors = await asyncio.gather(*[cache_manager.single_flight("sf:err", failing) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(e, ValueError) for e in errors)
+
+        first = asyncio.ensure_future(cache_manager.single_flight("sf:slow", slow))
+        second = asyncio.ensure_future(cache_manager.single_flight("sf:slow", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
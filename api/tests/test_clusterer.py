@@ -0,0 +1,130 @@
+import random
+
+import pytest
+
+from api.engine.clusterer import cluster_places, cluster_places_capacitated
+
+def random_trip(seed: int):
+    rng = random.Random(seed)
+    num_days = rng.randint(1, 7)
+    places = []
+    for i in range(rng.randint(1, 60)):
+        place = {"name": f"P{i}", "coords": (48.8 + rng.random() * 0.2, 2.2 + rng.random() * 0.3)}
+        if rng.random() < 0.05:
+            place["coords"] = None
+        if rng.random() < 0.1:
+            place["is_reservation"] = True
+            place["reservation_date"] = f"2026-10-{17 + rng.randint(-1, num_days):02d}"
+        places.append(place)
+    base = (48.9, 2.35) if rng.random() < 0.5 else None
+    return places, num_days, base
+
+ENGINES = ["legacy", "numpy"]
+
+@pytest.mark.parametrize("seed", range(25))
+def test_numpy_engine_matches_legacy(seed):
+    places, num_days, base = random_trip(seed)
+    legacy = cluster_places(places, "2026-10-17", num_days, base, engine="legacy")
+    vectorized = cluster_places(places, "2026-10-17", num_days, base, engine="numpy")
+    assert [day["indices"] for day in vectorized] == [day["indices"] for day in legacy]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_no_places(engine):
+    assert cluster_places([], "2026-10-17", 3, (48.9, 2.35), engine=engine) == [{"places": [], "indices": []}] * 3
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_more_days_than_places_leaves_days_empty(engine):
+    places = [{"name": "A", "coords": (48.85, 2.35)}, {"name": "B", "coords": (48.86, 2.36)}]
+    days = cluster_places(places, "2026-10-17", 4, None, engine=engine)
+    assert [day["indices"] for day in days] == [[0], [1], [], []]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_unlocated_places_go_to_the_first_day(engine):
+    places = [
+        {"name": "Seed 1", "coords": (48.85, 2.35)},
+        {"name": "Seed 2", "coords": (48.95, 2.45)},
+        {"name": "Nowhere", "coords": None},
+        {"name": "Near seed 2", "coords": (48.951, 2.451)},
+    ]
+    days = cluster_places(places, "2026-10-17", 2, None, engine=engine)
+    assert [day["indices"] for day in days] == [[0, 2], [1, 3]]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_reservations_outside_the_trip_are_not_pinned(engine):
+    places = [
+        {"name": "Booked day 2", "coords": (48.85, 2.35), "is_reservation": True, "reservation_date": "2026-10-18"},
+        {"name": "Booked before trip", "coords": (48.85, 2.35), "is_reservation": True, "reservation_date": "2026-10-16"},
+        {"name": "Date only", "coords": (48.85, 2.35), "reservation_date": "2026-10-18"},
+        {"name": "Bad date", "coords": (48.85, 2.35), "is_reservation": True, "reservation_date": "soon"},
+    ]
+    days = cluster_places(places, "2026-10-17", 2, None, engine=engine)
+    assert days[1]["indices"][0] == 0
+    assert days[0]["indices"][0] == 1 # First unpinned place seeds the empty day
+    assert sorted(days[0]["indices"] + days[1]["indices"]) == [0, 1, 2, 3]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_ties_go_to_the_earliest_day(engine):
+    # Both days are equally far and equally full, so the strict '<' scan keeps day 0
+    places = [{"name": "West", "coords": (48.0, 2.0)}, {"name": "East", "coords": (48.0, 3.0)}, {"name": "Middle", "coords": (48.0, 2.5)}]
+    days = cluster_places(places, "2026-10-17", 2, None, engine=engine)
+    assert [day["indices"] for day in days] == [[0, 2], [1]]
+
+def near_stops(*visits):
+    # Same spot for every stop, so only capacity decides the split
+    return [{"name": f"P{i}", "coords": (48.85, 2.35), "visit_duration": v} for i, v in enumerate(visits)]
+
+def zero_travel(n: int):
+    return [[0.0] * n for _ in range(n)]
+
+def test_capacitated_without_days_returns_no_days():
+    assert cluster_places_capacitated(near_stops(60, 60), "2026-10-17", 0) == []
+    assert cluster_places_capacitated([], "2026-10-17", 0, day_capacities=[]) == []
+
+def test_capacitated_fills_a_day_before_opening_the_next():
+    places = near_stops(60, 60, 60)
+    days = cluster_places_capacitated(places, "2026-10-17", 2, durations=zero_travel(3))
+    assert [day["indices"] for day in days] == [[0, 1, 2], []]
+
+def test_capacitated_spills_when_a_day_is_full():
+    places = near_stops(400, 400, 300)
+    days = cluster_places_capacitated(places, "2026-10-17", 2, durations=zero_travel(3))
+    assert [day["indices"] for day in days] == [[0, 2], [1]]
+    for day in days:
+        assert sum(p["visit_duration"] for p in day["places"]) <= 720
+
+def test_capacitated_counts_travel_against_capacity():
+    places = near_stops(100, 100)
+    travel = [[0.0, 650.0], [650.0, 0.0]]
+    days = cluster_places_capacitated(places, "2026-10-17", 2, durations=travel, day_capacities=[720.0, 720.0])
+    assert [day["indices"] for day in days] == [[0], [1]]
+
+def test_capacitated_overflows_the_least_full_day():
+    places = near_stops(500, 500, 500)
+    days = cluster_places_capacitated(places, "2026-10-17", 2, durations=zero_travel(3), day_capacities=[600.0, 900.0])
+    assert [day["indices"] for day in days] == [[0], [1, 2]]
+
+def test_capacitated_keeps_reservations_on_their_day():
+    places = near_stops(60, 60, 60)
+    places[2].update(is_reservation=True, reservation_date="2026-10-19")
+    places.append({"name": "Booked after trip", "coords": (48.85, 2.35), "visit_duration": 60, "is_reservation": True, "reservation_date": "2026-10-25"})
+    days = cluster_places_capacitated(places, "2026-10-17", 3, durations=zero_travel(4))
+    assert 2 in days[2]["indices"]
+    assert all(2 not in day["indices"] for day in days[:2])
+    assert sorted(i for day in days for i in day["indices"]) == [0, 1, 2, 3]
+
+def test_capacitated_keeps_a_full_reservation_day():
+    # The reserved day is over capacity on its own; it still stays there and nothing joins it
+    places = near_stops(60, 800)
+    places[1].update(is_reservation=True, reservation_date="2026-10-18")
+    days = cluster_places_capacitated(places, "2026-10-17", 2, durations=zero_travel(2))
+    assert [day["indices"] for day in days] == [[0], [1]]
+
+def test_capacitated_puts_unlocated_places_on_the_emptiest_day():
+    places = near_stops(400, 400) + [
+        {"name": "Nowhere", "coords": None, "visit_duration": 200},
+        {"name": "Also nowhere", "coords": None, "visit_duration": 200},
+    ]
+    places[1]["coords"] = (48.95, 2.45)
+    days = cluster_places_capacitated(places, "2026-10-17", 2, day_capacities=[720.0, 900.0])
+    # Spare minutes 320 / 500: the first goes to day 1 (leaving 300), the second to day 0
+    assert [day["indices"] for day in days] == [[0, 3], [1, 2]]
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.engine.distance_estimator import (
+    CALIBRATION_BOUNDS,
+    EstimatorCalibration,
+    calibrate_estimator,
+    calibration,
+    estimate_durations_array,
+)
+
+COORDS = [(48.8566, 2.3522), (48.8606, 2.3376), (48.8530, 2.3499), (48.8738, 2.2950)]
+
+@pytest.fixture(autouse=True)
+def fresh_calibration():
+    calibration.reset()
+    yield
+    calibration.reset()
+
+def test_calibration_converges_to_real_ratio():
+    real = (estimate_durations_array(COORDS) * 1.5).tolist()
+    assert calibrate_estimator(COORDS, real) == pytest.approx(1.5)
+    assert estimate_durations_array(COORDS).ravel().tolist() == pytest.approx(sum(real, []))
+    # Repeated identical observations keep the multiplier where it is
+    assert calibrate_estimator(COORDS, real) == pytest.approx(1.5)
+
+def test_calibration_is_bounded_and_resettable():
+    cal = EstimatorCalibration()
+    assert cal.observe("driving-car", 100.0) == CALIBRATION_BOUNDS[1]
+    cal.reset()
+    assert cal.scale("driving-car") == 1.0
+
+def test_concurrent_observations_stay_consistent():
+    cal = EstimatorCalibration(weight=0.5)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cal.observe("foot-walking", 2.0), range(500)))
+    assert cal.scale("foot-walking") == pytest.approx(2.0)
@@ -0,0 +1,34 @@
+import numpy as np
+
+from api.engine.embedding_store import EmbeddingStore
+
+def fake_embed(texts):
+    return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+def test_crashed_append_does_not_shift_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    first = store.get_or_embed(["a", "b"], ["alpha", "beta"], fake_embed)
+
+    # A writer died after writing its vectors but before (or while) writing its keys
+    with open(tmp_path / "vectors.f32", "ab") as f:
+        f.write(np.full((3, 3), 99, dtype=np.float32).tobytes())
+    with open(tmp_path / "keys.txt", "ab") as f:
+        f.write(b"orph")
+
+    second = EmbeddingStore(str(tmp_path)).get_or_embed(["c", "a"], ["gamma", "alpha"], fake_embed)
+    np.testing.assert_array_equal(second, np.asarray([fake_embed(["gamma"])[0], first[0]], dtype=np.float32))
+
+    reopened = EmbeddingStore(str(tmp_path))
+    calls = []
+    vectors = reopened.get_or_embed(["a", "b", "c"], ["alpha", "beta", "gamma"], lambda t: calls.append(t) or fake_embed(t))
+    assert calls == []
+    np.testing.assert_array_equal(vectors, np.asarray(fake_embed(["alpha", "beta", "gamma"]), dtype=np.float32))
+    assert (tmp_path / "vectors.f32").stat().st_size == 3 * 3 * 4
+    assert (tmp_path / "keys.txt").read_text() == "a\nb\nc\n"
+
+def test_orphan_vectors_before_first_key(tmp_path):
+    with open(tmp_path / "vectors.f32", "wb") as f:
+        f.write(np.ones((2, 3), dtype=np.float32).tobytes())
+    vectors = EmbeddingStore(str(tmp_path)).get_or_embed(["a"], ["alpha"], fake_embed)
+    np.testing.assert_array_equal(vectors, np.asarray(fake_embed(["alpha"]), dtype=np.float32))
+    assert (tmp_path / "vectors.f32").stat().st_size == 3 * 4
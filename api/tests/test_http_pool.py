@@ -0,0 +1,87 @@
+import asyncio
+import functools
+
+import httpx
+import pytest
+
+from api.clients import http_pool
+
+@pytest.fixture
+def transport(monkeypatch):
+    """Routes every pooled client through a mock transport; the handler is set per test."""
+    state = {"handler": lambda request: httpx.Response(200, json={"ok": True})}
+
+    async def handle(request):
+        result = state["handler"](request)
+        return await result if asyncio.iscoroutine(result) else result
+
+    monkeypatch.setattr(http_pool.httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(http_pool, "_clients", {})
+    monkeypatch.setattr(http_pool, "_limits", {})
+    return state
+
+def test_one_client_per_provider_until_closed(transport):
+    async def run():
+        ors = http_pool.get_http_client("ors")
+        assert http_pool.get_http_client("ors") is ors
+        assert http_pool.get_http_client("tomtom") is not ors
+        await http_pool.close_http_clients()
+        assert ors.is_closed and http_pool._clients == {}
+        assert http_pool.get_http_client("ors") is not ors
+        await http_pool.close_http_clients()
+
+    asyncio.run(run())
+
+def test_provider_headers_and_timeouts(transport):
+    seen = []
+
+    def record(request):
+        seen.append(request)
+        return httpx.Response(200)
+    transport["handler"] = record
+
+    async def run():
+        await http_pool.http_request("wiki", "GET", "https://en.wikipedia.org/w/api.php")
+        await http_pool.http_request("ors", "GET", "https://api.openrouteservice.org/x", timeout=2.0)
+        await http_pool.close_http_clients()
+
+    asyncio.run(run())
+    assert seen[0].headers["User-Agent"].startswith("YathiraiPlanner/")
+    assert seen[0].extensions["timeout"]["read"] == http_pool.provider_timeout("wiki")
+    assert "YathiraiPlanner" not in seen[1].headers.get("User-Agent", "")
+    assert seen[1].extensions["timeout"]["read"] == 2.0
+
+@pytest.mark.parametrize("provider", ["weather", "overpass"])
+def test_requests_are_bounded_by_the_provider_limit(transport, provider):
+    in_flight = peak = 0
+
+    async def slow(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200)
+    transport["handler"] = slow
+
+    async def run():
+        responses = await asyncio.gather(*[http_pool.http_request(provider, "GET", f"https://example.test/{i}") for i in range(12)])
+        await http_pool.close_http_clients()
+        return responses
+
+    assert all(r.status_code == 200 for r in asyncio.run(run()))
+    assert peak == http_pool.PROVIDERS[provider]["max_connections"]
+
+def test_streams_hold_a_slot_until_the_body_is_read(transport):
+    transport["handler"] = lambda request: httpx.Response(200, content=b"x" * 100)
+
+    async def run():
+        limit = http_pool.PROVIDERS["overpass"]["max_connections"]
+        async with http_pool.http_stream("overpass", "POST", "https://overpass.test", content="q") as response:
+            assert http_pool._limits["overpass"]._value == limit - 1
+            body = b"".join([chunk async for chunk in response.aiter_bytes(10)])
+        assert http_pool._limits["overpass"]._value == limit
+        await http_pool.close_http_clients()
+        return body
+
+    assert asyncio.run(run()) == b"x" * 100
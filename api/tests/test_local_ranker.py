@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+import pytest
+
+from api.engine.embedding_store import EmbeddingStore
+from api.engine.local_ranker import BM25_B, BM25_K1, bm25_scores, poi_tokens, rank_pois_bm25, rank_pois_embedding, tokenize
+
+def reference_bm25(documents, query_terms):
+    """Textbook BM25 (Lucene idf), one document and term at a time."""
+    n = len(documents)
+    avg = max(sum(len(d) for d in documents) / n, 1.0)
+    scores = []
+    for doc in documents:
+        score = 0.0
+        for term in dict.fromkeys(query_terms):
+            df = sum(1 for d in documents if term in d)
+            tf = doc.count(term)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avg))
+        scores.append(score)
+    return scores
+
+def poi(name, **tags):
+    return {"id": name, "name": name, "tags": tags}
+
+def names(ranked):
+    return [p["name"] for p in ranked]
+
+def test_tokenize_splits_on_punctuation_and_keeps_accents():
+    assert tokenize("Sacré-Cœur, Montmartre_Hill (1914)") == ["sacré", "cœur", "montmartre", "hill", "1914"]
+    assert tokenize("") == []
+
+def test_scores_match_the_reference_formula():
+    documents = [
+        ["gothic", "cathedral", "gothic"],
+        ["park", "garden", "fountain", "park", "lawn"],
+        ["museum"],
+        [],
+        ["cathedral", "museum", "treasury", "crypt"],
+    ]
+    for query in (["gothic", "cathedral"], ["museum", "museum"], ["missing"], ["park", "crypt"]):
+        assert bm25_scores(documents, query).tolist() == pytest.approx(reference_bm25(documents, query))
+
+def test_empty_inputs_score_zero():
+    assert bm25_scores([], ["park"]).tolist() == []
+    assert bm25_scores([["park"]], []).tolist() == [0.0]
+
+def test_name_matches_outrank_tag_matches():
+    pois = [poi("Jardin des Plantes", leisure="park"), poi("Park Hyatt", tourism="hotel"), poi("Louvre", tourism="museum")]
+    assert names(rank_pois_bm25(pois, "park")) == ["Park Hyatt", "Jardin des Plantes", "Louvre"]
+
+def test_only_descriptive_tags_count():
+    assert poi_tokens(poi("Spot", historic="castle", **{"addr:street": "Castle Road", "website": "castle.example"})) == ["spot", "spot", "castle"]
+    pois = [poi("Cafe", **{"addr:street": "Castle Road"}), poi("Keep", historic="castle")]
+    ranked = rank_pois_bm25(pois, "castle")
+    assert names(ranked) == ["Keep", "Cafe"]
+    assert ranked[1]["score"] == 0.0
+
+def test_rarer_terms_weigh_more():
+    pois = [poi("Old Church"), poi("Old Bridge"), poi("Old Tower"), poi("Crypt")]
+    ranked = rank_pois_bm25(pois, "old crypt")
+    assert names(ranked)[0] == "Crypt"
+
+def test_expansion_terms_lift_matching_tags():
+    pois = [poi("Hôtel de Ville", building="civic"), poi("Vincennes", historic="castle"), poi("Gare", building="train_station")]
+    assert rank_pois_bm25(pois, "gothic architecture")[0]["score"] == 0.0
+    ranked = rank_pois_bm25(pois, "gothic architecture", expansion=["castle", "palace", "civic"])
+    assert names(ranked)[-1] == "Gare"
+    assert all(p["score"] > 0 for p in ranked[:2])
+
+def test_ties_keep_the_input_order():
+    pois = [poi("A"), poi("B"), poi("C")]
+    assert names(rank_pois_bm25(pois, "")) == ["A", "B", "C"]
+
+class FakeModel:
+    """Bag-of-letters 'embedding' so similarity is predictable."""
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy):
+        vectors = np.zeros((len(texts), 26), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for ch in text.lower():
+                if "a" <= ch <= "z":
+                    vectors[i, ord(ch) - 97] += 1
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+def test_embedding_ranking_is_cosine_similarity():
+    pois = [poi("zzz"), poi("abc"), poi("abd")]
+    ranked = rank_pois_embedding(pois, "abc", FakeModel(), EmbeddingStore(None), ["zzz", "abc", "abd"])
+    assert names(ranked) == ["abc", "abd", "zzz"]
+    assert [p["score"] for p in ranked] == pytest.approx([1.0, 2 / 3, 0.0])
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from fastapi import HTTPException
+
+def fake_minutes(a, b) -> float:
+    # Deterministic stand-in for a provider duration (0 for the same pin)
+    return round(1000 * (abs(a[0] - b[0]) + abs(a[1] - b[1])), 3)
+
+class FakeProviders:
+    """Records the provider calls plan_events / patch_plan make, with canned answers."""
+
+    def __init__(self):
+        self.matrix_sizes = []
+        self.route_calls = []
+
+    async def geocode(self, name, focus=None, boundary_radius_km=None):
+        raise Exception(f"Place not found: {name}")
+
+    async def geocode_batch(self, names, focus, known):
+        return [tuple(c) if c else Exception(f"Place not found: {name}") for name, c in zip(names, known)]
+
+    async def traffic_matrices(self, coords, profile="car"):
+        return None
+
+    async def route_summary(self, coords, profile="car"):
+        return []
+
+    async def leg_details(self, a, b, profile="car"):
+        return None
+
+    async def durations_matrix(self, coords, profile="driving-car"):
+        self.matrix_sizes.append(len(coords))
+        return [[fake_minutes(a, b) for b in coords] for a in coords]
+
+    async def route(self, coords, profile="driving-car"):
+        self.route_calls.append(len(coords))
+        return {"type": "FeatureCollection", "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in coords]},
+            "properties": {}
+        }]}
+
+@pytest.fixture
+def plan_api(provider_env, monkeypatch):
+    from api import index
+    from api.engine.distance_estimator import calibration
+
+    fake = FakeProviders()
+    monkeypatch.setattr(index, "get_coordinates_async", fake.geocode)
+    monkeypatch.setattr(index, "get_coordinates_batch_async", fake.geocode_batch)
+    monkeypatch.setattr(index, "get_tomtom_traffic_matrices_async", fake.traffic_matrices)
+    monkeypatch.setattr(index, "get_tomtom_route_summary_async", fake.route_summary)
+    monkeypatch.setattr(index, "get_tomtom_leg_details_async", fake.leg_details)
+    monkeypatch.setattr(index, "get_durations_matrix_async", fake.durations_matrix)
+    monkeypatch.setattr(index, "get_route_polyline_async", fake.route)
+    monkeypatch.setattr(index.settings, "ROAD_GRAPH_PATH", "")
+    monkeypatch.setattr(index, "solver_pool", None)
+    monkeypatch.setattr(index, "fake", fake, raising=False)
+    yield index
+    calibration.reset()
+
+def place(i: int, lat: float, lon: float, **extra):
+    return {"id": f"p{i}", "name": f"Place {i}", "visit_duration": 60, "is_reservation": False, "coords": (lat, lon), **extra}
+
+def plan_input(index, places, **extra):
+    fields = {
+        "baseCity": "",
+        "accommodation": "",
+        "startDate": "2026-10-17",
+        "tripLength": 2,
+        "places": places,
+        "activeHours": {},
+        **extra
+    }
+    return index.PlanInput(**fields)
+
+# Two tight groups about 13 km apart
+TWO_GROUPS = [
+    place(0, 48.850, 2.350), place(1, 48.852, 2.353), place(2, 48.855, 2.349),
+    place(3, 48.950, 2.450), place(4, 48.953, 2.452), place(5, 48.949, 2.455),
+]
+
+@pytest.mark.parametrize("anchor", [None, (48.90, 2.40)])
+def test_fallback_legs_skip_the_full_trip_matrix(plan_api, anchor):
+    input_data = plan_input(plan_api, TWO_GROUPS, accommodationCoords=anchor)
+    result = asyncio.run(plan_api.plan_trip(input_data))
+
+    coords = result["orderedCoords"]
+    sizes = plan_api.fake.matrix_sizes
+    # One matrix per day (stops + start anchor), then one 2-stop call for the leg
+    # between days (none when both ends are the stay); never one over the whole trip
+    if anchor:
+        assert len(sizes) == 2 and sum(sizes) == 6 + 2
+    else:
+        assert len(sizes) == 3 and sum(sizes) == 6 + 2 and 2 in sizes
+    assert max(sizes) < len(coords)
+
+    travel = [stop["travelMinutes"] for stop in result["schedule"]]
+    assert travel[1:] == [fake_minutes(a, b) for a, b in zip(coords, coords[1:])]
+
+def test_draft_fallback_legs_use_the_estimator(plan_api):
+    input_data = plan_input(plan_api, TWO_GROUPS, draft=True)
+    result = asyncio.run(plan_api.plan_trip(input_data))
+
+    coords = result["orderedCoords"]
+    travel = [stop["travelMinutes"] for stop in result["schedule"]]
+    expected = [plan_api.estimate_durations_matrix([a, b])[0][1] for a, b in zip(coords, coords[1:])]
+    assert travel[1:] == pytest.approx(expected)
+    assert plan_api.fake.matrix_sizes == [] and plan_api.fake.route_calls == []
+
+def broken_process_pool():
+    pool = ProcessPoolExecutor(max_workers=1)
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result() # The worker dies, as after an OOM kill
+    return pool
+
+def test_broken_solver_pool_is_replaced(plan_api, monkeypatch):
+    broken = broken_process_pool()
+    replacement = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(plan_api, "solver_pool", broken)
+    monkeypatch.setattr(plan_api, "create_solver_pool", lambda: replacement)
+    durations = [[0, 5, 9], [5, 0, 4], [9, 4, 0]]
+    places = [{"id": f"p{i}", "visit_duration": 0} for i in range(3)]
+
+    async def solve_twice():
+        first = await plan_api.run_solver([(0, 0)] * 3, durations, places)
+        assert plan_api.solver_pool is replacement
+        second = await plan_api.run_solver([(0, 0)] * 3, durations, places)
+        return first, second
+
+    first, second = asyncio.run(solve_twice())
+    assert first["order"] == second["order"]
+    assert sorted(first["order"]) == [0, 1, 2]
+    replacement.shutdown()
+
+def test_solver_falls_back_to_threads_when_no_pool_can_start(plan_api, monkeypatch):
+    monkeypatch.setattr(plan_api, "solver_pool", broken_process_pool())
+    monkeypatch.setattr(plan_api, "create_solver_pool", lambda: None)
+    result = asyncio.run(plan_api.run_solver([(0, 0)] * 2, [[0, 1], [1, 0]], [{"id": "a"}, {"id": "b"}]))
+    assert sorted(result["order"]) == [0, 1]
+    assert plan_api.solver_pool is None
+
+# Interleaved so the greedy clusterer seeds one group per day
+GROUPS = [
+    place(0, 48.850, 2.350), place(3, 48.950, 2.450),
+    place(1, 48.852, 2.353), place(4, 48.953, 2.452),
+    place(2, 48.855, 2.349), place(5, 48.949, 2.455),
+]
+ANCHOR = (48.90, 2.40)
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def plan_store(request, plan_api, tmp_path, monkeypatch):
+    """plan_cache on each backend; the shared ones round-trip the plan state through JSON."""
+    from api.engine import cache_backends
+    if request.param == "memory":
+        store = cache_backends.MemoryCacheBackend("plan", maxsize=16, ttl=3600)
+    elif request.param == "sqlite":
+        path = str(tmp_path / "plans.sqlite3")
+        store = cache_backends.SqliteCacheBackend("plan", maxsize=16, ttl=3600, path=path)
+        request.addfinalizer(lambda: cache_backends.SqliteCacheBackend._connections.pop(path, None))
+    else:
+        fakeredis = pytest.importorskip("fakeredis")
+        import redis
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+        monkeypatch.setattr(cache_backends.RedisCacheBackend, "_clients", {})
+        store = cache_backends.RedisCacheBackend("plan", maxsize=16, ttl=3600, url="redis://test")
+    monkeypatch.setattr(plan_api, "plan_cache", store)
+    return store
+
+def as_json(value):
+    return json.loads(json.dumps(value))
+
+def plan(index, places, anchor=ANCHOR):
+    return as_json(asyncio.run(index.plan_trip(plan_input(index, places, accommodationCoords=anchor))))
+
+def patch(index, token, op, **fields):
+    return as_json(asyncio.run(index.patch_plan(index.PlanPatchInput(planToken=token, op=op, **fields))))
+
+def same_plan(patched, replanned):
+    for field in ("schedule", "orderedCoords", "solverTiers"):
+        assert patched[field] == replanned[field], field
+
+@pytest.mark.parametrize("anchor", [None, ANCHOR])
+def test_patched_remove_matches_a_full_replan(plan_api, plan_store, anchor):
+    original = plan(plan_api, GROUPS, anchor)
+    plan_api.fake.matrix_sizes.clear()
+
+    patched = patch(plan_api, original["planToken"], "remove", placeId="p1")
+    assert patched["patchedDays"] == [0]
+    # Shrinking a day re-uses its matrix with the row and column dropped; at most
+    # the leg into the next day is new
+    assert plan_api.fake.matrix_sizes in ([], [2])
+    same_plan(patched, plan(plan_api, [p for p in GROUPS if p["id"] != "p1"], anchor))
+
+@pytest.mark.parametrize("anchor", [None, ANCHOR])
+def test_patched_add_matches_a_full_replan(plan_api, plan_store, anchor):
+    original = plan(plan_api, GROUPS, anchor)
+    plan_api.fake.matrix_sizes.clear()
+    added = place(6, 48.951, 2.447)
+
+    patched = patch(plan_api, original["planToken"], "add", place=added)
+    assert patched["patchedDays"] == [1]
+    # Only the grown day is fetched, plus at most the leg into it from the day before
+    assert plan_api.fake.matrix_sizes[0] == 4 + (1 if anchor else 0)
+    assert plan_api.fake.matrix_sizes[1:] in ([], [2])
+    same_plan(patched, plan(plan_api, GROUPS + [added], anchor))
+
+def test_patched_move_re_solves_both_days(plan_api, plan_store):
+    original = plan(plan_api, GROUPS)
+    patched = patch(plan_api, original["planToken"], "move", placeId="p2", day=1)
+    assert patched["patchedDays"] == [0, 1]
+
+    coords = patched["orderedCoords"]
+    ids = [stop["id"] for stop in patched["schedule"]]
+    day_1 = ids[ids.index("hotel-end-0") + 1:]
+    assert sorted(i for i in day_1 if i.startswith("p")) == ["p2", "p3", "p4", "p5"]
+    assert [stop["travelMinutes"] for stop in patched["schedule"]][1:] == [fake_minutes(a, b) for a, b in zip(coords, coords[1:])]
+
+def test_patches_chain_through_new_tokens(plan_api, plan_store):
+    original = plan(plan_api, GROUPS)
+    removed = patch(plan_api, original["planToken"], "remove", placeId="p4")
+    restored = patch(plan_api, removed["planToken"], "add", place=GROUPS[3], day=1)
+    same_plan(restored, original)
+
+def test_patching_leaves_the_original_plan_untouched(plan_api, plan_store):
+    original = plan(plan_api, GROUPS)
+    key = f"plan:{original['planToken']}"
+    before = as_json(plan_store.get(key))
+
+    first = patch(plan_api, original["planToken"], "move", placeId="p0", day=1)
+    patch(plan_api, original["planToken"], "remove", placeId="p5")
+    assert as_json(plan_store.get(key)) == before
+    # The same edit on the same token gives the same answer
+    assert patch(plan_api, original["planToken"], "move", placeId="p0", day=1)["schedule"] == first["schedule"]
+
+def test_drop_matrix_index(plan_api):
+    matrix = [[0, 1, 2], [3, 0, 4], [5, 6, 0]]
+    assert plan_api.drop_matrix_index(matrix, 1) == [[0, 2], [5, 0]]
+    assert plan_api.drop_matrix_index(matrix, 0) == [[0, 4], [6, 0]]
+    assert matrix == [[0, 1, 2], [3, 0, 4], [5, 6, 0]]
+
+@pytest.mark.parametrize("token, op, fields, status", [
+    ("unknown", "remove", {"placeId": "p0"}, 404),
+    (None, "rename", {"placeId": "p0"}, 400),
+    (None, "remove", {}, 400),
+    (None, "remove", {"placeId": "nope"}, 404),
+    (None, "move", {"placeId": "nope", "day": 1}, 404),
+    (None, "add", {}, 400),
+    (None, "add", {"place": place(9, 48.85, 2.35), "day": 2}, 400),
+    (None, "move", {"placeId": "p0", "day": -1}, 400),
+])
+def test_patch_errors(plan_api, plan_store, token, op, fields, status):
+    original = plan(plan_api, GROUPS)
+    with pytest.raises(HTTPException) as error:
+        patch(plan_api, token or original["planToken"], op, **fields)
+    assert error.value.status_code == status
+
+async def read_stream(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+def test_stream_reports_geocode_days_then_plan(plan_api):
+    response = asyncio.run(plan_api.plan_trip_stream(plan_input(plan_api, GROUPS, accommodationCoords=ANCHOR)))
+    assert response.media_type == "application/x-ndjson"
+    events = asyncio.run(read_stream(response))
+
+    assert [e["type"] for e in events] == ["geocode", "day", "day", "plan"]
+    assert [p["id"] for p in events[0]["places"]] == [p["id"] for p in GROUPS]
+    assert sorted(e["day"] for e in events[1:3]) == [0, 1]
+    stops = {e["day"]: [s["id"] for s in e["stops"]] for e in events[1:3]}
+    schedule_ids = [stop["id"] for stop in events[-1]["result"]["schedule"]]
+    assert schedule_ids == stops[0] + stops[1]
+
+def test_days_stream_in_completion_order(plan_api, monkeypatch):
+    fetch = plan_api.fake.durations_matrix
+
+    async def slow_first_day(coords, profile="driving-car"):
+        if GROUPS[0]["coords"] in [tuple(c) for c in coords]:
+            await asyncio.sleep(0.05)
+        return await fetch(coords, profile)
+
+    monkeypatch.setattr(plan_api, "get_durations_matrix_async", slow_first_day)
+    events = asyncio.run(read_stream(asyncio.run(plan_api.plan_trip_stream(plan_input(plan_api, GROUPS)))))
+    assert [e.get("day") for e in events if e["type"] == "day"] == [1, 0]
+    assert events[-1]["type"] == "plan"
+
+def test_stream_failures_end_with_an_error_line(plan_api, monkeypatch):
+    async def broken_route(coords, profile="driving-car"):
+        raise RuntimeError("directions down")
+
+    monkeypatch.setattr(plan_api, "get_route_polyline_async", broken_route)
+    events = asyncio.run(read_stream(asyncio.run(plan_api.plan_trip_stream(plan_input(plan_api, GROUPS)))))
+    assert events[0]["type"] == "geocode"
+    assert events[-1] == {"type": "error", "detail": "directions down"}
+
+def test_disconnect_cancels_unfinished_days(plan_api, monkeypatch):
+    fetch = plan_api.fake.durations_matrix
+    cancelled = []
+
+    async def stuck_second_day(coords, profile="driving-car"):
+        if GROUPS[1]["coords"] in [tuple(c) for c in coords]:
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(len(coords))
+                raise
+        return await fetch(coords, profile)
+
+    monkeypatch.setattr(plan_api, "get_durations_matrix_async", stuck_second_day)
+
+    async def first_day_then_disconnect():
+        response = await plan_api.plan_trip_stream(plan_input(plan_api, GROUPS))
+        lines = response.body_iterator
+        seen = [json.loads(await lines.__anext__()) for _ in range(2)]
+        await lines.aclose() # What Starlette does when the client goes away
+        await asyncio.sleep(0.01)
+        # Checked before asyncio.run's own shutdown would cancel leftover tasks
+        return seen, list(cancelled)
+
+    seen, cancelled_on_close = asyncio.run(asyncio.wait_for(first_day_then_disconnect(), timeout=5))
+    assert [e["type"] for e in seen] == ["geocode", "day"] and seen[1]["day"] == 0
+    assert cancelled_on_close == [3]
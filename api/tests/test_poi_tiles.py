@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from api.engine import geohash
+
+@pytest.fixture
+def recommendation(provider_env):
+    from api.engine import recommendation
+    return recommendation
+
+def fake_overpass(n_elements: int, tiles):
+    south, west, north, east = geohash.bbox(tiles[0])
+    elements = [
+        {"id": i, "lat": south + (north - south) * (i + 0.5) / n_elements, "lon": (west + east) / 2, "tags": {"name": f"P{i}"}}
+        for i in range(n_elements)
+    ]
+    async def stream(query, add):
+        for el in elements:
+            add(el)
+        return True
+    return stream
+
+def test_30km_fallback_is_capped_like_the_untiled_query(recommendation):
+    tiles = geohash.covering_tiles(48.85, 2.35, 30000, recommendation.poi_tile_precision(30000))
+    assert len(tiles[0]) == 4
+    assert "out center 500;" in recommendation.build_overpass_tiles_query(tiles, "attraction")
+    assert "out center;" in recommendation.build_overpass_tiles_query(["u09tv"], "attraction")
+
+def test_capped_tile_answer_is_returned_but_not_cached(recommendation, monkeypatch):
+    tiles = ["u09t"]
+    stream = fake_overpass(recommendation.CAPPED_TILE_LIMIT, tiles)
+    monkeypatch.setattr(recommendation, "stream_overpass_async", stream)
+
+    by_tile = asyncio.run(recommendation.fetch_poi_tiles_async(tiles, "capped-test"))
+    assert len(by_tile["u09t"]) == recommendation.CAPPED_TILE_LIMIT
+    assert recommendation.poi_cache.get_many([recommendation.poi_tile_cache_key("capped-test", "u09t")]) == {}
+
+def test_complete_tile_answer_is_cached(recommendation, monkeypatch):
+    tiles = ["u09w"]
+    stream = fake_overpass(10, tiles)
+    monkeypatch.setattr(recommendation, "stream_overpass_async", stream)
+
+    asyncio.run(recommendation.fetch_poi_tiles_async(tiles, "complete-test"))
+    key = recommendation.poi_tile_cache_key("complete-test", "u09w")
+    assert len(recommendation.poi_cache.get_many([key])[key]) == 10
+
+def test_coarse_fallbacks_keep_the_element_cap(recommendation):
+    tiles = geohash.covering_tiles(48.85, 2.35, 100000, recommendation.poi_tile_precision(100000))
+    assert len(tiles[0]) == 3
+    assert "out center 500;" in recommendation.build_overpass_tiles_query(tiles, "attraction")
+
+class FakeStreamedResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def iter_content(self, size):
+        yield self.body
+
+def test_sync_fallback_closes_each_response_before_retrying(recommendation, monkeypatch):
+    found = b'{"elements": [{"id": 1, "lat": 48.9, "lon": 2.4, "tags": {"name": "Far"}}]}'
+    answers = [(500, b""), (200, b'{"elements": []}'), (200, found)]
+    opened = []
+
+    def post(url, data, timeout, stream):
+        # Every earlier response must already be closed when the next request starts
+        assert all(response.closed for response in opened)
+        status, body = answers[len(opened)]
+        opened.append(FakeStreamedResponse(status, body))
+        return opened[-1]
+
+    monkeypatch.setattr(recommendation.requests, "post", post)
+    pois = recommendation.fetch_nearby_pois(48.85, 2.35, "sights")
+    assert [poi["name"] for poi in pois] == ["Far"]
+    assert len(opened) == 3 and all(response.closed for response in opened)
+
+def test_sync_fallback_gives_up_after_the_widest_radius(recommendation, monkeypatch):
+    calls = []
+
+    def post(url, data, timeout, stream):
+        calls.append(data)
+        raise recommendation.requests.ConnectionError("offline")
+
+    monkeypatch.setattr(recommendation.requests, "post", post)
+    assert recommendation.fetch_nearby_pois(48.85, 2.35, "sights") == []
+    assert len(calls) == 1 + len(recommendation.FALLBACK_RADII)
+    assert "around:1000000" in calls[-1]
@@ -0,0 +1,62 @@
+import math
+import random
+
+import pytest
+
+from api.engine.polyline import decode_polyline, encode_route, simplify_line, simplify_route
+
+def wiggly_route(seed: int, n: int = 101, way_points=(0, 37, 63, 100)):
+    rng = random.Random(seed)
+    line = [[2.30 + i * 1e-4, 48.85 + math.sin(i / 7) * 2e-4 + rng.uniform(-1e-6, 1e-6)] for i in range(n)]
+    segments = [
+        {"distance": 100.0 * (b - a), "duration": 10.0 * (b - a), "steps": [{"way_points": [a, (a + b) // 2]}, {"way_points": [(a + b) // 2, b]}]}
+        for a, b in zip(way_points, way_points[1:])
+    ]
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": line},
+            "properties": {"summary": {"distance": 1.0, "duration": 2.0}, "segments": segments, "way_points": list(way_points)}
+        }]
+    }
+
+@pytest.mark.parametrize("seed", range(20))
+def test_simplify_route_keeps_and_remaps_way_points(seed):
+    route = wiggly_route(seed)
+    original = route["features"][0]
+    simplified = simplify_route(route, 12)["features"][0]
+    coords = simplified["geometry"]["coordinates"]
+    props = simplified["properties"]
+
+    assert len(coords) < len(original["geometry"]["coordinates"])
+    assert len(props["way_points"]) == len(original["properties"]["way_points"])
+    for old, new in zip(original["properties"]["way_points"], props["way_points"]):
+        assert coords[new] == original["geometry"]["coordinates"][old]
+    assert props["way_points"] == sorted(props["way_points"])
+    assert len(props["segments"]) == len(props["way_points"]) - 1
+    for segment, (a, b) in zip(props["segments"], zip(props["way_points"], props["way_points"][1:])):
+        assert segment["steps"][0]["way_points"][0] == a
+        assert segment["steps"][-1]["way_points"][-1] == b
+    # The input route is left untouched
+    assert original["properties"]["way_points"] == [0, 37, 63, 100]
+
+def test_fixed_vertices_survive_any_tolerance():
+    line = [[i * 1e-3, 0.0] for i in range(50)]
+    assert simplify_line(line, 1.0) == [line[0], line[-1]]
+    assert simplify_line(line, 1.0, fixed=[10, 20]) == [line[0], line[10], line[20], line[-1]]
+
+def test_encode_route_round_trip():
+    route = wiggly_route(0)
+    encoded = encode_route(route, 12)
+    simplified = simplify_route(route, 12)["features"][0]
+
+    assert len(encoded["polylines"]) == 1
+    decoded = decode_polyline(encoded["polylines"][0])
+    expected = simplified["geometry"]["coordinates"]
+    assert len(decoded) == len(expected)
+    for (lon, lat), (exp_lon, exp_lat) in zip(decoded, expected):
+        assert abs(lon - exp_lon) <= 1e-5 and abs(lat - exp_lat) <= 1e-5
+    assert encoded["way_points"] == [simplified["properties"]["way_points"]]
+    assert encoded["segments"] == [[{"distance": 3700.0, "duration": 370.0}, {"distance": 2600.0, "duration": 260.0}, {"distance": 3700.0, "duration": 370.0}]]
+    assert encoded["summary"] == {"distance": 1.0, "duration": 2.0}
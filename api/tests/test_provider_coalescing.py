@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+
+@pytest.fixture
+def ors(provider_env):
+    from api.clients import ors_client
+    ors_client.geo_cache.clear()
+    yield ors_client
+    ors_client.geo_cache.clear()
+
+@pytest.fixture
+def tomtom(provider_env):
+    from api.clients import tomtom_client
+    tomtom_client.traffic_cache.clear()
+    yield tomtom_client
+    tomtom_client.traffic_cache.clear()
+
+def slow_upstream(monkeypatch, module, respond):
+    """Replaces module.http_request with a slow fake so concurrent callers overlap; returns the call log."""
+    calls = []
+
+    async def request(provider, method, url, **kwargs):
+        calls.append((url, kwargs.get("params", {}).get("text")))
+        await asyncio.sleep(0.01)
+        return respond(len(calls))
+
+    monkeypatch.setattr(module, "http_request", request)
+    return calls
+
+def geocode_answer(lat, lon):
+    return httpx.Response(200, json={"features": [{"geometry": {"coordinates": [lon, lat]}}]})
+
+async def gather(*calls):
+    return await asyncio.gather(*calls, return_exceptions=True)
+
+def test_concurrent_geocodes_share_one_request(ors, monkeypatch):
+    calls = slow_upstream(monkeypatch, ors, lambda n: geocode_answer(48.85, 2.35))
+    results = asyncio.run(gather(*[ors.get_coordinates_async("Louvre") for _ in range(5)]))
+    assert results == [(48.85, 2.35)] * 5
+    assert len(calls) == 1
+
+    # Later calls are cache hits; other places and focus points are separate calls
+    asyncio.run(gather(ors.get_coordinates_async("Louvre"), ors.get_coordinates_async("Orsay"), ors.get_coordinates_async("Louvre", (48.0, 2.0))))
+    assert sorted(text for _, text in calls) == ["Louvre", "Louvre", "Orsay"]
+
+def test_a_failed_call_fails_every_waiter_and_is_not_cached(ors, monkeypatch):
+    calls = slow_upstream(monkeypatch, ors, lambda n: httpx.Response(503) if n == 1 else geocode_answer(48.86, 2.34))
+    results = asyncio.run(gather(*[ors.get_coordinates_async("Opera") for _ in range(3)]))
+    assert len(calls) == 1
+    assert all(isinstance(r, Exception) and "503" in str(r) for r in results)
+
+    assert asyncio.run(ors.get_coordinates_async("Opera")) == (48.86, 2.34)
+    assert len(calls) == 2
+
+def test_concurrent_route_summaries_share_one_request(tomtom, monkeypatch):
+    summary = {"routes": [{"legs": [{"summary": {"travelTimeInSeconds": 600, "historicTrafficTravelTimeInSeconds": 540}}]}]}
+    calls = slow_upstream(monkeypatch, tomtom, lambda n: httpx.Response(200, json=summary))
+    stops = [(48.85, 2.35), (48.86, 2.36)]
+
+    results = asyncio.run(gather(*[tomtom.get_tomtom_leg_details_async(*stops) for _ in range(4)]))
+    assert len(calls) == 1
+    assert results == [{"liveMinutes": 10.0, "historicalMinutes": 9.0, "noTrafficMinutes": 10.0}] * 4
+
+def test_a_cancelled_caller_leaves_the_shared_call_running(ors, monkeypatch):
+    calls = slow_upstream(monkeypatch, ors, lambda n: geocode_answer(48.87, 2.33))
+
+    async def run():
+        first = asyncio.ensure_future(ors.get_coordinates_async("Pantheon"))
+        second = asyncio.ensure_future(ors.get_coordinates_async("Pantheon"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == (48.87, 2.33)
+    assert len(calls) == 1
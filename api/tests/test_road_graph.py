@@ -0,0 +1,174 @@
+import heapq
+import math
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+
+from api.engine.road_graph import (
+    ACCESS_BIKE,
+    ACCESS_CAR,
+    ACCESS_FOOT,
+    PROFILE_MODES,
+    RoadGraph,
+    get_local_durations_matrix,
+    get_local_route_polyline,
+    load_road_graph,
+    write_road_graph,
+)
+
+@pytest.fixture(scope="module")
+def graph_dir(tmp_path_factory):
+    """Random 12 x 12 street grid around Paris with one-ways, parallel and car-free edges."""
+    rng = random.Random(7)
+    size, step = 12, 0.002
+    lats, lons = [], []
+    for r in range(size):
+        for c in range(size):
+            lats.append(48.85 + r * step)
+            lons.append(2.35 + c * step)
+    tails, heads, lengths, speeds, access = [], [], [], [], []
+
+    def add(u, v, speed, flags):
+        meters = 111320.0 * math.hypot(lats[u] - lats[v], (lons[u] - lons[v]) * math.cos(math.radians(lats[u])))
+        tails.append(u); heads.append(v); lengths.append(meters); speeds.append(speed); access.append(flags)
+
+    for r in range(size):
+        for c in range(size):
+            u = r * size + c
+            for v in ([u + 1] if c + 1 < size else []) + ([u + size] if r + 1 < size else []):
+                if rng.random() < 0.1:
+                    continue
+                speed = rng.choice([15, 25, 40, 60])
+                flags = ACCESS_FOOT | ACCESS_BIKE | (ACCESS_CAR if rng.random() < 0.85 else 0)
+                add(u, v, speed, flags)
+                add(v, u, speed, flags if rng.random() < 0.8 else ACCESS_FOOT)
+                if rng.random() < 0.05:
+                    add(u, v, speed / 2, flags) # Slower parallel edge
+    path = tmp_path_factory.mktemp("graph")
+    write_road_graph(str(path), lats, lons, tails, heads, lengths, speeds, access)
+    return str(path)
+
+def reference_minutes(graph_path, profile):
+    """Plain heap Dijkstra over the raw edge list."""
+    arrays = {name: np.load(f"{graph_path}/{name}.npy") for name in ["tail", "head", "length_m", "speed_kmh", "access", "lat"]}
+    flag, speed = PROFILE_MODES[profile]
+    adjacency = {}
+    for e in range(arrays["tail"].size):
+        if arrays["access"][e] & flag:
+            kmh = arrays["speed_kmh"][e] if speed is None else speed
+            adjacency.setdefault(int(arrays["tail"][e]), []).append((int(arrays["head"][e]), arrays["length_m"][e] / (kmh * 1000.0 / 60.0)))
+
+    def run(source):
+        dist, heap = {source: 0.0}, [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, w in adjacency.get(u, []):
+                if d + w < dist.get(v, math.inf):
+                    dist[v] = d + w
+                    heapq.heappush(heap, (d + w, v))
+        return dist
+    return run, arrays
+
+@pytest.mark.parametrize("profile", ["driving-car", "foot-walking", "cycling-regular"])
+def test_matrix_and_paths_match_reference(graph_dir, profile):
+    graph = load_road_graph(graph_dir)
+    run, arrays = reference_minutes(graph_dir, profile)
+    rng = random.Random(profile)
+    nodes = rng.sample(range(len(arrays["lat"])), 8)
+    coords = [(float(graph.lat[n]), float(graph.lon[n])) for n in nodes]
+
+    matrix = get_local_durations_matrix(coords, profile, graph_dir)
+    for i, source in enumerate(nodes):
+        reached = run(source)
+        for j, target in enumerate(nodes):
+            expected = 0.0 if i == j else reached.get(target, 99999)
+            assert matrix[i][j] == pytest.approx(expected, rel=1e-5, abs=1e-4)
+
+    for (minutes, edges), (source, target) in zip(graph.shortest_paths(list(zip(nodes, nodes[1:])), profile), zip(nodes, nodes[1:])):
+        if minutes == math.inf:
+            assert target not in run(source)
+            continue
+        flag, _ = PROFILE_MODES[profile]
+        assert all(arrays["access"][e] & flag for e in edges)
+        walk = [source] + [int(arrays["head"][e]) for e in edges]
+        assert walk[-1] == target and all(int(arrays["tail"][e]) == u for e, u in zip(edges, walk))
+        assert minutes == pytest.approx(run(source)[target], rel=1e-5)
+
+def test_snap_and_polyline(graph_dir):
+    graph = load_road_graph(graph_dir)
+    assert graph.snap([(48.8501, 2.3501), (40.0, 2.35)]) == [0, None]
+
+    route = get_local_route_polyline([(48.85, 2.35), (48.86, 2.36), (48.852, 2.352)], "foot-walking", graph_dir)
+    props = route["features"][0]["properties"]
+    assert len(props["way_points"]) == 3 and len(props["segments"]) == 2
+    assert props["way_points"][-1] == len(route["features"][0]["geometry"]["coordinates"]) - 1
+
+@pytest.fixture(scope="module")
+def detour_dir(tmp_path_factory):
+    """Two parallel 20-block streets joined only at the far end, plus one unconnected node."""
+    lats = [48.85] * 21 + [48.8505] * 21 + [48.851]
+    lons = [2.35 + i * 0.001 for i in range(21)] * 2 + [2.35]
+    tails, heads = [], []
+    for street in (0, 21):
+        for i in range(street, street + 20):
+            tails += [i, i + 1]
+            heads += [i + 1, i]
+    tails += [20, 41]
+    heads += [41, 20]
+    lengths = [111320.0 * math.hypot(lats[u] - lats[v], (lons[u] - lons[v]) * math.cos(math.radians(48.85))) for u, v in zip(tails, heads)]
+    path = tmp_path_factory.mktemp("detour")
+    write_road_graph(str(path), lats, lons, tails, heads, lengths, [30.0] * len(tails), [ACCESS_CAR] * len(tails))
+    return str(path)
+
+def test_bounded_search_grows_past_long_detours(detour_dir):
+    graph = load_road_graph(detour_dir)
+    run, _ = reference_minutes(detour_dir, "driving-car")
+    nodes = [0, 21, 42, 10]
+    matrix = get_local_durations_matrix([(float(graph.lat[n]), float(graph.lon[n])) for n in nodes], "driving-car", detour_dir)
+    for i, source in enumerate(nodes):
+        reached = run(source)
+        for j, target in enumerate(nodes):
+            expected = 0.0 if i == j else reached.get(target, 99999)
+            assert matrix[i][j] == pytest.approx(expected, rel=1e-5, abs=1e-4)
+    # 55 m apart in a straight line (0.1 min at 30 km/h), about 3 km by road
+    assert matrix[0][1] > 5
+
+    (minutes, edges), = graph.shortest_paths([(0, 21)], "driving-car")
+    assert minutes == pytest.approx(run(0)[21], rel=1e-5) and len(edges) == 41
+    assert graph.shortest_paths([(0, 42)], "driving-car") == [(math.inf, [])]
+
+def test_searches_stay_near_their_stops(graph_dir):
+    graph = load_road_graph(graph_dir)
+    nodes = graph._nodes_within([0, 1], 0.3)
+    assert nodes is not None and 0 < len(nodes) < len(graph.lat) / 4
+    assert set(nodes.tolist()) >= {0, 1}
+    assert graph._nodes_within([0], 1000.0) is None
+
+def line_graph(path, speed):
+    lats, lons = [48.85, 48.85, 48.85], [2.35, 2.351, 2.352]
+    write_road_graph(str(path), lats, lons, [0, 1, 1, 2], [1, 0, 2, 1], [73.0] * 4, [speed] * 4, [ACCESS_CAR] * 4)
+
+def test_rebuilt_graph_does_not_reuse_old_weights(tmp_path):
+    line_graph(tmp_path, 10.0)
+    before = RoadGraph(str(tmp_path)).durations([0], [2], "driving-car")[0, 0]
+    assert list(tmp_path.glob("csr_driving-car_*"))
+
+    line_graph(tmp_path, 20.0)
+    assert not list(tmp_path.glob("csr_*"))
+    after = RoadGraph(str(tmp_path)).durations([0], [2], "driving-car")[0, 0]
+    assert after == pytest.approx(before / 2)
+
+def test_damaged_weight_files_are_rebuilt(tmp_path):
+    line_graph(tmp_path, 10.0)
+    expected = RoadGraph(str(tmp_path)).durations([0], [2], "driving-car")[0, 0]
+    data_file, = tmp_path.glob("csr_driving-car_*_data.npy")
+    data_file.write_bytes(data_file.read_bytes()[:20]) # Half-written by another worker
+
+    assert RoadGraph(str(tmp_path)).durations([0], [2], "driving-car")[0, 0] == pytest.approx(expected)
+    assert RoadGraph(str(tmp_path)).durations([0], [2], "driving-car")[0, 0] == pytest.approx(expected)
+    assert not list(tmp_path.glob(".csr-*"))
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+def directions(coords):
+    """ORS-shaped directions: a midpoint between each pair of stops, 100 m / 10 s per leg."""
+    line, way_points = [], []
+    for i, (lat, lon) in enumerate(coords):
+        if i:
+            prev_lat, prev_lon = coords[i - 1]
+            line.append([(lon + prev_lon) / 2, (lat + prev_lat) / 2 + 1e-4])
+        way_points.append(len(line))
+        line.append([lon, lat])
+    segments = [{"distance": 100.0, "duration": 10.0} for _ in coords[1:]]
+    return {"type": "FeatureCollection", "features": [{
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": line},
+        "properties": {"way_points": way_points, "segments": segments, "summary": {"distance": 100.0 * len(segments), "duration": 10.0 * len(segments)}}
+    }]}
+
+@pytest.fixture
+def ors(provider_env, monkeypatch):
+    from api.clients import ors_client
+    ors_client.route_cache.clear()
+    yield ors_client
+    ors_client.route_cache.clear()
+
+def fake_directions(monkeypatch, ors, failing=()):
+    requests = []
+
+    async def fetch(coords, profile):
+        requests.append(list(coords))
+        if any(tuple(c) in failing for c in coords):
+            return None
+        return directions(coords)
+
+    monkeypatch.setattr(ors, "fetch_directions_async", fetch)
+    return requests
+
+STOPS = [(48.85 + i * 0.01, 2.35) for i in range(5)]
+
+def test_a_failed_run_only_straightens_its_own_legs(ors, monkeypatch):
+    # Legs 1-2 are cached, so legs 0 and 3 are two separate runs; the last one fails
+    asyncio.run(ors.set_cached_items_async(ors.route_cache, {
+        ors.route_leg_cache_key(a, b, "driving-car"): leg
+        for a, b, leg in zip(STOPS[1:3], STOPS[2:4], ors.split_route_legs(directions(STOPS[1:4]), 3))
+    }))
+    requests = fake_directions(monkeypatch, ors, failing={STOPS[4]})
+
+    route = asyncio.run(ors.get_route_polyline_async(STOPS))
+    props = route["features"][0]["properties"]
+    line = route["features"][0]["geometry"]["coordinates"]
+
+    assert requests == [STOPS[0:2], STOPS[3:5]]
+    assert [line[wp] for wp in props["way_points"]] == [[lon, lat] for lat, lon in STOPS]
+    # Three routed legs keep their midpoints, the failed one is a straight segment
+    assert [b - a for a, b in zip(props["way_points"], props["way_points"][1:])] == [2, 2, 2, 1]
+    assert [s["distance"] for s in props["segments"]] == [100.0, 100.0, 100.0, 0]
+
+def test_successful_runs_are_cached_and_failed_runs_retried(ors, monkeypatch):
+    fake_directions(monkeypatch, ors, failing={STOPS[4]})
+    asyncio.run(ors.get_route_polyline_async(STOPS[:3]))
+    asyncio.run(ors.get_route_polyline_async(STOPS[3:]))
+
+    requests = fake_directions(monkeypatch, ors)
+    asyncio.run(ors.get_route_polyline_async(STOPS[:3]))
+    assert requests == [] # Served from the leg cache
+    asyncio.run(ors.get_route_polyline_async(STOPS[3:]))
+    assert requests == [STOPS[3:]] # The failed run was not cached
+
+def test_every_run_failing_still_keeps_way_points(ors, monkeypatch):
+    fake_directions(monkeypatch, ors, failing=set(STOPS))
+    route = asyncio.run(ors.get_route_polyline_async(STOPS[:3]))
+    props = route["features"][0]["properties"]
+    assert route["features"][0]["geometry"]["coordinates"] == [[lon, lat] for lat, lon in STOPS[:3]]
+    assert props["way_points"] == [0, 1, 2]
@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api.engine.schedule import generate_schedule, generate_schedule_columnar
+
+START = datetime(2026, 10, 17)
+
+def random_case(seed: int):
+    rng = random.Random(seed)
+    n = rng.randint(1, 12)
+    places = []
+    for i in range(n):
+        place = {"id": f"p{i}", "name": f"P{i}", "visit_duration": rng.choice([15, 30, 45, 60, 90, 120, 240])}
+        if rng.random() < 0.15:
+            day = START + timedelta(days=rng.randint(0, 3))
+            place["reservation_time"] = day.replace(hour=rng.randint(7, 21), minute=rng.choice([0, 15, 30, 45])).isoformat()
+        if rng.random() < 0.1:
+            place["forcedDate"] = (START + timedelta(days=rng.randint(0, 3))).strftime("%Y-%m-%d")
+        places.append(place)
+    coords = [(48.8 + rng.random() * 0.2, 2.2 + rng.random() * 0.3) for _ in range(n)]
+
+    active_hours = {}
+    for d in range(5):
+        if rng.random() < 0.6:
+            start_h = rng.randint(6, 11)
+            end_h = rng.randint(15, 23) if rng.random() < 0.9 else rng.randint(0, 3) # Some days end after midnight
+            active_hours[(START + timedelta(days=d)).strftime("%Y-%m-%d")] = {
+                "start": {"hours": start_h, "minutes": rng.choice([0, 30])},
+                "end": {"hours": end_h, "minutes": rng.choice([0, 30])}
+            }
+
+    live = [round(rng.uniform(0, 90), 2) for _ in range(n - 1)]
+    hist = [max(0.0, round(m - rng.uniform(-15, 15), 2)) for m in live] if rng.random() < 0.7 else None
+    return places, coords, active_hours, live, hist
+
+ENGINES = ["columnar", "legacy"]
+
+@pytest.mark.parametrize("seed", range(25))
+def test_columnar_engine_matches_legacy(seed):
+    places, coords, active_hours, live, hist = random_case(seed)
+    order = list(range(len(places)))
+    legacy = generate_schedule(places, coords, order, START, active_hours, None, engine="legacy", live_legs=live, historical_legs=hist)
+    columnar = generate_schedule(places, coords, order, START, active_hours, None, engine="columnar", live_legs=live, historical_legs=hist)
+    assert columnar == legacy
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_missing_legs_count_as_zero_minutes(engine):
+    places = [{"id": f"p{i}", "name": f"P{i}", "visit_duration": 30} for i in range(4)]
+    coords = [(48.85 + i * 0.01, 2.35) for i in range(4)]
+    order = list(range(4))
+    short = generate_schedule(places, coords, order, START, {}, None, engine=engine, live_legs=[10, 20], historical_legs=[8])
+    padded = generate_schedule(places, coords, order, START, {}, None, engine=engine, live_legs=[10, 20, 0], historical_legs=[8, 0, 0])
+    assert short == padded
+    assert short[3]["travelMinutes"] == 0
+
+def stops(*visits):
+    return [{"id": f"p{i}", "name": f"P{i}", "visit_duration": v} for i, v in enumerate(visits)], [(48.85, 2.35)] * len(visits)
+
+def times(schedule):
+    return [(stop["arrival"], stop["departure"]) for stop in schedule]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_overflow_moves_to_the_next_day(engine):
+    places, coords = stops(600, 180, 60)
+    schedule = generate_schedule(places, coords, [0, 1, 2], START, {}, None, engine=engine, live_legs=[30, 600])
+    assert times(schedule) == [
+        ("2026-10-17T08:00:00", "2026-10-17T18:00:00"),
+        # 18:30 + 3 h runs past 20:00, so the whole visit moves to tomorrow
+        ("2026-10-18T08:00:00", "2026-10-18T11:00:00"),
+        # Arriving at 21:00, after the day ended
+        ("2026-10-19T08:00:00", "2026-10-19T09:00:00"),
+    ]
+    assert [stop["day"] for stop in schedule] == ["Saturday", "Sunday", "Monday"]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_days_ending_after_midnight(engine):
+    places, coords = stops(60, 150, 60)
+    hours = {"2026-10-17": {"start": {"hours": 18, "minutes": 0}, "end": {"hours": 1, "minutes": 30}}}
+    schedule = generate_schedule(places, coords, [0, 1, 2], START, hours, None, engine=engine, live_legs=[200, 10])
+    assert times(schedule) == [
+        ("2026-10-17T18:00:00", "2026-10-17T19:00:00"),
+        # Ends at 00:50, inside the evening that runs until 01:30
+        ("2026-10-17T22:20:00", "2026-10-18T00:50:00"),
+        # Arrives at 01:00 on the 18th, which uses that date's (default) hours
+        ("2026-10-18T08:00:00", "2026-10-18T09:00:00"),
+    ]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_reservations_wait_and_forced_dates_skip_ahead(engine):
+    places, coords = stops(30, 30, 30)
+    places[1]["reservation_time"] = "2026-10-17T12:15:00"
+    places[2]["forcedDate"] = "2026-10-19"
+    schedule = generate_schedule(places, coords, [0, 1, 2], START, {}, None, engine=engine, live_legs=[10, 10])
+    assert times(schedule) == [
+        ("2026-10-17T08:00:00", "2026-10-17T08:30:00"),
+        ("2026-10-17T12:15:00", "2026-10-17T12:45:00"),
+        ("2026-10-19T08:10:00", "2026-10-19T08:40:00"),
+    ]
+    assert [stop["isReservation"] for stop in schedule] == [False, True, False]
+
+def test_timezone_aware_clocks_use_the_legacy_walk():
+    places, coords = stops(30, 30)
+    places[1]["reservation_time"] = "2026-10-17T12:00:00+02:00"
+    aware = START.replace(tzinfo=timezone(timedelta(hours=2)))
+    assert generate_schedule_columnar(places, coords, [0, 1], START, {}, [15]) is None # Aware reservation
+    assert generate_schedule_columnar(places, coords, [0, 1], aware, {}, [15]) is None # Aware start
+
+    legacy = generate_schedule(places, coords, [0, 1], aware, {}, None, engine="legacy", live_legs=[15])
+    assert generate_schedule(places, coords, [0, 1], aware, {}, None, engine="columnar", live_legs=[15]) == legacy
+    assert legacy[1]["arrival"] == "2026-10-17T12:00:00+02:00"
+
+def test_out_of_range_clock_values_use_the_legacy_walk():
+    places, coords = stops(30)
+    hours = {"2026-10-17": {"start": {"hours": 24, "minutes": 0}, "end": {"hours": 20, "minutes": 0}}}
+    assert generate_schedule_columnar(places, coords, [0], START, hours, []) is None
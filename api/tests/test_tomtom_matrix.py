@@ -0,0 +1,133 @@
+import asyncio
+
+import httpx
+import pytest
+
+@pytest.fixture
+def tomtom(provider_env):
+    from api.clients import tomtom_client
+    tomtom_client.matrix_cache.clear()
+    yield tomtom_client
+    tomtom_client.matrix_cache.clear()
+
+def stops(n: int):
+    return [(48.80 + i * 0.01, 2.30 + (i % 3) * 0.01) for i in range(n)]
+
+def seconds(a, b) -> int:
+    # Nonzero even for a point to itself, as a snapped TomTom route can be
+    return 30 + int(1e5 * (abs(a[0] - b[0]) + abs(a[1] - b[1])))
+
+def fake_matrix_api(monkeypatch, tomtom, fail_after=None):
+    """Answers computeTravelTimeFor=all matrix calls; historic times are 90% of live."""
+    requests = []
+
+    async def request(provider, method, url, json=None, **kwargs):
+        point = lambda p: (p["point"]["latitude"], p["point"]["longitude"])
+        origins = [point(p) for p in json["origins"]]
+        destinations = [point(p) for p in json["destinations"]]
+        requests.append((origins, destinations))
+        if fail_after is not None and len(requests) > fail_after:
+            return httpx.Response(429, text="Too many requests")
+        return httpx.Response(200, json={"matrix": [[
+            {"response": {"routeSummary": {"travelTimeInSeconds": seconds(o, d), "historicTrafficTravelTimeInSeconds": 0.9 * seconds(o, d)}}}
+            for d in destinations
+        ] for o in origins]})
+
+    monkeypatch.setattr(tomtom, "http_request", request)
+    return requests
+
+def covered(blocks):
+    return [(i, j) for rows, cols in blocks for i in rows for j in cols]
+
+@pytest.mark.parametrize("n", [2, 10, 11, 25, 40])
+def test_blocks_cover_every_missing_cell_within_the_cell_limit(tomtom, n):
+    missing = {i: [j for j in range(n) if j != i] for i in range(n)}
+    blocks = tomtom.plan_matrix_blocks(missing)
+
+    for rows, cols in blocks:
+        assert len(rows) <= tomtom.TOMTOM_MATRIX_TILE_SIZE
+        assert len(rows) * len(cols) <= tomtom.TOMTOM_MATRIX_MAX_CELLS
+    cells = covered(blocks)
+    assert len(cells) == len(set(cells))
+    assert set(cells) >= {(i, j) for i in missing for j in missing[i]}
+
+def test_block_count_for_a_25_stop_day(tomtom):
+    missing = {i: [j for j in range(25) if j != i] for i in range(25)}
+    # Rows 10 / 10 / 5; each block of rows needs all 25 columns, 10 / 10 / 20 at a time
+    assert [(len(rows), len(cols)) for rows, cols in tomtom.plan_matrix_blocks(missing)] == [
+        (10, 10), (10, 10), (10, 5), (10, 10), (10, 10), (10, 5), (5, 20), (5, 5)
+    ]
+
+def test_sparse_gaps_only_request_their_columns(tomtom):
+    blocks = tomtom.plan_matrix_blocks({3: [7], 12: [0, 7]})
+    assert blocks == [([3, 12], [0, 7])]
+    assert tomtom.plan_matrix_blocks({}) == []
+
+@pytest.mark.parametrize("n", [3, 12, 25])
+def test_tiled_matrices_match_one_big_request(tomtom, monkeypatch, n):
+    coords = stops(n)
+    requests = fake_matrix_api(monkeypatch, tomtom)
+    live, hist = asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords))
+
+    assert all(len(o) * len(d) <= tomtom.TOMTOM_MATRIX_MAX_CELLS for o, d in requests)
+    for i in range(n):
+        for j in range(n):
+            expected = 0.0 if i == j else seconds(coords[i], coords[j]) / 60
+            assert live[i][j] == pytest.approx(expected)
+            assert hist[i][j] == pytest.approx(0.9 * expected)
+
+def test_one_failed_block_fails_the_matrix(tomtom, monkeypatch):
+    fake_matrix_api(monkeypatch, tomtom, fail_after=1)
+    assert asyncio.run(tomtom.get_tomtom_traffic_matrices_async(stops(15))) is None
+
+def requested_cells(requests):
+    return {(o, d) for origins, destinations in requests for o in origins for d in destinations}
+
+def test_traffic_buckets_are_15_minutes(tomtom):
+    start = 1_792_000_800 # A bucket boundary
+    assert start % (15 * 60) == 0
+    assert tomtom.traffic_bucket(start) == tomtom.traffic_bucket(start + 899)
+    assert tomtom.traffic_bucket(start + 900) == tomtom.traffic_bucket(start) + 1
+    a, b = (48.85, 2.35), (48.86, 2.36)
+    assert tomtom.cell_cache_key(a, b, "car", 1) != tomtom.cell_cache_key(a, b, "car", 2)
+    assert tomtom.cell_cache_key(a, b, "car", 1) != tomtom.cell_cache_key(b, a, "car", 1)
+
+def test_cached_cells_are_not_requested_again(tomtom, monkeypatch):
+    monkeypatch.setattr(tomtom.time, "time", lambda: 1_792_000_800.0)
+    coords = stops(13)
+    requests = fake_matrix_api(monkeypatch, tomtom)
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords[:12]))
+    requests.clear()
+
+    # Grown by one stop: rows without a gap are skipped, the rest only fetch their gaps' columns
+    live, _ = asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords))
+    new_pairs = {(a, b) for a in coords for b in coords if a != b and coords[12] in (a, b)}
+    assert requested_cells(requests) >= new_pairs
+    assert len(requested_cells(requests)) < 13 * 13 // 2
+    assert live[3][5] == pytest.approx(seconds(coords[3], coords[5]) / 60)
+
+    # Any order of cached stops is served without a request
+    requests.clear()
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords[::-1]))
+    assert requests == []
+
+def test_cells_expire_with_the_traffic_bucket(tomtom, monkeypatch):
+    now = [1_792_000_800.0]
+    monkeypatch.setattr(tomtom.time, "time", lambda: now[0])
+    coords = stops(3)
+    requests = fake_matrix_api(monkeypatch, tomtom)
+
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords))
+    now[0] += 14 * 60
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords))
+    assert len(requests) == 1
+    now[0] += 60 # The next 15-minute departure bucket
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords))
+    assert len(requests) == 2
+
+def test_cells_are_cached_per_mode(tomtom, monkeypatch):
+    coords = stops(3)
+    requests = fake_matrix_api(monkeypatch, tomtom)
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords, "car"))
+    asyncio.run(tomtom.get_tomtom_traffic_matrices_async(coords, "pedestrian"))
+    assert len(requests) == 2
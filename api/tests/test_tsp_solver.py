@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from api.engine import tsp_solver
+from api.engine.tsp_solver import (
+    _held_karp_dict,
+    _held_karp_numpy,
+    _held_karp_pruned,
+    evaluate_route,
+    prepare_constraints,
+)
+
+def random_instance(seed: int):
+    """Random day (2-9 stops) with visits and a few reservations, feasible or not."""
+    rng = random.Random(seed)
+    n = rng.randint(2, 9)
+    points = [(rng.uniform(0, 60), rng.uniform(0, 60)) for _ in range(n)]
+    durations = [
+        [0.0 if i == j else abs(a[0] - b[0]) + abs(a[1] - b[1]) + rng.uniform(0, 5) for j, b in enumerate(points)]
+        for i, a in enumerate(points)
+    ]
+    places = [{"visit_duration": rng.choice([0, 30, 45, 60, 90])} for _ in range(n)]
+    for idx in rng.sample(range(n), rng.randint(0, min(3, n))):
+        minutes = rng.randint(8 * 60, 18 * 60)
+        places[idx]["reservation_time"] = f"2026-10-17T{minutes // 60:02d}:{minutes % 60:02d}:00"
+    return n, durations, places, rng.random() < 0.5
+
+def solve_all(n, durations, places, fixed_start):
+    visits, windows = prepare_constraints(n, places)
+    args = (n, durations, visits, windows, fixed_start, 480.0)
+    return visits, windows, {
+        "dict": _held_karp_dict(*args),
+        "numpy": _held_karp_numpy(*args),
+        "pruned": _held_karp_pruned(*args),
+    }
+
+@pytest.mark.parametrize("seed", range(25))
+def test_engines_agree(seed):
+    n, durations, places, fixed_start = random_instance(seed)
+    visits, windows, paths = solve_all(n, durations, places, fixed_start)
+
+    feasible = {name: path is not None for name, path in paths.items()}
+    assert len(set(feasible.values())) == 1, feasible
+    if paths["dict"] is None:
+        return
+
+    finishes = {}
+    for name, path in paths.items():
+        assert sorted(path) == list(range(n))
+        if fixed_start:
+            assert path[0] == 0
+        lateness, finish = evaluate_route(path, durations, visits, windows, 480.0)
+        assert lateness == 0
+        finishes[name] = finish
+    # Ties may pick different orders; the optimal finish time must match
+    assert finishes["numpy"] == pytest.approx(finishes["dict"])
+    assert finishes["pruned"] == pytest.approx(finishes["dict"])
+
+def line_durations(n: int, step: float = 10.0):
+    return [[abs(i - j) * step for j in range(n)] for i in range(n)]
+
+def test_empty_and_single_stop_days():
+    assert tsp_solver.optimize_route([], []) == {"optimized_coords": [], "order": [], "tier": "exact"}
+    assert tsp_solver.optimize_route([(1.0, 2.0)], [[0.0]]) == {"optimized_coords": [(1.0, 2.0)], "order": [0], "tier": "exact"}
+
+@pytest.mark.parametrize("n, exact_limit, prune, tier", [
+    (6, 6, False, "exact"),
+    (7, 6, False, "heuristic"),
+    (7, 6, True, "exact"), # Pruning keeps days up to prune_limit exact
+])
+def test_tier_switches_at_the_exact_limit(n, exact_limit, prune, tier):
+    coords = [(float(i), 0.0) for i in range(n)]
+    result = tsp_solver.optimize_route(coords, line_durations(n), fixed_start=True, exact_limit=exact_limit, prune=prune, prune_limit=7, time_budget_ms=20)
+    assert result["tier"] == tier
+    assert result["order"] == list(range(n)) # Walking the line is optimal from the fixed start
+
+@pytest.mark.parametrize("arrival_offset, feasible", [(5.0, True), (5.5, False)])
+def test_reservation_buffer_boundary(arrival_offset, feasible):
+    # Leaving the stay at 08:00, the 08:10 reservation is reached offset minutes late
+    places = [{"visit_duration": 0}, {"reservation_time": "2026-10-17T08:10:00"}]
+    _, _, paths = solve_all(2, [[0.0, 10.0 + arrival_offset], [10.0 + arrival_offset, 0.0]], places, True)
+    assert {name: path is not None for name, path in paths.items()} == {"dict": feasible, "numpy": feasible, "pruned": feasible}
+
+def test_reservations_force_the_visiting_order():
+    durations = line_durations(4)
+    places = [{"visit_duration": 0}, {"visit_duration": 30, "reservation_time": "2026-10-17T11:00:00"}, {"visit_duration": 30}, {"visit_duration": 30, "reservation_time": "2026-10-17T09:00:00"}]
+    _, _, paths = solve_all(4, durations, places, True)
+    for path in paths.values():
+        assert path.index(3) < path.index(1)
+
+def test_impossible_reservations_fall_back_to_input_order():
+    # Two 60-minute visits both booked for 09:00, 30 minutes apart
+    durations = line_durations(3, 30.0)
+    places = [{"visit_duration": 0}] + [{"visit_duration": 60, "reservation_time": "2026-10-17T09:00:00"}] * 2
+    _, _, paths = solve_all(3, durations, places, True)
+    assert all(path is None for path in paths.values())
+
+    coords = [(float(i), 0.0) for i in range(3)]
+    for prune in (False, True):
+        result = tsp_solver.optimize_route(coords, durations, places, fixed_start=True, prune=prune)
+        assert result == {"optimized_coords": coords, "order": [0, 1, 2], "tier": "fallback"}
+
+def test_pruned_overflow_falls_back_to_heuristic(monkeypatch):
+    n, durations, places, _ = random_instance(1)
+    monkeypatch.setattr(tsp_solver, "PRUNED_MAX_CANDIDATES", 1)
+    result = tsp_solver.optimize_route([(0.0, 0.0)] * n, durations, places, prune=True)
+    assert result["tier"] in ("heuristic", "fallback")
+
+def test_pruned_engine_does_not_swallow_memory_errors(monkeypatch):
+    n, durations, places, _ = random_instance(1)
+
+    def exhausted(*args):
+        raise MemoryError("allocation failed")
+
+    monkeypatch.setattr(tsp_solver, "_held_karp_pruned", exhausted)
+    with pytest.raises(MemoryError):
+        tsp_solver.optimize_route([(0.0, 0.0)] * n, durations, places, prune=True)
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+SUMMARY = "A wrought-iron lattice tower on the Champ de Mars in Paris."
+
+def page(title, extract=SUMMARY, **extra):
+    return {"title": title, "extract": extract, **extra}
+
+@pytest.fixture
+def wiki(provider_env):
+    from api.clients import wiki_client
+    wiki_client.wiki_cache.clear()
+    yield wiki_client
+    wiki_client.wiki_cache.clear()
+
+def test_titles_follow_normalisation_and_redirects(wiki):
+    data = {"query": {
+        "normalized": [{"from": "eiffel tower", "to": "Eiffel tower"}, {"from": "musee d'orsay", "to": "Musee d'orsay"}],
+        "redirects": [{"from": "Eiffel tower", "to": "Eiffel Tower"}, {"from": "Tour Eiffel", "to": "Eiffel Tower"}, {"from": "Musee d'orsay", "to": "Musée d'Orsay"}],
+        "pages": {
+            "9232": page("Eiffel Tower", thumbnail={"source": "https://img/eiffel.jpg"}),
+            "63516": page("Musée d'Orsay", extract="A museum in Paris on the Left Bank of the Seine."),
+            "1": page("Louvre"),
+        }
+    }}
+    found = wiki.parse_wiki_titles_response(data, ["eiffel tower", "Tour Eiffel", "musee d'orsay"])
+    assert found["eiffel tower"] == {"photo": "https://img/eiffel.jpg", "summary": SUMMARY, "pageId": "9232"}
+    assert found["Tour Eiffel"] == found["eiffel tower"]
+    assert found["musee d'orsay"]["pageId"] == "63516"
+    assert "Louvre" not in found # Returned but not requested
+
+def test_missing_and_disambiguation_pages_are_dropped(wiki):
+    data = {"query": {"pages": {
+        "-1": {"title": "Nowhere Land", "missing": ""},
+        "-2": {"title": "Also Missing", "missing": ""},
+        "77": page("Mercury", extract="Mercury may refer to: a planet, an element, a god."),
+        "78": page("Tiny", extract="Too short."),
+        "79": page("Photo Only", extract="", thumbnail={"source": "https://img/p.jpg"}),
+    }}}
+    found = wiki.parse_wiki_titles_response(data, ["Nowhere Land", "Also Missing", "Mercury", "Tiny", "Photo Only"])
+    assert list(found) == ["Photo Only"]
+    assert wiki.parse_wiki_titles_response({}, ["Anything"]) == {}
+
+def fake_wiki(monkeypatch, wiki, known_titles):
+    title_batches, fallbacks = [], []
+
+    async def titles_call(titles):
+        title_batches.append(list(titles))
+        return {t: {"summary": f"About {t}", "pageId": t} for t in titles if t in known_titles}
+
+    async def fallback(key, name, lat, lon):
+        fallbacks.append(name)
+        return {"summary": f"Near {lat},{lon}", "pageId": "geo"} if lat is not None else {}
+
+    monkeypatch.setattr(wiki, "wiki_titles_call_async", titles_call)
+    monkeypatch.setattr(wiki, "enrich_fallback_stages_async", fallback)
+    return title_batches, fallbacks
+
+def test_batch_queries_titles_in_groups_and_keeps_input_order(wiki, monkeypatch):
+    names = [f"Place {i}" for i in range(45)]
+    title_batches, fallbacks = fake_wiki(monkeypatch, wiki, set(names[:40]))
+    places = [(name, None, None) for name in names] + [("Place 3", None, None), ("Unknown | pipe", 48.85, 2.35)]
+
+    results = asyncio.run(wiki.fetch_wiki_data_batch_async(places))
+    assert [len(b) for b in title_batches] == [wiki.WIKI_TITLES_BATCH, wiki.WIKI_TITLES_BATCH, 5] # "Place 3" asked once
+    assert [r.get("pageId") for r in results[:40]] == names[:40]
+    assert results[40:45] == [{}] * 5
+    assert results[45]["pageId"] == "Place 3"
+    assert results[46]["pageId"] == "geo"
+    assert sorted(fallbacks) == sorted(names[40:] + ["Unknown | pipe"])
+
+def test_batch_serves_cached_places_without_queries(wiki, monkeypatch):
+    title_batches, _ = fake_wiki(monkeypatch, wiki, {"Louvre", "Orsay"})
+    asyncio.run(wiki.fetch_wiki_data_batch_async([("Louvre", None, None)]))
+    title_batches.clear()
+
+    results = asyncio.run(wiki.fetch_wiki_data_batch_async([("Orsay", None, None), ("Louvre", None, None)]))
+    assert title_batches == [["Orsay"]]
+    assert [r["pageId"] for r in results] == ["Orsay", "Louvre"]
+
+@pytest.fixture
+def api(provider_env, monkeypatch):
+    from api import index
+    calls = []
+
+    async def batch(places):
+        calls.append(places)
+        return [{} for _ in places]
+
+    monkeypatch.setattr(index, "fetch_wiki_data_batch_async", batch)
+    return index, calls
+
+def test_enrich_endpoint_caps_the_batch(api):
+    index, calls = api
+    at_limit = index.EnrichBatchInput(places=[{"name": f"P{i}", "lat": 48.85, "lon": 2.35} for i in range(index.MAX_ENRICH_BATCH)])
+    assert asyncio.run(index.enrich_batch(at_limit)) == [{}] * index.MAX_ENRICH_BATCH
+    assert calls[0][0] == ("P0", 48.85, 2.35)
+
+    over = index.EnrichBatchInput(places=[{"name": f"P{i}"} for i in range(index.MAX_ENRICH_BATCH + 1)])
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(index.enrich_batch(over))
+    assert error.value.status_code == 400
+    assert len(calls) == 1
@@ -16,6 +16,7 @@ import {
     planTripWithPython, 
     recommendWithPython, 
     enrichWithPython, 
+    enrichManyWithPython,
     getWeatherWithPython, 
     getGeocodeWithPython, 
     getAutocompleteWithPython,
@@ -333,11 +334,14 @@ export default function Home() {
             const ranked = await recommendWithPython(cityCoords[0], cityCoords[1], interest);
             setRecommendations(ranked);
 
-            // V6.1: Progressive Enrichment (Async via Python)
-            for (const poi of ranked.slice(0, 10)) {
-                const enriched = await enrichWithPython(poi.name, poi.lat, poi.lon);
-                setRecommendations((prev: POI[]) => prev.map((p: POI) => p.id === poi.id ? { ...p, ...enriched } : p));
-                if (poi.id === ranked[0].id) setSelectedEnrichment({ ...poi, ...enriched });
+            // V6.1: Enrichment (one batched call via Python)
+            const top = ranked.slice(0, 10);
+            if (top.length) {
+                const enrichedList = await enrichManyWithPython(top.map((poi: POI) => ({ name: poi.name, lat: poi.lat, lon: poi.lon })));
+                const enrichedById: Record<number, Partial<POI>> = {};
+                top.forEach((poi: POI, i: number) => { enrichedById[poi.id] = enrichedList[i] || {}; });
+                setRecommendations((prev: POI[]) => prev.map((p: POI) => enrichedById[p.id] ? { ...p, ...enrichedById[p.id] } : p));
+                setSelectedEnrichment({ ...top[0], ...enrichedById[top[0].id] });
             }
         } catch (err: any) {
             setError(err.message || 'Failed to fetch recommendations.');
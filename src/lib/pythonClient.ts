@@ -12,12 +12,32 @@ export interface PlanInput {
   places: any[];
   transportMode: string;
   activeHours: Record<string, any>;
+  draft?: boolean; // Offline estimates only: instant, no traffic or road geometry
+  clusteringMode?: 'greedy' | 'capacitated'; // 'capacitated' fills days by activeHours minutes
+  routeFormat?: 'geojson' | 'polyline'; // 'polyline' returns routePolylines instead of routeGeoJson
+  routeZoom?: number; // Simplify route geometry for this map zoom level
 }
 
 export interface PlanResult {
   schedule: any[];
-  routeGeoJson: Record<string, any>;
+  routeGeoJson: Record<string, any>; // Absent when routeFormat is 'polyline'
+  routePolylines?: Record<string, {
+    polylines: string[];
+    way_points: number[][]; // Stop vertex indices per polyline
+    segments: { distance: number; duration: number }[][];
+    summary: any;
+  } | null>;
   orderedCoords: [number, number][];
+  solverTiers?: Record<string, string>;
+  planToken?: string;
+}
+
+export interface PlanPatch {
+  planToken: string;
+  op: 'add' | 'remove' | 'move';
+  place?: any;
+  placeId?: string;
+  day?: number;
 }
 
 export async function planTripWithPython(input: PlanInput): Promise<PlanResult> {
@@ -35,6 +55,67 @@ export async function planTripWithPython(input: PlanInput): Promise<PlanResult>
   return response.json();
 }
 
+export type PlanEvent =
+  | { type: 'geocode'; places: { id: string; name: string; coords: [number, number] | null }[] }
+  | { type: 'day'; day: number; date: string; stops: { id: string; name: string; coords: [number, number] }[]; route: any; tier: string }
+  | { type: 'plan'; result: PlanResult }
+  | { type: 'error'; detail: string };
+
+/**
+ * Streaming variant of planTripWithPython: onEvent fires for geocode results and
+ * each day as soon as it is solved; resolves with the final plan.
+ */
+export async function streamPlanWithPython(input: PlanInput, onEvent: (event: PlanEvent) => void): Promise<PlanResult> {
+  const response = await fetch('/api/plan/stream', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(input)
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error('Failed to plan trip with Python engine.');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result: PlanResult | null = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value, { stream: !done });
+
+    const lines = buffer.split('\n');
+    buffer = done ? '' : lines.pop() || '';
+    for (const line of lines) {
+      if (!line.trim()) continue;
+      const event = JSON.parse(line) as PlanEvent;
+      if (event.type === 'error') throw new Error(event.detail);
+      if (event.type === 'plan') result = event.result;
+      onEvent(event);
+    }
+    if (done) break;
+  }
+
+  if (!result) throw new Error('Plan stream ended without a result.');
+  return result;
+}
+
+export async function patchPlanWithPython(patch: PlanPatch): Promise<PlanResult & { patchedDays: number[] }> {
+  const response = await fetch('/api/plan/patch', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(patch)
+  });
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Failed to patch trip plan.');
+  }
+
+  return response.json();
+}
+
 export async function recommendWithPython(lat: number, lon: number, interest: string): Promise<any[]> {
   const response = await fetch(`/api/recommend?lat=${lat}&lon=${lon}&interest=${encodeURIComponent(interest)}`);
   if (!response.ok) throw new Error('Recommendation fail.');
@@ -47,6 +128,19 @@ export async function enrichWithPython(name: string, lat: number, lon: number):
   return response.json();
 }
 
+/**
+ * Enriches many places in one request (results in input order, {} where nothing was found).
+ */
+export async function enrichManyWithPython(places: { name: string; lat?: number; lon?: number }[]): Promise<any[]> {
+  const response = await fetch('/api/enrich', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ places })
+  });
+  if (!response.ok) throw new Error('Enrichment fail.');
+  return response.json();
+}
+
 export async function getAutocompleteWithPython(text: string, lat?: number, lon?: number, radius?: number): Promise<any[]> {
   let url = `/api/autocomplete?text=${encodeURIComponent(text)}`;
   if (lat !== undefined && lon !== undefined) {
@@ -87,3 +181,25 @@ export async function parseMagicPromptWithPython(prompt: string): Promise<any> {
 
   return response.json();
 }
+
+/** Decodes a Google encoded polyline (precision 5) into GeoJSON-order [lon, lat] pairs. */
+export function decodePolyline(encoded: string): [number, number][] {
+  const points: [number, number][] = [];
+  let index = 0, lat = 0, lon = 0;
+  while (index < encoded.length) {
+    const deltas: number[] = [];
+    for (let k = 0; k < 2; k++) {
+      let shift = 0, result = 0, b: number;
+      do {
+        b = encoded.charCodeAt(index++) - 63;
+        result |= (b & 0x1f) << shift;
+        shift += 5;
+      } while (b >= 0x20);
+      deltas.push(result & 1 ? ~(result >> 1) : result >> 1);
+    }
+    lat += deltas[0];
+    lon += deltas[1];
+    points.push([lon / 1e5, lat / 1e5]);
+  }
+  return points;
+}